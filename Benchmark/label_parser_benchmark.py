@@ -0,0 +1,126 @@
+"""
+Microbenchmark for the OpenJTalk full-context label parser used by Genie's Japanese G2P.
+
+Compares the single-pass parser in genie_tts.Japanese.JapaneseG2P with the previous
+implementation (six re.search calls per label, with the next label re-parsed for a2_next),
+and checks that both produce identical phoneme sequences on a Japanese corpus.
+
+Usage:
+    python Benchmark/label_parser_benchmark.py [corpus.txt] [--repeat N]
+
+The corpus file is read line by line; without one, a built-in set of sentences is used.
+"""
+import argparse
+import re
+import time
+from typing import List
+
+import pyopenjtalk
+
+from genie_tts.Japanese.JapaneseG2P import JapaneseG2P
+
+BUILTIN_CORPUS = [
+    "こんにちは、今日はいい天気ですね？",
+    "私の名前は未花です。よろしくお願いします！",
+    "東京駅から新幹線に乗って、大阪まで二時間半かかりました。",
+    "この問題は思ったよりも難しくて、解くのに三十分もかかってしまった。",
+    "えっ、本当に？それはちょっと信じられないなあ。",
+    "明日の会議は午前十時から第三会議室で行われる予定です。",
+    "先生、質問があるんですけど、少しお時間よろしいでしょうか。",
+    "春はあけぼの。やうやう白くなりゆく山ぎは、すこしあかりて。",
+    "コンピューターのメモリが足りなくて、アプリケーションが強制終了した。",
+    "ありがとう……本当に、ありがとう。",
+    "百パーセント確実とは言えないけど、たぶん大丈夫だと思うよ。",
+    "猫が窓の外をじっと見つめている。鳥でもいるのかな？",
+]
+
+
+def _legacy_numeric_feature_by_regex(regex: str, s: str) -> int:
+    match = re.search(regex, s)
+    return int(match.group(1)) if match else -50
+
+
+def legacy_g2p_prosody_from_labels(labels: List[str]) -> List[str]:
+    """The label-parsing loop as it was before the single-pass parser."""
+    phones = []
+    for n, lab_curr in enumerate(labels):
+        p3 = re.search(r"-(.*?)\+", lab_curr).group(1)
+        if p3 in "AEIOU":
+            p3 = p3.lower()
+
+        if p3 == "sil":
+            if n == 0:
+                phones.append("^")
+            elif n == len(labels) - 1:
+                e3 = _legacy_numeric_feature_by_regex(r"!(\d+)_", lab_curr)
+                phones.append("?" if e3 == 1 else "$")
+            continue
+        elif p3 == "pau":
+            phones.append("_")
+            continue
+        else:
+            phones.append(p3)
+
+        a1 = _legacy_numeric_feature_by_regex(r"/A:([0-9\-]+)\+", lab_curr)
+        a2 = _legacy_numeric_feature_by_regex(r"\+(\d+)\+", lab_curr)
+        a3 = _legacy_numeric_feature_by_regex(r"\+(\d+)/", lab_curr)
+        f1 = _legacy_numeric_feature_by_regex(r"/F:(\d+)_", lab_curr)
+        lab_next = labels[n + 1] if n + 1 < len(labels) else ""
+        a2_next = _legacy_numeric_feature_by_regex(r"\+(\d+)\+", lab_next)
+
+        if a3 == 1 and a2_next == 1 and p3 in "aeiouAEIOUNcl":
+            phones.append("#")
+        elif a1 == 0 and a2_next == a2 + 1 and a2 != f1:
+            phones.append("]")
+        elif a2 == 1 and a2_next == 2:
+            phones.append("[")
+
+    return phones
+
+
+def _time(func, all_labels: List[List[str]], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for labels in all_labels:
+            func(labels)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="?", help="UTF-8 text file with one sentence per line.")
+    parser.add_argument("--repeat", type=int, default=200, help="Timing repetitions over the corpus.")
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            corpus = [line.strip() for line in f if line.strip()]
+    else:
+        corpus = BUILTIN_CORPUS
+
+    all_labels = [pyopenjtalk.make_label(pyopenjtalk.run_frontend(text)) for text in corpus]
+    label_count = sum(len(labels) for labels in all_labels)
+
+    mismatches = 0
+    for text, labels in zip(corpus, all_labels):
+        expected = legacy_g2p_prosody_from_labels(labels)
+        actual = JapaneseG2P._labels_to_prosody_phones(labels)
+        if expected != actual:
+            mismatches += 1
+            print(f"MISMATCH: {text}\n  legacy: {expected}\n  new:    {actual}")
+
+    legacy_time = _time(legacy_g2p_prosody_from_labels, all_labels, args.repeat)
+    new_time = _time(JapaneseG2P._labels_to_prosody_phones, all_labels, args.repeat)
+    total_labels = label_count * args.repeat
+
+    print(f"Corpus: {len(corpus)} sentences, {label_count} labels, {args.repeat} repetitions")
+    print(f"Legacy parser: {legacy_time * 1e6 / total_labels:.2f} us/label ({legacy_time:.3f} s)")
+    print(f"Single-pass:   {new_time * 1e6 / total_labels:.2f} us/label ({new_time:.3f} s)")
+    print(f"Speedup: {legacy_time / new_time:.2f}x")
+    print("Outputs identical." if mismatches == 0 else f"{mismatches} sentence(s) differ!")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional, Union
+
+from ..Core.DecodeGuard import DECODE_GUARD_ENABLED
+from ..ModelManager import model_manager
+
+if TYPE_CHECKING:
+    from ..Audio.ReferenceAudio import ReferenceAudio
+
+logger = logging.getLogger(__name__)
+
+_MB: int = 1024 * 1024
+
+
+def normalize_text(text: str) -> str:
+    """合并空白字符。G2P 与分句都会丢弃空白，因此只有空白不同的文本合成结果相同。"""
+    return ' '.join(text.split())
+
+
+class AudioResponseCache:
+    """
+    整句合成结果的缓存，以 (角色模型, 参考音频内容, 参考文本, 规范化后的目标文本, 分句模式, 声码器模式, 解码保护开关) 的哈希为键，
+    值为与 chunk_callback 输出相同的 16-bit PCM 数据。
+
+    内存中按字节数做 LRU 淘汰；若设置了磁盘目录，条目同时写入 <cache_dir>/<key>.pcm，
+    磁盘部分同样按总字节数淘汰最久未使用的文件（以修改时间记录使用顺序），进程重启后仍可命中。
+    """
+
+    def __init__(self, max_memory_bytes: int, cache_dir: Optional[str] = None, max_disk_bytes: int = 0):
+        self.max_memory_bytes: int = max(0, max_memory_bytes)
+        self.cache_dir: Optional[str] = os.path.abspath(cache_dir) if cache_dir else None
+        self.max_disk_bytes: int = max(0, max_disk_bytes)
+        self.memory_hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes: int = 0
+        self._disk_index: Optional[OrderedDict[str, int]] = None  # 键 -> 文件字节数，按使用顺序排列
+        self._disk_bytes: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_memory_bytes > 0 or self._disk_enabled
+
+    @property
+    def _disk_enabled(self) -> bool:
+        return self.cache_dir is not None and self.max_disk_bytes > 0
+
+    def make_key(
+            self,
+            character_name: str,
+            prompt_audio: 'ReferenceAudio',
+            text: str,
+            split: Union[bool, str],
+            stream_vocoder: bool,
+    ) -> Optional[str]:
+        """
+        计算缓存键；缓存未启用、角色未加载或参考音频无法哈希时返回 None（即不使用缓存）。
+        流式声码器按重叠窗口生成音频，与整句声码的采样点不同，因此声码器模式也计入键；解码保护开关同理。
+        """
+        if not self.enabled or prompt_audio.audio_key is None:
+            return None
+        model_identity = model_manager.model_identity(character_name)
+        if model_identity is None:
+            return None
+        payload = json.dumps(
+            [model_identity, prompt_audio.audio_key, prompt_audio.text, normalize_text(text), split,
+             bool(stream_vocoder), DECODE_GUARD_ENABLED],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            pcm = self._memory.get(key)
+            if pcm is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return pcm
+            pcm = self._read_disk(key)
+            if pcm is not None:
+                self.disk_hits += 1
+                self._put_memory(key, pcm)
+                return pcm
+            self.misses += 1
+            return None
+
+    def put(self, key: str, pcm: bytes) -> None:
+        if not pcm:
+            return
+        with self._lock:
+            self._put_memory(key, pcm)
+            self._write_disk(key, pcm)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_entries': len(self._disk_index) if self._disk_index is not None else 0,
+                'disk_bytes': self._disk_bytes,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': hits / total if total else 0.0,
+            }
+
+    def clear(self) -> None:
+        """清空内存与磁盘中的所有条目，并重置命中统计。"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._disk_enabled:
+                for key in list(self._load_disk_index()):
+                    self._remove_disk(key)
+            self.memory_hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+
+    # ---- 内存部分 ----
+
+    def _put_memory(self, key: str, pcm: bytes) -> None:
+        if len(pcm) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = pcm
+        self._memory_bytes += len(pcm)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    # ---- 磁盘部分 ----
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.pcm')
+
+    def _load_disk_index(self) -> OrderedDict:
+        """首次访问时扫描缓存目录，按修改时间从旧到新建立索引。"""
+        if self._disk_index is None:
+            entries = []
+            if os.path.isdir(self.cache_dir):
+                for name in os.listdir(self.cache_dir):
+                    if not name.endswith('.pcm'):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, name[:-len('.pcm')], stat.st_size))
+            entries.sort()
+            self._disk_index = OrderedDict((key, size) for _, key, size in entries)
+            self._disk_bytes = sum(self._disk_index.values())
+        return self._disk_index
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self._disk_enabled or key not in self._load_disk_index():
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                pcm = f.read()
+            os.utime(path)  # 更新修改时间，记录为最近使用
+        except OSError:
+            self._disk_bytes -= self._disk_index.pop(key)
+            return None
+        self._disk_index.move_to_end(key)
+        return pcm
+
+    def _write_disk(self, key: str, pcm: bytes) -> None:
+        if not self._disk_enabled or len(pcm) > self.max_disk_bytes:
+            return
+        index = self._load_disk_index()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(pcm)
+                os.replace(tmp_path, self._path(key))
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except Exception as e:
+            logger.warning(f"Failed to write audio cache file for key {key}: {e}")
+            return
+        self._disk_bytes += len(pcm) - index.pop(key, 0)
+        index[key] = len(pcm)
+        while self._disk_bytes > self.max_disk_bytes:
+            self._remove_disk(next(iter(index)))
+
+    def _remove_disk(self, key: str) -> None:
+        self._disk_bytes -= self._disk_index.pop(key)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+# Max_Audio_Cache_Memory_MB 为 0 且未设置 Audio_Cache_Dir 时关闭缓存；设置 Audio_Cache_Dir 可在重启之间保留缓存。
+audio_cache: AudioResponseCache = AudioResponseCache(
+    max_memory_bytes=int(float(os.getenv('Max_Audio_Cache_Memory_MB', '64')) * _MB),
+    cache_dir=os.getenv('Audio_Cache_Dir') or None,
+    max_disk_bytes=int(float(os.getenv('Max_Audio_Cache_Disk_MB', '1024')) * _MB),
+)
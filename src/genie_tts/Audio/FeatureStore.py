@@ -0,0 +1,128 @@
+import hashlib
+import logging
+import os
+import tempfile
+import numpy as np
+from typing import Optional, Tuple
+
+from ..Japanese.G2PCache import G2P_VERSION
+from ..ModelManager import model_manager
+
+logger = logging.getLogger(__name__)
+
+
+def _sha256_of_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _sha256_of_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ReferenceFeatureStore:
+    """
+    参考音频特征的磁盘缓存，使进程重启或多个 Worker 之间都能跳过重采样与 CN-HuBERT。
+
+    目录结构：
+        <cache_dir>/audio/<CN-HuBERT 模型标识>/<音频文件内容的 sha256>/audio_32k.npy
+        <cache_dir>/audio/<CN-HuBERT 模型标识>/<音频文件内容的 sha256>/ssl_content.npy
+        <cache_dir>/phonemes/<G2P 版本>/<参考文本的 sha256>.npy
+    模型标识与 G2P 版本均取 sha256 的前 16 位；更换 CN-HuBERT 模型或升级 G2P 后使用新的目录，旧目录可以直接删除。
+    音素序列只由文本决定，因此单独按文本索引，同一段文本配不同音频时可以共用。
+    所有文件都以 mmap 方式只读加载，写入时先写临时文件再原子替换，可供多个进程同时使用。
+    """
+
+    def __init__(self, cache_dir: Optional[str]):
+        self.cache_dir: Optional[str] = None
+        self.set_cache_dir(cache_dir)
+
+    def set_cache_dir(self, cache_dir: Optional[str]) -> None:
+        """设置缓存目录，传入 None 则停用磁盘缓存。"""
+        self.cache_dir = os.path.abspath(cache_dir) if cache_dir else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache_dir is not None
+
+    @staticmethod
+    def audio_key(audio_path: str) -> Optional[str]:
+        try:
+            return _sha256_of_file(audio_path)
+        except OSError as e:
+            logger.warning(f"Failed to hash reference audio '{audio_path}': {e}")
+            return None
+
+    def _audio_dir(self, audio_key: str) -> Optional[str]:
+        """特征所在目录；CN-HuBERT 模型不可用（无法确定其标识）时返回 None，即不使用缓存。"""
+        model_identity = model_manager.cn_hubert_identity()
+        if model_identity is None:
+            return None
+        return os.path.join(self.cache_dir, 'audio', _sha256_of_text(model_identity)[:16], audio_key)
+
+    def _phonemes_path(self, text: str) -> str:
+        return os.path.join(self.cache_dir, 'phonemes', _sha256_of_text(G2P_VERSION)[:16],
+                            f'{_sha256_of_text(text)}.npy')
+
+    def _load(self, path: str) -> Optional[np.ndarray]:
+        if not os.path.isfile(path):
+            return None
+        try:
+            return np.load(path, mmap_mode='r')
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable feature cache file '{path}': {e}")
+            return None
+
+    def _save(self, path: str, array: np.ndarray) -> None:
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(suffix='.npy', dir=directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, np.ascontiguousarray(array))
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except Exception as e:
+            logger.warning(f"Failed to write feature cache file '{path}': {e}")
+
+    def load_audio_features(self, audio_key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """返回 (audio_32k, ssl_content)，任一缺失时返回 None。"""
+        if not self.enabled:
+            return None
+        directory = self._audio_dir(audio_key)
+        if directory is None:
+            return None
+        audio_32k = self._load(os.path.join(directory, 'audio_32k.npy'))
+        ssl_content = self._load(os.path.join(directory, 'ssl_content.npy'))
+        if audio_32k is None or ssl_content is None:
+            return None
+        return audio_32k, ssl_content
+
+    def save_audio_features(self, audio_key: str, audio_32k: np.ndarray, ssl_content: np.ndarray) -> None:
+        if not self.enabled:
+            return
+        directory = self._audio_dir(audio_key)
+        if directory is None:
+            return
+        self._save(os.path.join(directory, 'audio_32k.npy'), audio_32k)
+        self._save(os.path.join(directory, 'ssl_content.npy'), ssl_content)
+
+    def load_phonemes(self, text: str) -> Optional[np.ndarray]:
+        if not self.enabled:
+            return None
+        return self._load(self._phonemes_path(text))
+
+    def save_phonemes(self, text: str, phonemes_seq: np.ndarray) -> None:
+        if not self.enabled:
+            return
+        self._save(self._phonemes_path(text), phonemes_seq)
+
+
+# 设置环境变量 Reference_Audio_Cache_Dir 以启用磁盘缓存，未设置时不读写磁盘。
+feature_store: ReferenceFeatureStore = ReferenceFeatureStore(os.getenv('Reference_Audio_Cache_Dir'))
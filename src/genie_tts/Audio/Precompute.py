@@ -0,0 +1,142 @@
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional, Tuple
+
+import numpy as np
+import soxr
+
+from ..Audio.Audio import load_audio
+from ..Audio.FeatureStore import feature_store
+from ..Japanese.JapaneseG2P import japanese_to_phones
+from ..ModelManager import model_manager
+from ..ThreadSettings import STAGE_HUBERT, thread_settings
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_AUDIO_EXTS = {'.wav', '.flac', '.ogg', '.aiff', '.aif'}
+# 目录模式下，参考文本保存在与音频同名的文本文件中。
+TRANSCRIPT_EXTS = ('.txt', '.lab')
+# 每个进程任务包含的参考音频数量。
+PRECOMPUTE_BATCH_SIZE: int = 8
+
+
+def collect_reference_items(source: str) -> List[Tuple[str, str]]:
+    """
+    从目录或清单文件中收集 (音频路径, 参考文本) 对。
+
+    - 目录：递归查找支持的音频文件，文本取自同名的 .txt / .lab 文件。
+    - .json 清单：[{"audio_path": ..., "audio_text": ...}, ...]。
+    - 其他清单（如 GPT-SoVITS 的 .list）：每行 "音频路径|...|参考文本"，取第一列与最后一列。
+    清单中的相对路径以清单文件所在目录为基准。
+    """
+    items: List[Tuple[str, str]] = []
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                stem, ext = os.path.splitext(name)
+                if ext.lower() not in SUPPORTED_AUDIO_EXTS:
+                    continue
+                audio_path = os.path.join(root, name)
+                for transcript_ext in TRANSCRIPT_EXTS:
+                    transcript_path = os.path.join(root, stem + transcript_ext)
+                    if os.path.isfile(transcript_path):
+                        with open(transcript_path, 'r', encoding='utf-8') as f:
+                            items.append((audio_path, f.read().strip()))
+                        break
+                else:
+                    logger.warning(f"No transcript found for reference audio '{audio_path}', skipped.")
+        return items
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r', encoding='utf-8') as f:
+        if source.lower().endswith('.json'):
+            entries = [(entry['audio_path'], entry['audio_text']) for entry in json.load(f)]
+        else:
+            entries = []
+            for line in f:
+                fields = line.strip().split('|')
+                if len(fields) >= 2:
+                    entries.append((fields[0], fields[-1]))
+    for audio_path, audio_text in entries:
+        items.append((os.path.join(base_dir, audio_path), audio_text.strip()))
+    return items
+
+
+def _init_worker(cache_dir: str, hubert_path: str, intra_op_num_threads: int) -> None:
+    feature_store.set_cache_dir(cache_dir)
+    os.environ["HUBERT_MODEL_PATH"] = hubert_path
+    # 每个 Worker 进程使用自己的小线程池，避免多个进程争抢同一组 CPU 核心。
+    thread_settings.configure_global_pool(enabled=False)
+    thread_settings.set_stage_threads(STAGE_HUBERT, intra_op_num_threads=intra_op_num_threads)
+    model_manager.load_cn_hubert()
+
+
+def _precompute_batch(items: List[Tuple[str, str]], overwrite: bool) -> List[Tuple[str, Optional[str]]]:
+    """
+    在 Worker 进程中逐条处理一批参考音频，返回 (音频路径, 错误信息) 列表。
+    CN-HuBERT 导出时没有 attention mask，补齐到等长后合批会改变结果，因此每条音频单独推理，并行度来自多个进程。
+    """
+    results: List[Tuple[str, Optional[str]]] = []
+    for audio_path, audio_text in items:
+        try:
+            if feature_store.load_phonemes(audio_text) is None or overwrite:
+                phonemes_seq = np.array([japanese_to_phones(audio_text)], dtype=np.int64)
+                feature_store.save_phonemes(audio_text, phonemes_seq)
+
+            audio_key = feature_store.audio_key(audio_path)
+            if audio_key is None:
+                results.append((audio_path, "failed to read file"))
+                continue
+            if not overwrite and feature_store.load_audio_features(audio_key) is not None:
+                results.append((audio_path, None))
+                continue
+            audio_32k = load_audio(audio_path=audio_path, target_sampling_rate=32000)
+            if audio_32k is None:
+                results.append((audio_path, "failed to decode audio"))
+                continue
+            audio_16k = soxr.resample(audio_32k, 32000, 16000, quality='hq')
+            ssl_content = model_manager.cn_hubert.run(None, {'input_values': np.expand_dims(audio_16k, axis=0)})[0]
+            feature_store.save_audio_features(audio_key, audio_32k, ssl_content)
+            results.append((audio_path, None))
+        except Exception as e:
+            results.append((audio_path, str(e)))
+    return results
+
+
+def precompute_reference_audios(
+        items: List[Tuple[str, str]],
+        cache_dir: str,
+        num_workers: Optional[int] = None,
+        overwrite: bool = False,
+) -> int:
+    """在多个进程中并行计算参考音频特征并写入磁盘缓存，返回成功处理的数量。"""
+    if not items:
+        return 0
+    hubert_path = model_manager.get_cn_hubert_path()  # 在主进程中下载一次，避免每个 Worker 重复下载。
+    if not hubert_path:
+        raise RuntimeError("Chinese HuBERT model is not available.")
+
+    batches = [items[i:i + PRECOMPUTE_BATCH_SIZE] for i in range(0, len(items), PRECOMPUTE_BATCH_SIZE)]
+    cpu_count = os.cpu_count() or 1
+    num_workers = max(1, min(num_workers or cpu_count, len(batches)))
+
+    succeeded = 0
+    # 使用 spawn：ORT 的线程池在 fork 后的子进程中不可用。
+    with ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(cache_dir, hubert_path, max(1, cpu_count // num_workers)),
+    ) as executor:
+        futures = [executor.submit(_precompute_batch, batch, overwrite) for batch in batches]
+        for future in as_completed(futures):
+            for audio_path, error in future.result():
+                if error is None:
+                    succeeded += 1
+                else:
+                    logger.error(f"Failed to precompute reference audio '{audio_path}': {error}")
+    logger.info(f"Precomputed {succeeded}/{len(items)} reference audios into '{os.path.abspath(cache_dir)}'.")
+    return succeeded
@@ -2,9 +2,11 @@ from ..Utils.Utils import LRUCacheDict
 from ..Japanese.JapaneseG2P import japanese_to_phones
 from ..Utils.Constants import BERT_FEATURE_DIM
 from ..Audio.Audio import load_audio
+from ..Audio.FeatureStore import feature_store
 from ..ModelManager import model_manager
 
 import os
+import weakref
 import numpy as np
 import soxr
 from typing import Optional
@@ -35,25 +37,39 @@ class ReferenceAudio:
         self.text_bert: Optional[np.ndarray] = None
         self.set_text(prompt_text)
 
-        # 音频相关。
-        self.audio_32k: Optional[np.ndarray] = load_audio(
-            audio_path=prompt_wav,
-            target_sampling_rate=32000
-        )
-        audio_16k: np.ndarray = soxr.resample(self.audio_32k, 32000, 16000, quality='hq')
-        audio_16k = np.expand_dims(audio_16k, axis=0)  # 增加 Batch_Size 维度
+        # 音频相关：优先从磁盘特征缓存加载，命中时跳过重采样与 CN-HuBERT。
+        # 音频内容的哈希同时用作整句音频缓存键的一部分。
+        self.audio_key: Optional[str] = feature_store.audio_key(prompt_wav)
+        audio_key: Optional[str] = self.audio_key if feature_store.enabled else None
+        cached_features = feature_store.load_audio_features(audio_key) if audio_key else None
+        if cached_features is not None:
+            self.audio_32k, self.ssl_content = cached_features
+        else:
+            self.audio_32k: Optional[np.ndarray] = load_audio(
+                audio_path=prompt_wav,
+                target_sampling_rate=32000
+            )
+            audio_16k: np.ndarray = soxr.resample(self.audio_32k, 32000, 16000, quality='hq')
+            audio_16k = np.expand_dims(audio_16k, axis=0)  # 增加 Batch_Size 维度
 
-        if not model_manager.cn_hubert:
-            model_manager.load_cn_hubert()
-        self.ssl_content: Optional[np.ndarray] = model_manager.cn_hubert.run(
-            None, {'input_values': audio_16k}
-        )[0]
+            if not model_manager.cn_hubert:
+                model_manager.load_cn_hubert()
+            self.ssl_content: Optional[np.ndarray] = model_manager.cn_hubert.run(
+                None, {'input_values': audio_16k}
+            )[0]
+            if audio_key:
+                feature_store.save_audio_features(audio_key, self.audio_32k, self.ssl_content)
+        # 由 ssl_content 得到的 prompts（参考音频的语义 Token），按 Encoder 会话缓存，模型卸载后自动失效。
+        self.prompts_cache: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
         self._initialized = True
 
     def set_text(self, prompt_text: str) -> None:
         self.text = prompt_text
-        self.phonemes_seq = np.array([japanese_to_phones(prompt_text)], dtype=np.int64)
+        self.phonemes_seq = feature_store.load_phonemes(prompt_text)
+        if self.phonemes_seq is None:
+            self.phonemes_seq = np.array([japanese_to_phones(prompt_text)], dtype=np.int64)
+            feature_store.save_phonemes(prompt_text, self.phonemes_seq)
         self.text_bert: Optional[np.ndarray] = np.zeros((self.phonemes_seq.shape[1], BERT_FEATURE_DIM),
                                                         dtype=np.float32)
 
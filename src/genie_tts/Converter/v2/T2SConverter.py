@@ -40,6 +40,7 @@ class T2SModelConverter:
         self.relinked_encoder_path: str = os.path.join(self.output_dir, "t2s_encoder_fp32.onnx")
         self.relinked_stage_decoder_path: str = os.path.join(self.output_dir, "t2s_stage_decoder_fp32.onnx")
         self.relinked_first_stage_decoder_path: str = os.path.join(self.output_dir, "t2s_first_stage_decoder_fp32.onnx")
+        self.fixed_kv_stage_decoder_path: str = os.path.join(self.output_dir, "t2s_stage_decoder_kv_fp32.onnx")
         self.reconstructed_fp32_bin_path = os.path.join(self.output_dir, "t2s_shared_fp32.bin")
 
     def step1_create_fp16_bin_with_key_mapping(self):
@@ -119,7 +120,168 @@ class T2SModelConverter:
         fp32_array = fp16_array.astype(np.float32)
         fp32_array.tofile(output_fp32_bin_path)
 
+    @staticmethod
+    def step4_create_fixed_kv_stage_decoder(stage_decoder_path: str, output_path: str):
+        """
+        (4) 从 Stage Decoder 派生出固定容量 KV Cache 的变体。
+            每层的 KV Cache 作为按最大长度分配的完整缓冲区输入 (k_cache_layer_i: [B, H, D, C]，
+            v_cache_layer_i: [B, H, C, D]，已按注意力所需的布局转置)，图内用 ScatterElements 把本步的
+            k/v 写入 kv_position 处，并对 kv_position 之后未写入的部分做注意力掩码；
+            present_k/v_layer_i 由推理端绑定到与输入相同的内存上，从而原地更新，每步不再拷贝整个 Cache。
+            位置编码改由 y_position 输入计算，不再需要 iy_emb 与 y_emb。
+            所有形状都取自原图的输入声明与注意力 Reshape 的常量，不写死维度。
+        """
+        model = onnx.load_model(stage_decoder_path, load_external_data=False)
+        graph = model.graph
+        producers = {output: node for node in graph.node for output in node.output}
+        consumers = {}
+        for node in graph.node:
+            for name in node.input:
+                consumers.setdefault(name, []).append(node)
+        constants = {
+            tensor.name: onnx.numpy_helper.to_array(tensor)
+            for tensor in graph.initializer if tensor.data_location != onnx.TensorProto.EXTERNAL
+        }
+        for node in graph.node:
+            if node.op_type == 'Constant':
+                constants[node.output[0]] = onnx.numpy_helper.to_array(node.attribute[0].t)
+        graph_inputs = {inp.name: inp for inp in graph.input}
+
+        def dims(value_info):
+            return [d.dim_value if d.HasField('dim_value') else d.dim_param for d in value_info.type.tensor_type.shape.dim]
+
+        def only_consumer(name, op_types):
+            nodes = consumers.get(name, [])
+            if len(nodes) != 1 or nodes[0].op_type not in op_types:
+                raise ValueError(f"Unexpected Stage Decoder graph structure after '{name}'.")
+            return nodes[0]
+
+        def add_constant(name, value):
+            graph.initializer.append(onnx.numpy_helper.from_array(np.asarray(value), name))
+            return name
+
+        def add_node(op_type, inputs, name, **attrs):
+            graph.node.append(onnx.helper.make_node(op_type, inputs, [f'{name}_output_0'], name=name, **attrs))
+            return f'{name}_output_0'
+
+        num_layers = sum(1 for name in graph_inputs if name.startswith('past_k_layer_'))
+        _, batch_size, hidden_size = dims(graph_inputs['past_k_layer_0'])
+        _, num_heads, head_dim = constants[only_consumer('present_k_layer_0', ('Reshape',)).input[1]].tolist()
+        if num_heads * head_dim != hidden_size:
+            raise ValueError(f"Attention shape {num_heads}x{head_dim} does not match hidden size {hidden_size}.")
+        k_cache_shape = [batch_size, num_heads, head_dim, 'cache_length']
+        v_cache_shape = [batch_size, num_heads, 'cache_length', head_dim]
+        prefix = '/kv_cache'
+
+        # 所有层共用的注意力掩码：位置 > kv_position 的部分加上 -inf。
+        cache_length = add_node('Shape', ['k_cache_layer_0'], f'{prefix}/Shape', start=3, end=4)
+        cache_length = add_node('Squeeze', [cache_length], f'{prefix}/Squeeze')
+        positions = add_node('Range', [add_constant(f'{prefix}/zero', np.int64(0)), cache_length,
+                                       add_constant(f'{prefix}/one', np.int64(1))], f'{prefix}/Range')
+        unused = add_node('Greater', [positions, 'kv_position'], f'{prefix}/Greater')
+        mask = add_node('Where', [unused, add_constant(f'{prefix}/neg_inf', np.float32(-np.inf)),
+                                  add_constant(f'{prefix}/zero_f', np.float32(0.0))], f'{prefix}/Where')
+        k_update_shape = add_constant(f'{prefix}/k_update_shape', np.array([batch_size, num_heads, head_dim, 1]))
+        v_update_shape = add_constant(f'{prefix}/v_update_shape', np.array([batch_size, num_heads, 1, head_dim]))
+        k_index = add_node('Expand', ['kv_position', k_update_shape], f'{prefix}/Expand')
+        v_index = add_node('Expand', ['kv_position', v_update_shape], f'{prefix}/Expand_1')
+
+        removed = set()
+        for i in range(num_layers):
+            layer = f'{prefix}/layers.{i}'
+            concat_k = producers[f'present_k_layer_{i}']
+            concat_v = producers[f'present_v_layer_{i}']
+            # K：present_k -> Reshape -> Transpose -> Unsqueeze -> Transpose -> Mul(缩放) -> MatMul(Q, K^T)
+            node, scale = concat_k, None
+            while node.op_type != 'MatMul':
+                node = only_consumer(node.output[0], ('Reshape', 'Transpose', 'Unsqueeze', 'Mul', 'MatMul'))
+                if node.op_type == 'Mul':
+                    scale = node.input[1]
+            scores_matmul = node
+            # V：present_v -> Reshape -> Transpose -> Unsqueeze -> MatMul(P, V)
+            node = concat_v
+            while node.op_type != 'MatMul':
+                node = only_consumer(node.output[0], ('Reshape', 'Transpose', 'Unsqueeze', 'MatMul'))
+            values_matmul = node
+            removed.update([concat_k.name, concat_v.name])
+
+            k_update = add_node('Reshape', [concat_k.input[1], k_update_shape], f'{layer}/Reshape')
+            graph.node.append(onnx.helper.make_node(
+                'ScatterElements', [f'k_cache_layer_{i}', k_index, k_update], [f'present_k_layer_{i}'],
+                name=f'{layer}/ScatterElements', axis=3))
+            v_update = add_node('Reshape', [concat_v.input[1], v_update_shape], f'{layer}/Reshape_1')
+            graph.node.append(onnx.helper.make_node(
+                'ScatterElements', [f'v_cache_layer_{i}', v_index, v_update], [f'present_v_layer_{i}'],
+                name=f'{layer}/ScatterElements_1', axis=2))
+
+            # 原图对 K 的缩放移到注意力分数上，再加掩码后交给原来的 Softmax。
+            scores_output = scores_matmul.output[0]
+            scores_matmul.input[1] = f'present_k_layer_{i}'
+            scores_matmul.output[0] = f'{layer}/MatMul_output_0'
+            scores = scores_matmul.output[0]
+            if scale is not None:
+                scores = add_node('Mul', [scores, scale], f'{layer}/Mul')
+            graph.node.append(onnx.helper.make_node('Add', [scores, mask], [scores_output], name=f'{layer}/Add'))
+            values_matmul.input[1] = f'present_v_layer_{i}'
+
+        # 位置编码：原图对 y_emb 的每一行求 CumSum 得到 1..L，这里只需要最后一行的位置 y_position + 1。
+        concat_y = producers['y_emb']
+        new_embedding = concat_y.input[1]
+        removed.add(concat_y.name)
+        for node in consumers['y_emb']:
+            if node.op_type == 'Add':
+                node.input[list(node.input).index('y_emb')] = new_embedding
+                continue
+            while node.op_type != 'CumSum':
+                node = only_consumer(node.output[0], ('Shape', 'ConstantOfShape', 'CumSum'))
+            position_type = producers[node.input[0]].attribute[0].t.data_type
+            removed.add(node.name)
+            position = add_node('Add', ['y_position', add_constant(f'{prefix}/one_1', np.array([1]))],
+                                f'{prefix}/Add')
+            position = add_node('Reshape', [position, add_constant(f'{prefix}/position_shape', np.array([1, 1]))],
+                                f'{prefix}/Reshape')
+            graph.node.append(onnx.helper.make_node(
+                'Cast', [position], [node.output[0]], name=f'{prefix}/Cast', to=position_type))
+
+        nodes = [node for node in graph.node if node.name not in removed]
+        # 删除不再被使用的节点（旧的 K/V 变换链与 CumSum 的输入）。
+        outputs = {output.name for output in graph.output if output.name != 'y_emb'}
+        while True:
+            used = set(outputs)
+            for node in nodes:
+                used.update(node.input)
+            kept = [node for node in nodes if any(output in used for output in node.output)]
+            if len(kept) == len(nodes):
+                break
+            nodes = kept
+        del graph.node[:]
+        graph.node.extend(nodes)
+
+        new_inputs = [
+            graph_inputs['iy'],
+            onnx.helper.make_tensor_value_info('kv_position', onnx.TensorProto.INT64, [1]),
+            onnx.helper.make_tensor_value_info('y_position', onnx.TensorProto.INT64, [1]),
+        ]
+        new_outputs = [output for output in graph.output if output.name in ('y', 'stop_condition_tensor')]
+        for i in range(num_layers):
+            new_inputs.append(onnx.helper.make_tensor_value_info(f'k_cache_layer_{i}', onnx.TensorProto.FLOAT, k_cache_shape))
+            new_inputs.append(onnx.helper.make_tensor_value_info(f'v_cache_layer_{i}', onnx.TensorProto.FLOAT, v_cache_shape))
+            new_outputs.append(onnx.helper.make_tensor_value_info(f'present_k_layer_{i}', onnx.TensorProto.FLOAT, k_cache_shape))
+            new_outputs.append(onnx.helper.make_tensor_value_info(f'present_v_layer_{i}', onnx.TensorProto.FLOAT, v_cache_shape))
+        del graph.input[:]
+        graph.input.extend(new_inputs)
+        del graph.output[:]
+        graph.output.extend(new_outputs)
+
+        used = {name for node in graph.node for name in node.input}
+        initializers = [tensor for tensor in graph.initializer if tensor.name in used]
+        del graph.initializer[:]
+        graph.initializer.extend(initializers)
+
+        onnx.save(model, output_path)
+
     def run_full_process(self):
         self.step1_create_fp16_bin_with_key_mapping()
         self.step2_relink_onnx_for_fp32(self.stage_decoder_onnx_path, self.relinked_stage_decoder_path)
         self.step2_relink_onnx_for_fp32(self.first_stage_decoder_onnx_path, self.relinked_first_stage_decoder_path)
+        self.step4_create_fixed_kv_stage_decoder(self.relinked_stage_decoder_path, self.fixed_kv_stage_decoder_path)
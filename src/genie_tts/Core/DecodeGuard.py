@@ -0,0 +1,100 @@
+import os
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from .StageDecoder import MAX_DECODE_STEPS
+
+# 设置环境变量 Decode_Guard=0 可关闭按音素数量缩放的步数上限与停滞、循环检测。
+DECODE_GUARD_ENABLED: bool = os.getenv('Decode_Guard', '1') != '0'
+# 解码步数上限随音素数量缩放：语义 Token 为 25 个/秒，正常语速下每个音素约 2 个 Token，这里留出充足余量。
+MIN_DECODE_STEPS: int = 50
+DECODE_STEPS_PER_PHONEME: int = 6
+# 同一个 Token 连续出现的次数达到该值时判定为停滞（约 2 秒），只保留开头的 STALL_KEEP_TOKENS 个。
+STALL_TOKENS: int = 50
+STALL_KEEP_TOKENS: int = 25
+# 周期为 2 ~ MAX_REPETITION_PERIOD 的 Token 片段连续重复至少 MIN_REPETITIONS 次、
+# 且重复部分总长度不少于 MIN_REPETITION_SPAN 时判定为循环，只保留第一次出现的片段。
+MAX_REPETITION_PERIOD: int = 60
+MIN_REPETITIONS: int = 3
+MIN_REPETITION_SPAN: int = 40
+
+
+def create_detector() -> Optional['RunawayDetector']:
+    return RunawayDetector() if DECODE_GUARD_ENABLED else None
+
+
+def decode_step_limit(num_phones: int) -> int:
+    """根据目标文本的音素数量计算解码步数上限。"""
+    if not DECODE_GUARD_ENABLED:
+        return MAX_DECODE_STEPS
+    return min(MAX_DECODE_STEPS, MIN_DECODE_STEPS + DECODE_STEPS_PER_PHONEME * num_phones)
+
+
+def max_truncate_tokens() -> int:
+    """检测器提前结束时最多会从末尾丢弃的 Token 数；流式输出至少要保留这么多 Token 暂不输出。"""
+    if not DECODE_GUARD_ENABLED:
+        return 0
+    # 两条规则都在刚达到阈值的那一步触发，丢弃的 Token 数即为阈值本身。
+    repetition = max(max(period * (MIN_REPETITIONS - 1), MIN_REPETITION_SPAN - period)
+                     for period in range(2, MAX_REPETITION_PERIOD + 1))
+    return max(STALL_TOKENS - STALL_KEEP_TOKENS, repetition)
+
+
+class RunawayDetector:
+    """
+    在线检测语义 Token 中的停滞与循环。
+
+    对每个周期 p 维护"当前位置与 p 个位置之前相同"的连续长度，每一步的开销为 O(MAX_REPETITION_PERIOD)。
+    """
+
+    def __init__(self):
+        self.tokens: List[int] = []
+        self._match_lengths: List[int] = [0] * (MAX_REPETITION_PERIOD + 1)
+
+    def update(self, token: int) -> Optional[Tuple[str, int]]:
+        """加入新生成的 Token，若应提前结束则返回 (规则名称, 需要从末尾丢弃的 Token 数)。"""
+        tokens = self.tokens
+        tokens.append(token)
+        n = len(tokens)
+        for period in range(1, min(MAX_REPETITION_PERIOD, n - 1) + 1):
+            if tokens[-1] == tokens[-1 - period]:
+                self._match_lengths[period] += 1
+            else:
+                self._match_lengths[period] = 0
+
+        run = self._match_lengths[1] + 1  # 末尾相同 Token 的连续个数
+        if run >= STALL_TOKENS:
+            return 'stall', run - STALL_KEEP_TOKENS
+
+        for period in range(2, min(MAX_REPETITION_PERIOD, n - 1) + 1):
+            match_length = self._match_lengths[period]
+            if run >= match_length + period:  # 重复部分全是同一个 Token，交给停滞规则处理
+                continue
+            if match_length >= max(period * (MIN_REPETITIONS - 1), MIN_REPETITION_SPAN - period):
+                return 'repetition', match_length
+        return None
+
+
+class DecodeStats:
+    """记录解码结束原因的线程安全计数器。"""
+
+    def __init__(self):
+        self._counter: Counter = Counter()
+        self._lock: threading.Lock = threading.Lock()
+
+    def record(self, reason: str) -> None:
+        with self._lock:
+            self._counter[reason] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counter)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counter.clear()
+
+
+# 结束原因：eos（模型给出停止条件）、step_limit、stall、repetition、cancelled、error。
+decode_stats: DecodeStats = DecodeStats()
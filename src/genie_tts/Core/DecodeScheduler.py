@@ -0,0 +1,153 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional
+
+from .DecodeGuard import RunawayDetector, decode_stats
+from .StageDecoder import StageDecoderEngine, DecodeState, MAX_DECODE_STEPS
+
+
+class DecodeRequest:
+    """提交给调度器的一条待解码序列。"""
+
+    def __init__(self, engine: StageDecoderEngine, state: DecodeState, max_steps: int,
+                 stop_event: Optional[threading.Event], detector: Optional[RunawayDetector] = None):
+        self.engine: StageDecoderEngine = engine
+        self.state: DecodeState = state
+        self.max_steps: int = max_steps
+        self.stop_event: Optional[threading.Event] = stop_event
+        self.detector: Optional[RunawayDetector] = detector
+        self.cancelled: bool = False
+        self.error: Optional[BaseException] = None
+        self.done_event: threading.Event = threading.Event()
+        self.progress: threading.Condition = threading.Condition()
+
+    def should_leave(self) -> bool:
+        if self.stop_event is not None and self.stop_event.is_set():
+            self.cancelled = True
+        return self.cancelled or self.state.finished or self.state.steps >= self.max_steps
+
+    def wait(self) -> None:
+        self.done_event.wait()
+        if self.error is not None:
+            raise self.error
+
+    def wait_for_steps(self, steps: int) -> int:
+        """阻塞直到序列至少完成 steps 步或已离开批次，返回当前步数。"""
+        with self.progress:
+            while self.state.steps < steps and not self.done_event.is_set():
+                self.progress.wait()
+        return self.state.steps
+
+    def notify_progress(self) -> None:
+        with self.progress:
+            self.progress.notify_all()
+
+    def end_reason(self) -> str:
+        if self.error is not None:
+            return 'error'
+        if self.cancelled:
+            return 'cancelled'
+        if self.state.stop_reason is not None:
+            return self.state.stop_reason
+        return 'eos' if self.state.finished else 'step_limit'
+
+    def leave(self) -> None:
+        decode_stats.record(self.end_reason())
+        self.done_event.set()
+        self.notify_progress()
+
+
+class DecodeScheduler:
+    """
+    Stage Decoder 的连续批处理调度器。
+
+    导出的 Stage Decoder 图把 batch 维度固定为 1（iy 会被 Squeeze，注意力按 [-1, 16, 32] 重排），
+    因此这里不把多条序列拼进同一个张量，而是按"步"为单位调度：每一步把所有活跃序列
+    各自的 run 并发地提交给 ORT（ORT 在推理时会释放 GIL），每条序列持有独立的 KV Cache 与停止标志。
+    新序列只在步与步之间加入，结束或被取消的序列也只在步边界离开。
+    """
+
+    def __init__(self, max_batch_size: int = 4):
+        self.max_batch_size: int = max(1, max_batch_size)
+        self._pending: List[DecodeRequest] = []
+        self._active: List[DecodeRequest] = []
+        self._condition: threading.Condition = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._worker: Optional[threading.Thread] = None
+
+    def submit(
+            self,
+            engine: StageDecoderEngine,
+            state: DecodeState,
+            max_steps: int = MAX_DECODE_STEPS,
+            stop_event: Optional[threading.Event] = None,
+            detector: Optional[RunawayDetector] = None,
+    ) -> DecodeRequest:
+        request = DecodeRequest(engine, state, max_steps, stop_event, detector)
+        with self._condition:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._worker_loop, daemon=True)
+                self._worker.start()
+            self._pending.append(request)
+            self._condition.notify()
+        return request
+
+    def decode(
+            self,
+            engine: StageDecoderEngine,
+            state: DecodeState,
+            max_steps: int = MAX_DECODE_STEPS,
+            stop_event: Optional[threading.Event] = None,
+            detector: Optional[RunawayDetector] = None,
+    ) -> bool:
+        """阻塞直到序列解码结束，返回 False 表示序列被停止标志取消。"""
+        request = self.submit(engine, state, max_steps, stop_event, detector)
+        request.wait()
+        return not request.cancelled
+
+    @staticmethod
+    def _step(request: DecodeRequest) -> None:
+        try:
+            state = request.state
+            if not request.engine.step(state) and request.detector is not None:
+                result = request.detector.update(state.generated[-1])
+                if result is not None:  # 检测到停滞或循环，提前结束
+                    state.stop_reason, state.truncate_steps = result
+                    state.finished = True
+        except Exception as e:
+            request.error = e
+        request.notify_progress()
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._active:
+                    self._condition.wait()
+                # 在步边界接纳新序列。
+                while self._pending and len(self._active) < self.max_batch_size:
+                    self._active.append(self._pending.pop(0))
+
+            # 在步边界移除已完成、出错或被取消的序列。
+            still_active: List[DecodeRequest] = []
+            for request in self._active:
+                if request.error is not None or request.should_leave():
+                    request.leave()
+                else:
+                    still_active.append(request)
+            self._active = still_active
+            if not self._active:
+                continue
+
+            if len(self._active) == 1:
+                self._step(self._active[0])
+            else:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_batch_size,
+                                                        thread_name_prefix='genie-decode')
+                wait([self._executor.submit(self._step, request) for request in self._active])
+
+
+decode_scheduler: DecodeScheduler = DecodeScheduler(
+    max_batch_size=int(os.getenv('Max_Decode_Batch_Size', '4'))
+)
@@ -1,16 +1,34 @@
 import onnxruntime as ort
 import numpy as np
-from typing import List, Optional
+from typing import Callable, Optional
 import threading
+import weakref
 
+from .DecodeScheduler import decode_scheduler
+from .DecodeGuard import create_detector, decode_step_limit, max_truncate_tokens
+from .SemanticTokenCache import semantic_token_cache
+from .StageDecoder import StageDecoderEngine, create_engine
+from .StreamingVocoder import StreamingVocoder
 from ..Audio.ReferenceAudio import ReferenceAudio
 from ..Japanese.JapaneseG2P import japanese_to_phones
 from ..Utils.Constants import BERT_FEATURE_DIM
 
+# prompts 已缓存时传给 Encoder 的占位 SSL 特征：x 与 ssl_content 无关，而 ssl_proj 卷积要求长度至少为 2。
+_PLACEHOLDER_SSL_CONTENT: np.ndarray = np.zeros((1, 768, 2), dtype=np.float32)
+
 
 class GENIE:
     def __init__(self):
         self.stop_event: threading.Event = threading.Event()
+        # 每个 Stage Decoder 会话对应一个解码引擎，会话被释放时自动移除。
+        self._engines: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def get_engine(self, stage_decoder: ort.InferenceSession) -> StageDecoderEngine:
+        engine = self._engines.get(stage_decoder)
+        if engine is None:
+            engine = create_engine(stage_decoder)
+            self._engines[stage_decoder] = engine
+        return engine
 
     def tts(
             self,
@@ -20,10 +38,69 @@ class GENIE:
             first_stage_decoder: ort.InferenceSession,
             stage_decoder: ort.InferenceSession,
             vocoder: ort.InferenceSession,
+            audio_callback: Optional[Callable[[np.ndarray], None]] = None,
     ) -> Optional[np.ndarray]:
-        text_seq: np.ndarray = np.array([japanese_to_phones(text)], dtype=np.int64)
+        """
+        合成一句话的音频。
+
+        若提供 audio_callback，则启用流式声码器：在语义 Token 生成的同时分块运行 VITS，
+        音频块通过回调依次输出，此时返回 None。
+        """
+        text_seq: np.ndarray = self.text_to_phones(text)
+        semantic_tokens: Optional[np.ndarray] = self.generate_semantic_tokens(
+            text_seq=text_seq,
+            prompt_audio=prompt_audio,
+            encoder=encoder,
+            first_stage_decoder=first_stage_decoder,
+            stage_decoder=stage_decoder,
+            vocoder=vocoder,
+            audio_callback=audio_callback,
+        )
+        if semantic_tokens is None or audio_callback is not None:
+            return None
+        return self.vocode(text_seq, semantic_tokens, prompt_audio, vocoder)
+
+    @staticmethod
+    def text_to_phones(text: str) -> np.ndarray:
+        """G2P 阶段：把文本转换为音素 ID 序列。"""
+        return np.array([japanese_to_phones(text)], dtype=np.int64)
+
+    def generate_semantic_tokens(
+            self,
+            text_seq: np.ndarray,
+            prompt_audio: ReferenceAudio,
+            encoder: ort.InferenceSession,
+            first_stage_decoder: ort.InferenceSession,
+            stage_decoder: ort.InferenceSession,
+            vocoder: Optional[ort.InferenceSession] = None,
+            audio_callback: Optional[Callable[[np.ndarray], None]] = None,
+            stop_event: Optional[threading.Event] = None,
+            run_options: Optional[ort.RunOptions] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        T2S 阶段：生成语义 Token，已剔除 EOS 等不合法的元素；被停止时返回 None。
+
+        若提供 audio_callback，则同时使用 vocoder 进行流式合成，音频块通过回调输出，run_options 用于中止其中的声码器调用。
+        stop_event 默认为全局的 self.stop_event，独立会话可以传入自己的停止标志。
+        同一模型、参考音频与句子音素的结果会被缓存，命中时跳过自回归解码。
+        """
+        stop_event = stop_event or self.stop_event
+        streamer: Optional[StreamingVocoder] = None
+        if audio_callback is not None:
+            audio_32k = np.expand_dims(prompt_audio.audio_32k, axis=0)  # 增加 Batch_Size 维度
+            # 在解码结束前保留检测器可能丢弃的末尾 Token，避免停滞或循环部分的音频被提前输出。
+            streamer = StreamingVocoder(vocoder, text_seq, audio_32k, audio_callback,
+                                        holdback_tokens=max_truncate_tokens(), run_options=run_options)
+
+        cached_tokens: Optional[np.ndarray] = semantic_token_cache.get(encoder, prompt_audio, text_seq)
+        if cached_tokens is not None:
+            if streamer is not None:
+                streamer.finish(cached_tokens[0, 0])
+            return cached_tokens
+
         text_bert = np.zeros((text_seq.shape[1], BERT_FEATURE_DIM), dtype=np.float32)
-        semantic_tokens: np.ndarray = self.t2s_cpu(
+
+        semantic_tokens: Optional[np.ndarray] = self.t2s_cpu(
             ref_seq=prompt_audio.phonemes_seq,
             ref_bert=prompt_audio.text_bert,
             text_seq=text_seq,
@@ -32,21 +109,38 @@ class GENIE:
             encoder=encoder,
             first_stage_decoder=first_stage_decoder,
             stage_decoder=stage_decoder,
+            on_tokens=streamer.feed if streamer else None,
+            prompts_cache=prompt_audio.prompts_cache,
+            stop_event=stop_event,
         )
-        if self.stop_event.is_set():
+        if semantic_tokens is None or stop_event.is_set():
             return None
 
         eos_indices = np.where(semantic_tokens >= 1024)  # 剔除不合法的元素，例如 EOS Token。
         if len(eos_indices[0]) > 0:
             first_eos_index = eos_indices[-1][0]
             semantic_tokens = semantic_tokens[..., :first_eos_index]
+        semantic_token_cache.put(encoder, prompt_audio, text_seq, semantic_tokens)
 
+        if streamer is not None:
+            streamer.finish(semantic_tokens[0, 0])
+        return semantic_tokens
+
+    @staticmethod
+    def vocode(
+            text_seq: np.ndarray,
+            semantic_tokens: np.ndarray,
+            prompt_audio: ReferenceAudio,
+            vocoder: ort.InferenceSession,
+            run_options: Optional[ort.RunOptions] = None,
+    ) -> np.ndarray:
+        """声码器阶段：由语义 Token 合成整句音频。在 run_options 上设置 terminate 可中止正在进行的调用。"""
         audio_32k = np.expand_dims(prompt_audio.audio_32k, axis=0)  # 增加 Batch_Size 维度
         return vocoder.run(None, {
             "text_seq": text_seq,
             "pred_semantic": semantic_tokens,
             "ref_audio": audio_32k
-        })[0]
+        }, run_options)[0]
 
     def t2s_cpu(
             self,
@@ -58,40 +152,71 @@ class GENIE:
             encoder: ort.InferenceSession,
             first_stage_decoder: ort.InferenceSession,
             stage_decoder: ort.InferenceSession,
+            on_tokens: Optional[Callable[[np.ndarray], None]] = None,
+            prompts_cache: Optional[weakref.WeakKeyDictionary] = None,
+            stop_event: Optional[threading.Event] = None,
     ) -> Optional[np.ndarray]:
-        """在CPU上运行T2S模型"""
+        """
+        在CPU上运行T2S模型，on_tokens 会在解码过程中收到目前已生成的语义 Token。
+
+        prompts 只由参考音频的 ssl_content 决定，若提供 prompts_cache（按 Encoder 会话索引），
+        则命中时 Encoder 只处理文本部分，不再重复计算参考音频的语义 Token。
+        """
+        stop_event = stop_event or self.stop_event
+        prompts: Optional[np.ndarray] = prompts_cache.get(encoder) if prompts_cache is not None else None
         # Encoder
-        x, prompts = encoder.run(
+        x, encoded_prompts = encoder.run(
             None,
             {
                 "ref_seq": ref_seq,
                 "text_seq": text_seq,
                 "ref_bert": ref_bert,
                 "text_bert": text_bert,
-                "ssl_content": ssl_content,
+                "ssl_content": ssl_content if prompts is None else _PLACEHOLDER_SSL_CONTENT,
             },
         )
+        if prompts is None:
+            prompts = encoded_prompts
+            if prompts_cache is not None:
+                prompts_cache[encoder] = prompts
         # First Stage Decoder
-        y, y_emb, *present_key_values = first_stage_decoder.run(
-            None, {"x": x, "prompts": prompts}
-        )
-        # Stage Decoder
-        input_names: List[str] = [inp.name for inp in stage_decoder.get_inputs()]
-        idx: int = 0
-        for idx in range(0, 500):
-            if self.stop_event.is_set():
+        engine = self.get_engine(stage_decoder)
+        # 步数上限随目标文本的音素数量缩放，并在线检测停滞与循环以提前结束。
+        max_steps: int = decode_step_limit(text_seq.shape[1])
+        detector = create_detector()
+        state = engine.start(first_stage_decoder, x, prompts, max_steps=max_steps)
+        # Stage Decoder：交给调度器，与其他并发请求的序列在步边界上合批推进。
+        if on_tokens is None:
+            if not decode_scheduler.decode(engine, state, max_steps=max_steps, stop_event=stop_event,
+                                           detector=detector):
+                return None
+        else:
+            request = decode_scheduler.submit(engine, state, max_steps=max_steps, stop_event=stop_event,
+                                              detector=detector)
+            # 逐步把新生成的 Token 追加到预分配的缓冲区，每一步不再拷贝整条序列。
+            tokens = np.empty(max_steps, dtype=np.int64)
+            count: int = 0
+            steps: int = 0
+            while not request.done_event.is_set():
+                steps = request.wait_for_steps(steps + 1)
+                # 与最终结果 y[:, -idx:] 对齐：不含第一个生成的 Token。
+                for token in state.generated[count + 1:steps]:
+                    if token >= 1024:  # 最后一步在序列离开批次前就会通知进度，EOS 不能交给声码器。
+                        break
+                    tokens[count] = token
+                    count += 1
+                if not request.done_event.is_set():
+                    on_tokens(tokens[:count])
+            request.wait()
+            if request.cancelled:
                 return None
-            input_feed = {
-                name: data
-                for name, data in zip(input_names, [y, y_emb, *present_key_values])
-            }
-            outputs = stage_decoder.run(None, input_feed)
-            y, y_emb, stop_condition_tensor, *present_key_values = outputs
-
-            if stop_condition_tensor:
-                break
+        idx: int = state.steps - 1
+        y = state.tokens()
         y[0, -1] = 0
-        return np.expand_dims(y[:, -idx:], axis=0)
+        y = y[:, -idx:]
+        if state.truncate_steps > 0:  # 丢弃停滞或循环部分
+            y = y[:, :max(1, y.shape[1] - state.truncate_steps)]
+        return np.expand_dims(y, axis=0)
 
 
 tts_client: GENIE = GENIE()
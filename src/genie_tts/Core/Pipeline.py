@@ -0,0 +1,142 @@
+import logging
+import os
+import queue
+import threading
+import time
+import wave
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from ..Audio.AudioCache import audio_cache
+from ..Audio.ReferenceAudio import ReferenceAudio
+from ..ModelManager import GSVModel
+
+logger = logging.getLogger(__name__)
+
+STREAM_END = 'STREAM_END'  # 这是一个特殊的标记，表示文本流结束
+TASK_FAILED = 'TASK_FAILED'  # 上游阶段处理某句话失败时向下游传递的标记
+# 流水线阶段之间的队列容量：G2P 最多领先 T2S 两句，已生成的语义 Token 最多积压两句等待声码器。
+PIPELINE_QUEUE_SIZE: int = 2
+
+
+class SentenceTask:
+    """在流水线各阶段之间传递的一句话。模型与参考音频在进入流水线时确定，之后不受上下文切换影响。"""
+
+    def __init__(self, text: str, character_name: str, gsv_model: GSVModel, prompt_audio: ReferenceAudio):
+        self.text: str = text
+        self.character_name: str = character_name
+        self.gsv_model: GSVModel = gsv_model
+        self.prompt_audio: ReferenceAudio = prompt_audio
+        self.text_seq: Optional[np.ndarray] = None
+        self.semantic_tokens: Optional[np.ndarray] = None
+
+
+def put_until_stopped(q: queue.Queue, item, stop_event: threading.Event) -> bool:
+    """向有界队列放入元素，队列已满时阻塞，直到放入成功或 stop_event 被设置。"""
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def get_until_stopped(q: queue.Queue, stop_event: threading.Event):
+    """从队列取出元素，收到 None 或 stop_event 被设置时返回 None。"""
+    while not stop_event.is_set():
+        try:
+            item = q.get(timeout=1)
+        except queue.Empty:
+            continue
+        if item is None or stop_event.is_set():
+            return None
+        return item
+    return None
+
+
+def audio_to_pcm16(audio_float: np.ndarray) -> bytes:
+    audio_int16 = (audio_float.squeeze() * 32767).astype(np.int16)
+    return audio_int16.tobytes()
+
+
+def pcm16_to_audio(pcm: bytes) -> np.ndarray:
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32767
+
+
+class AudioOutput:
+    """
+    一次会话的音频输出，由 TTSPlayer 与 TTSSession 共用。
+
+    记录首包延迟，把音频块转换为 16-bit PCM 交给 chunk_callback，并收集保存文件与写入整句音频缓存所需的数据。
+    """
+
+    def __init__(
+            self,
+            chunk_callback: Optional[Callable[[Optional[bytes]], None]] = None,
+            save_path: Optional[str] = None,
+            cache_key: Optional[str] = None,
+            sample_rate: int = 32000,
+    ):
+        self.chunk_callback: Optional[Callable[[Optional[bytes]], None]] = chunk_callback
+        self.save_path: Optional[str] = save_path
+        self.cache_key: Optional[str] = cache_key  # 由 audio_cache.make_key 计算，None 表示不使用整句音频缓存
+        self.sample_rate: int = sample_rate
+        self.start_time: Optional[float] = None  # 由调用方在收到文本时设置，用于计算首包延迟
+        self.first_chunk_time: Optional[float] = None
+        self._audio_chunks: List[np.ndarray] = []
+        self._pcm_chunks: List[bytes] = []
+
+    def write(self, audio_chunk: np.ndarray) -> None:
+        """输出一段生成好的音频。"""
+        if self.first_chunk_time is None:
+            self.first_chunk_time = time.time()
+            if self.start_time:
+                logger.info(f"First packet latency: {self.first_chunk_time - self.start_time:.3f} seconds.")
+        if self.save_path:
+            self._audio_chunks.append(audio_chunk)
+        if self.chunk_callback or self.cache_key:
+            pcm = audio_to_pcm16(audio_chunk)
+            if self.cache_key:
+                self._pcm_chunks.append(pcm)
+            if self.chunk_callback:
+                self.chunk_callback(pcm)
+
+    def write_cached(self, pcm: bytes) -> None:
+        """整句音频缓存命中：直接输出缓存的 PCM 数据。"""
+        if self.start_time:
+            logger.info(f"Audio cache hit, first packet latency: {time.time() - self.start_time:.6f} seconds.")
+        if self.save_path:
+            self._audio_chunks.append(pcm16_to_audio(pcm))
+        if self.chunk_callback:
+            self.chunk_callback(pcm)
+
+    def put_to_cache(self) -> None:
+        """把本次会话生成的音频写入整句音频缓存，只应在会话成功结束时调用。"""
+        if self.cache_key and self._pcm_chunks:
+            audio_cache.put(self.cache_key, b''.join(self._pcm_chunks))
+        self._pcm_chunks = []
+
+    def save(self) -> None:
+        if not self.save_path or not self._audio_chunks:
+            return
+        try:
+            full_audio = np.concatenate(self._audio_chunks, axis=0)
+            with wave.open(self.save_path, 'wb') as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(self.sample_rate)
+                wf.writeframes(audio_to_pcm16(full_audio))
+            logger.info(f"Audio successfully saved to {os.path.abspath(self.save_path)}")
+        except Exception as e:
+            logger.error(f"Failed to save audio: {e}")
+        finally:
+            self._audio_chunks = []
+
+    def close(self) -> None:
+        """丢弃未写入的数据，并通过回调发送结束信号 None。"""
+        self._audio_chunks = []
+        self._pcm_chunks = []
+        if self.chunk_callback:
+            self.chunk_callback(None)
@@ -0,0 +1,104 @@
+import itertools
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional, Tuple
+
+import numpy as np
+import onnxruntime as ort
+
+if TYPE_CHECKING:
+    from ..Audio.ReferenceAudio import ReferenceAudio
+
+_MB: int = 1024 * 1024
+
+
+class SemanticTokenCache:
+    """
+    句子级语义 Token 缓存，以 (T2S 模型, 参考音频, 参考音素, 句子音素) 为键，按字节数做 LRU 淘汰。
+
+    长文本中重复出现的句子命中后可以跳过自回归的 T2S 解码，只运行声码器。
+    模型以会话对象区分：每个 Encoder 会话分配一个不会复用的编号，模型卸载后旧条目不会再被命中，随 LRU 逐渐淘汰。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes: int = max(0, max_bytes)
+        self.hits: int = 0
+        self.misses: int = 0
+        self._cache: OrderedDict[Tuple, np.ndarray] = OrderedDict()
+        self._bytes: int = 0
+        self._model_ids: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._next_model_id = itertools.count()
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _key(self, encoder: ort.InferenceSession, prompt_audio: 'ReferenceAudio',
+             text_seq: np.ndarray) -> Optional[Tuple]:
+        if prompt_audio.audio_key is None:
+            return None
+        model_id = self._model_ids.get(encoder)
+        if model_id is None:
+            model_id = next(self._next_model_id)
+            self._model_ids[encoder] = model_id
+        return model_id, prompt_audio.audio_key, prompt_audio.phonemes_seq.tobytes(), text_seq.tobytes()
+
+    def get(self, encoder: ort.InferenceSession, prompt_audio: 'ReferenceAudio',
+            text_seq: np.ndarray) -> Optional[np.ndarray]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            key = self._key(encoder, prompt_audio, text_seq)
+            semantic_tokens = self._cache.get(key) if key is not None else None
+            if semantic_tokens is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return semantic_tokens
+
+    def put(self, encoder: ort.InferenceSession, prompt_audio: 'ReferenceAudio', text_seq: np.ndarray,
+            semantic_tokens: np.ndarray) -> None:
+        if not self.enabled or semantic_tokens.nbytes > self.max_bytes:
+            return
+        semantic_tokens = semantic_tokens.copy()
+        semantic_tokens.flags.writeable = False  # 命中时直接返回同一数组，防止被调用方修改
+        with self._lock:
+            key = self._key(encoder, prompt_audio, text_seq)
+            if key is None:
+                return
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._cache[key] = semantic_tokens
+            self._bytes += semantic_tokens.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._cache),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+# Max_Semantic_Token_Cache_MB 为 0 时关闭缓存。
+semantic_token_cache: SemanticTokenCache = SemanticTokenCache(
+    max_bytes=int(float(os.getenv('Max_Semantic_Token_Cache_MB', '32')) * _MB),
+)
@@ -0,0 +1,154 @@
+import os
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Optional, Union
+
+# 优先级：交互式请求总是先于批量任务获得执行名额。
+PRIORITY_INTERACTIVE: str = 'interactive'
+PRIORITY_BATCH: str = 'batch'
+PRIORITIES: tuple = (PRIORITY_INTERACTIVE, PRIORITY_BATCH)
+
+
+class _Waiter:
+    def __init__(self, tenant: str):
+        self.tenant: str = tenant
+        self.granted: threading.Event = threading.Event()
+
+
+class SentenceScheduler:
+    """
+    以句子为粒度分配推理名额的调度器，位于会话与推理之间。
+
+    每合成一句话前调用 acquire 获取名额，结束后调用 release 归还，因此长文本不会一直占用推理资源：
+    - 优先级：有可以执行的交互式请求时，批量任务不会获得新的名额；
+    - 公平：同一优先级内按租户（默认为角色名）轮转分配，同一租户的多个会话按到达顺序排队；
+    - 限流：全局同时执行的句子数不超过 max_active，每个租户不超过 max_active_per_tenant。
+    """
+
+    def __init__(self, max_active: int, max_active_per_tenant: int):
+        self.max_active: int = max(1, max_active)
+        self.max_active_per_tenant: int = max(1, max_active_per_tenant)
+        self._active: int = 0
+        self._active_per_tenant: Dict[str, int] = {}
+        # 优先级 -> 租户 -> 等待队列；租户的顺序即轮转顺序，获得名额的租户被移到末尾。
+        self._waiting: Dict[str, OrderedDict[str, Deque[_Waiter]]] = {p: OrderedDict() for p in PRIORITIES}
+        self._lock: threading.Lock = threading.Lock()
+
+    def acquire(self, tenant: str, priority: str = PRIORITY_INTERACTIVE,
+                stop_event: Optional[threading.Event] = None) -> bool:
+        """阻塞直到获得名额；stop_event 被设置时放弃等待并返回 False。"""
+        if priority not in self._waiting:
+            priority = PRIORITY_INTERACTIVE
+        waiter = _Waiter(tenant)
+        with self._lock:
+            self._waiting[priority].setdefault(tenant, deque()).append(waiter)
+            self._dispatch()
+        while not waiter.granted.wait(timeout=0.5):
+            if stop_event is not None and stop_event.is_set():
+                with self._lock:
+                    if waiter.granted.is_set():  # 放弃前恰好获得了名额
+                        break
+                    queue = self._waiting[priority].get(tenant)
+                    if queue is not None and waiter in queue:
+                        queue.remove(waiter)
+                        if not queue:
+                            del self._waiting[priority][tenant]
+                return False
+        if stop_event is not None and stop_event.is_set():
+            self.release(tenant)
+            return False
+        return True
+
+    def release(self, tenant: str) -> None:
+        with self._lock:
+            self._active -= 1
+            self._active_per_tenant[tenant] -= 1
+            if self._active_per_tenant[tenant] == 0:
+                del self._active_per_tenant[tenant]
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """在持锁状态下，把空闲名额按优先级与租户轮转顺序分配给等待者。"""
+        while self._active < self.max_active:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self._active += 1
+            self._active_per_tenant[waiter.tenant] = self._active_per_tenant.get(waiter.tenant, 0) + 1
+            waiter.granted.set()
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """
+        按优先级、再按租户轮转顺序选出下一个等待者。高优先级的等待者都受租户限流时，名额交给低优先级，
+        而这些租户有句子结束时，归还的名额仍会先分给它们。
+        """
+        for priority in PRIORITIES:
+            tenants = self._waiting[priority]
+            for tenant in list(tenants):
+                if self._active_per_tenant.get(tenant, 0) >= self.max_active_per_tenant:
+                    continue
+                queue = tenants.pop(tenant)
+                waiter = queue.popleft()
+                if queue:
+                    tenants[tenant] = queue  # 重新插入到末尾，轮到其他租户
+                return waiter
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'active': self._active,
+                'active_per_tenant': dict(self._active_per_tenant),
+                'waiting': {p: sum(len(q) for q in tenants.values()) for p, tenants in self._waiting.items()},
+            }
+
+
+class SentenceSlot:
+    """
+    一个会话在 SentenceScheduler 中持有的名额。
+
+    名额只应在推理期间持有：向下游交付音频（可能因下游队列已满而阻塞）时，用 suspended() 暂时归还名额，
+    交付完成后再重新申请，避免慢速的消费方占着名额让其他会话等待。
+    priority 可以是返回当前优先级的函数，每次申请时重新读取，会话在合成过程中提升的优先级从下一次申请起生效。
+    """
+
+    def __init__(self, scheduler: SentenceScheduler, tenant: str,
+                 priority: Union[str, Callable[[], str]] = PRIORITY_INTERACTIVE,
+                 stop_event: Optional[threading.Event] = None):
+        self.scheduler: SentenceScheduler = scheduler
+        self.tenant: str = tenant
+        self._priority: Union[str, Callable[[], str]] = priority
+        self.stop_event: Optional[threading.Event] = stop_event
+        self.held: bool = False
+
+    @property
+    def priority(self) -> str:
+        return self._priority() if callable(self._priority) else self._priority
+
+    def acquire(self) -> bool:
+        if not self.held:
+            self.held = self.scheduler.acquire(self.tenant, self.priority, self.stop_event)
+        return self.held
+
+    def release(self) -> None:
+        if self.held:
+            self.held = False
+            self.scheduler.release(self.tenant)
+
+    @contextmanager
+    def suspended(self):
+        """在 with 块内暂时归还名额，退出时重新申请（被停止时不再申请）。"""
+        was_held = self.held
+        self.release()
+        try:
+            yield
+        finally:
+            if was_held:
+                self.acquire()
+
+
+sentence_scheduler: SentenceScheduler = SentenceScheduler(
+    max_active=int(os.getenv('Max_Concurrent_TTS_Sessions', '4')),
+    max_active_per_tenant=int(os.getenv('Max_Concurrent_Sentences_Per_Tenant', '2')),
+)
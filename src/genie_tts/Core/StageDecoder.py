@@ -0,0 +1,173 @@
+import ctypes
+
+import onnxruntime as ort
+import numpy as np
+from typing import List, Optional
+
+MAX_DECODE_STEPS: int = 500
+
+
+class DecodeState:
+    """单条序列的自回归解码状态，所有张量都以 OrtValue 的形式保存在 ORT 管理的内存中。"""
+
+    def __init__(self, binding: ort.IOBinding, y: ort.OrtValue, y_emb: ort.OrtValue,
+                 present_key_values: List[ort.OrtValue]):
+        self.binding: ort.IOBinding = binding
+        self.y: ort.OrtValue = y
+        self.y_emb: ort.OrtValue = y_emb
+        self.present_key_values: List[ort.OrtValue] = present_key_values
+        self.steps: int = 0
+        self.finished: bool = False
+        self.stop_reason: Optional[str] = None  # 被提前结束时触发的规则
+        self.truncate_steps: int = 0  # 提前结束时需要从末尾丢弃的 Token 数
+        self.generated: List[int] = []  # 每一步输出的语义 Token，先于 steps 更新，长度总不小于 steps
+        # 仅固定容量 KV Cache 变体使用：预分配的各层 K/V 缓冲区、下一步写入的位置与 y_emb 的长度。
+        self.k_caches: List[np.ndarray] = []
+        self.v_caches: List[np.ndarray] = []
+        self.kv_position: int = 0
+        self.y_position: int = 0
+
+    def tokens(self) -> np.ndarray:
+        """取出当前的语义 Token 序列（会产生一次拷贝）。"""
+        return self.y.numpy()
+
+    def last_token(self) -> int:
+        """读取 y 的最后一个元素，即本步输出的语义 Token；直接访问 ORT 管理的内存，不拷贝整条序列。"""
+        position = self.y.shape()[-1] - 1
+        return ctypes.c_int64.from_address(self.y.data_ptr() + position * ctypes.sizeof(ctypes.c_int64)).value
+
+
+class StageDecoderEngine:
+    """
+    使用 IOBinding 驱动 Stage Decoder 的自回归循环。
+
+    上一步输出的 y、y_emb 与 KV Cache 直接作为 OrtValue 绑定到下一步的输入上，
+    不会在 Python 侧转换为 NumPy 数组，也不会在每一步重新构造输入字典。
+    """
+
+    def __init__(self, stage_decoder: ort.InferenceSession):
+        self.session: ort.InferenceSession = stage_decoder
+        self.input_names: List[str] = [inp.name for inp in stage_decoder.get_inputs()]
+        self.output_names: List[str] = [out.name for out in stage_decoder.get_outputs()]
+
+    def start(
+            self,
+            first_stage_decoder: ort.InferenceSession,
+            x: np.ndarray,
+            prompts: np.ndarray,
+            max_steps: int = MAX_DECODE_STEPS,
+    ) -> DecodeState:
+        """运行 First Stage Decoder，并把它的输出包装成可以直接喂给 Stage Decoder 的解码状态。"""
+        output_names = [out.name for out in first_stage_decoder.get_outputs()]
+        y, y_emb, *present_key_values = first_stage_decoder.run_with_ort_values(
+            output_names,
+            {
+                "x": ort.OrtValue.ortvalue_from_numpy(x),
+                "prompts": ort.OrtValue.ortvalue_from_numpy(prompts),
+            },
+        )
+        return DecodeState(self.session.io_binding(), y, y_emb, present_key_values)
+
+    def step(self, state: DecodeState) -> bool:
+        """执行一步解码，返回是否触发了停止条件。"""
+        binding = state.binding
+        for name, value in zip(self.input_names, [state.y, state.y_emb, *state.present_key_values]):
+            binding.bind_ortvalue_input(name, value)
+        # 输出形状随步数增长，每一步都让 ORT 重新分配输出，上一步的输出则作为本步输入继续持有。
+        for name in self.output_names:
+            binding.bind_output(name, "cpu")
+        self.session.run_with_iobinding(binding)
+
+        y, y_emb, stop_condition_tensor, *present_key_values = binding.get_outputs()
+        state.y = y
+        state.y_emb = y_emb
+        state.present_key_values = present_key_values
+        state.generated.append(state.last_token())
+        state.steps += 1
+        state.finished = bool(stop_condition_tensor.numpy())
+        return state.finished
+
+
+class FixedKVStageDecoderEngine(StageDecoderEngine):
+    """
+    驱动固定容量 KV Cache 的 Stage Decoder 变体 (t2s_stage_decoder_kv_fp32.onnx)。
+
+    各层的 K/V 缓冲区按最大长度一次性分配，并在解码开始时同时绑定为输入与输出：
+    图内把本步的 k/v 写入 kv_position 处并屏蔽之后未写入的部分，缓冲区原地更新，
+    每一步只需要重新绑定位置与 y，不再拷贝或重新分配 KV Cache，内存占用在整个解码过程中保持不变。
+    """
+
+    def __init__(self, stage_decoder: ort.InferenceSession):
+        super().__init__(stage_decoder)
+        inputs = {inp.name: inp for inp in stage_decoder.get_inputs()}
+        self.num_layers: int = sum(1 for name in inputs if name.startswith('k_cache_layer_'))
+        _, self.num_heads, self.head_dim, _ = inputs['k_cache_layer_0'].shape
+
+    def start(
+            self,
+            first_stage_decoder: ort.InferenceSession,
+            x: np.ndarray,
+            prompts: np.ndarray,
+            max_steps: int = MAX_DECODE_STEPS,
+    ) -> DecodeState:
+        y, y_emb, *present_key_values = first_stage_decoder.run(None, {"x": x, "prompts": prompts})
+        past_length, batch_size, _ = present_key_values[0].shape
+        capacity = past_length + max_steps
+
+        state = DecodeState(self.session.io_binding(), ort.OrtValue.ortvalue_from_numpy(y), None, [])
+        binding = state.binding
+        # 先绑定 y 与 stop_condition_tensor，使它们在 get_outputs() 中固定位于前两位（重新绑定不改变顺序）。
+        binding.bind_output('y', "cpu")
+        binding.bind_output('stop_condition_tensor', "cpu")
+        for i in range(self.num_layers):
+            past_k = present_key_values[2 * i].reshape(past_length, self.num_heads, self.head_dim)
+            past_v = present_key_values[2 * i + 1].reshape(past_length, self.num_heads, self.head_dim)
+            # 未写入的部分会被掩码屏蔽，但仍需置零，避免未初始化内存中的 NaN 混入注意力结果。
+            k_cache = np.zeros((batch_size, self.num_heads, self.head_dim, capacity), dtype=np.float32)
+            v_cache = np.zeros((batch_size, self.num_heads, capacity, self.head_dim), dtype=np.float32)
+            k_cache[0, :, :, :past_length] = past_k.transpose(1, 2, 0)
+            v_cache[0, :, :past_length] = past_v.transpose(1, 0, 2)
+            for cache, input_name, output_name in (
+                    (k_cache, f'k_cache_layer_{i}', f'present_k_layer_{i}'),
+                    (v_cache, f'v_cache_layer_{i}', f'present_v_layer_{i}'),
+            ):
+                binding.bind_cpu_input(input_name, cache)
+                binding.bind_output(output_name, "cpu", 0, np.float32, list(cache.shape), cache.ctypes.data)
+            state.k_caches.append(k_cache)
+            state.v_caches.append(v_cache)
+        state.kv_position = past_length
+        state.y_position = y_emb.shape[1]
+        return state
+
+    def step(self, state: DecodeState) -> bool:
+        if state.kv_position >= state.k_caches[0].shape[-1]:
+            raise RuntimeError("The preallocated KV cache is full.")
+
+        binding = state.binding
+        binding.bind_ortvalue_input('iy', state.y)
+        binding.bind_cpu_input('kv_position', np.array([state.kv_position], dtype=np.int64))
+        binding.bind_cpu_input('y_position', np.array([state.y_position], dtype=np.int64))
+        binding.bind_output('y', "cpu")
+        binding.bind_output('stop_condition_tensor', "cpu")
+        self.session.run_with_iobinding(binding)
+
+        y, stop_condition_tensor = binding.get_outputs()[:2]
+        state.y = y
+        state.generated.append(state.last_token())
+        state.kv_position += 1
+        state.y_position += 1
+        state.steps += 1
+        state.finished = bool(stop_condition_tensor.numpy())
+        return state.finished
+
+
+def create_engine(stage_decoder: ort.InferenceSession) -> StageDecoderEngine:
+    """根据输入名判断会话是否为固定容量 KV Cache 变体，并创建对应的解码引擎。"""
+    input_names = {inp.name for inp in stage_decoder.get_inputs()}
+    output_names = {out.name for out in stage_decoder.get_outputs()}
+    if "kv_position" in input_names:
+        return FixedKVStageDecoderEngine(stage_decoder)
+    if "new_k_layer_0" in output_names:
+        raise RuntimeError("This fixed KV cache Stage Decoder was exported by an older version; "
+                           "please convert the model again.")
+    return StageDecoderEngine(stage_decoder)
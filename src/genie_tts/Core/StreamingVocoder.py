@@ -0,0 +1,96 @@
+import onnxruntime as ort
+import numpy as np
+from typing import Callable, Optional
+
+# 每个窗口至少新输出多少个语义 Token 的音频（25 Token ≈ 1 秒）。
+STREAM_CHUNK_TOKENS: int = 25
+# 窗口左侧额外带上的、已经输出过的 Token 数，为声码器提供上文。
+STREAM_CONTEXT_TOKENS: int = 10
+# 窗口右侧暂不输出的 Token 数：缺少下文的边缘音频不可靠，留给下一个窗口重新生成。
+STREAM_OVERLAP_TOKENS: int = 4
+# 相邻窗口边界处交叉淡化的采样点数。
+STREAM_CROSSFADE_SAMPLES: int = 1280
+
+
+class StreamingVocoder:
+    """
+    在语义 Token 仍在生成时，按重叠窗口运行 VITS 声码器并立即输出 PCM。
+
+    每个窗口覆盖 [已输出位置 - 上文, 输出终点 + 右侧保留)，只输出其中 [已输出位置, 输出终点) 的音频；
+    被保留的右侧边缘会在下一个窗口中重新生成，并与上一个窗口对应的尾部音频做交叉淡化。
+
+    解码过程中的停滞、循环检测会在提前结束时丢弃末尾的若干 Token，而已经输出的音频无法撤回，
+    因此 holdback_tokens 应不小于检测器一次最多丢弃的 Token 数：这部分 Token 在解码结束前不会被输出。
+    """
+
+    def __init__(
+            self,
+            vocoder: ort.InferenceSession,
+            text_seq: np.ndarray,
+            ref_audio: np.ndarray,
+            audio_callback: Callable[[np.ndarray], None],
+            chunk_tokens: int = STREAM_CHUNK_TOKENS,
+            context_tokens: int = STREAM_CONTEXT_TOKENS,
+            overlap_tokens: int = STREAM_OVERLAP_TOKENS,
+            crossfade_samples: int = STREAM_CROSSFADE_SAMPLES,
+            holdback_tokens: int = 0,
+            run_options: Optional[ort.RunOptions] = None,
+    ):
+        self.vocoder: ort.InferenceSession = vocoder
+        self.text_seq: np.ndarray = text_seq
+        self.ref_audio: np.ndarray = ref_audio
+        self.audio_callback: Callable[[np.ndarray], None] = audio_callback
+        self.chunk_tokens: int = chunk_tokens
+        self.context_tokens: int = context_tokens
+        self.overlap_tokens: int = max(1, overlap_tokens)
+        self.crossfade_samples: int = crossfade_samples
+        self.holdback_tokens: int = max(0, holdback_tokens)  # 可能被提前结束丢弃、暂不输出的末尾 Token 数
+        self.run_options: Optional[ort.RunOptions] = run_options  # 设置 terminate 可中止正在运行的声码器
+
+        self.emitted_tokens: int = 0  # 已输出音频所对应的 Token 数
+        self._tail: Optional[np.ndarray] = None  # 上一个窗口中紧跟已输出部分的音频，用于交叉淡化
+
+    def _vocode(self, tokens: np.ndarray) -> np.ndarray:
+        return self.vocoder.run(None, {
+            "text_seq": self.text_seq,
+            "pred_semantic": tokens.reshape(1, 1, -1),
+            "ref_audio": self.ref_audio,
+        }, self.run_options)[0]
+
+    def feed(self, tokens: np.ndarray) -> None:
+        """传入目前已生成的全部合法语义 Token (1 维，不含 EOS)，凑够一个窗口时输出音频。"""
+        end = len(tokens) - self.holdback_tokens - self.overlap_tokens
+        if end - self.emitted_tokens >= self.chunk_tokens:
+            self._emit(tokens, end)
+
+    def finish(self, tokens: np.ndarray) -> None:
+        """
+        传入最终的语义 Token 序列，输出剩余的全部音频。
+
+        若最终序列比已输出的部分还短（保留的 Token 少于实际丢弃的数量），多出的音频已经无法撤回。
+        """
+        if len(tokens) > self.emitted_tokens:
+            self._emit(tokens, len(tokens))
+        self._tail = None
+
+    def _emit(self, tokens: np.ndarray, end: int) -> None:
+        final = end >= len(tokens)
+        start = max(0, self.emitted_tokens - self.context_tokens)
+        window = tokens[start:end + self.overlap_tokens]
+        audio = self._vocode(window)
+        samples_per_token = len(audio) / len(window)
+
+        begin_sample = round((self.emitted_tokens - start) * samples_per_token)
+        end_sample = len(audio) if final else round((end - start) * samples_per_token)
+        chunk = audio[begin_sample:end_sample].copy()
+
+        if self._tail is not None:
+            fade = min(len(self._tail), len(chunk))
+            if fade > 0:
+                ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+                chunk[:fade] = self._tail[:fade] * (1.0 - ramp) + chunk[:fade] * ramp
+        self._tail = None if final else audio[end_sample:end_sample + self.crossfade_samples]
+
+        self.emitted_tokens = end
+        if len(chunk) > 0:
+            self.audio_callback(chunk)
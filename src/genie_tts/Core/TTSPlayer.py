@@ -6,20 +6,25 @@ import threading
 import time
 
 import numpy as np
-import wave
-from typing import Optional, List, Callable
+from typing import Optional, List, Callable, Union
 import pyaudio
 import logging
 
-from ..Japanese.Split import split_japanese_text
+from ..Japanese.Split import StreamingTextSplitter, SPLIT_MODE_LOW_LATENCY, split_japanese_text_low_latency
 from ..Core.Inference import tts_client
+from ..Core.Pipeline import (STREAM_END, TASK_FAILED, PIPELINE_QUEUE_SIZE, SentenceTask, AudioOutput,
+                             put_until_stopped, get_until_stopped, audio_to_pcm16, pcm16_to_audio)
+from ..Core.SentenceScheduler import sentence_scheduler, SentenceSlot, PRIORITY_INTERACTIVE
+from ..Audio.AudioCache import audio_cache
 from ..ModelManager import model_manager
 from ..Utils.Shared import context
 from ..Utils.Utils import clear_queue
 
 logger = logging.getLogger(__name__)
 
-STREAM_END = 'STREAM_END'  # 这是一个特殊的标记，表示文本流结束
+# 等待 G2P 的文本与等待播放的音频块的最大数量。队列已满时 feed 与声码器线程会阻塞等待，使内存占用保持有界。
+TEXT_QUEUE_SIZE: int = int(os.getenv('Max_Pending_Text_Chunks', '64'))
+PLAYBACK_QUEUE_SIZE: int = int(os.getenv('Max_Playback_Queue_Chunks', '32'))
 
 
 class TTSPlayer:
@@ -28,91 +33,168 @@ class TTSPlayer:
         self.channels: int = 1
         self.bytes_per_sample: int = 2  # 16-bit audio
 
-        self._text_queue: queue.Queue = queue.Queue()
-        self._audio_queue: queue.Queue = queue.Queue()
+        self._text_queue: queue.Queue = queue.Queue(maxsize=TEXT_QUEUE_SIZE)
+        self._phones_queue: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self._vocoder_queue: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self._audio_queue: queue.Queue = queue.Queue(maxsize=PLAYBACK_QUEUE_SIZE)
 
         self._stop_event: threading.Event = threading.Event()
         self._tts_done_event: threading.Event = threading.Event()
         self._api_lock: threading.Lock = threading.Lock()
 
+        self._g2p_worker: Optional[threading.Thread] = None
         self._tts_worker: Optional[threading.Thread] = None
+        self._vocoder_worker: Optional[threading.Thread] = None
         self._playback_worker: Optional[threading.Thread] = None
 
         self._play: bool = False
-        self._current_save_path: Optional[str] = None
-        self._session_audio_chunks: List[np.ndarray] = []
-        self._start_time: Optional[float] = None
-        self._end_time: Optional[float] = None
-        self._split: bool = False
-
-        self._chunk_callback: Optional[Callable[[Optional[bytes]], None]] = None
-
-    @staticmethod
-    def _preprocess_for_playback(audio_float: np.ndarray) -> bytes:
-        audio_int16 = (audio_float.squeeze() * 32767).astype(np.int16)
-        return audio_int16.tobytes()
-
-    def _tts_worker_loop(self):
-        """从文本队列取句子，生成音频，并通过回调函数或音频队列分发。"""
-        while not self._stop_event.is_set():
-            try:
-                sentence = self._text_queue.get(timeout=1)
-                if sentence is None or self._stop_event.is_set():
-                    break
-            except queue.Empty:
+        # 本次会话的音频输出：回调、保存文件、首包延迟与整句音频缓存的数据收集。
+        self._output: AudioOutput = AudioOutput(sample_rate=sample_rate)
+        self._split: Union[bool, str] = False
+        self._segment_index: int = 0  # 低首包延迟模式下本次会话已输出的分段数量
+        self._splitter: StreamingTextSplitter = StreamingTextSplitter()
+        self._flush_timeout: Optional[float] = None
+        self._flush_timer: Optional[threading.Timer] = None
+        self._stream_vocoder: bool = False
+        self._priority: str = PRIORITY_INTERACTIVE
+        # 整句音频缓存：命中时 _cached_pcm 为缓存的音频，未命中时由 _output 收集 PCM 数据，会话成功结束后写入缓存。
+        self._cached_pcm: Optional[bytes] = None
+        self._session_failed: bool = False
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """向有界队列放入元素，队列已满时阻塞，直到放入成功或会话被停止。"""
+        return put_until_stopped(q, item, self._stop_event)
+
+    def _get(self, q: queue.Queue):
+        """从队列取出元素，收到 None 或会话被停止时返回 None。"""
+        return get_until_stopped(q, self._stop_event)
+
+    def _g2p_worker_loop(self):
+        """流水线第一阶段：从文本队列取句子，转换为音素序列。"""
+        while True:
+            sentence = self._get(self._text_queue)
+            if sentence is None:
+                break
+            if sentence is STREAM_END:
+                self._put(self._phones_queue, STREAM_END)
                 continue
 
             try:
-                if sentence is STREAM_END:
-                    if self._current_save_path and self._session_audio_chunks:
-                        self._save_session_audio()
-
-                    # 在TTS工作线程完成时，通过回调发送结束信号
-                    if self._chunk_callback:
-                        self._chunk_callback(None)
-
-                    self._tts_done_event.set()
-                    continue
-
                 gsv_model = model_manager.get(context.current_speaker)
                 if not gsv_model or not context.current_prompt_audio:
                     logger.error("Missing model or reference audio.")
+                    self._session_failed = True
                     continue
 
-                tts_client.stop_event.clear()
-                audio_chunk = tts_client.tts(
-                    text=sentence,
-                    prompt_audio=context.current_prompt_audio,
+                task = SentenceTask(sentence, context.current_speaker, gsv_model, context.current_prompt_audio)
+                task.text_seq = tts_client.text_to_phones(sentence)
+                self._put(self._phones_queue, task)
+            except Exception as e:
+                logger.error(f"A critical error occurred while processing the TTS task: {e}", exc_info=True)
+                self._put(self._phones_queue, TASK_FAILED)
+
+    def _tts_worker_loop(self):
+        """流水线第二阶段：运行 T2S 生成语义 Token；流式声码器模式下同时输出音频块。"""
+        while True:
+            task = self._get(self._phones_queue)
+            if task is None:
+                break
+            if task is STREAM_END or task is TASK_FAILED:
+                self._put(self._vocoder_queue, task)
+                continue
+
+            # 与其他会话共享推理资源：按优先级与角色轮转获得名额后再运行 T2S。
+            # 名额只在推理期间持有，向声码器队列交付（队列已满时会阻塞）之前先归还。
+            slot = SentenceSlot(sentence_scheduler, task.character_name, self._priority, self._stop_event)
+            if not slot.acquire():
+                break
+            result = None
+            try:
+                gsv_model = task.gsv_model
+                semantic_tokens = tts_client.generate_semantic_tokens(
+                    text_seq=task.text_seq,
+                    prompt_audio=task.prompt_audio,
                     encoder=gsv_model.T2S_ENCODER,
                     first_stage_decoder=gsv_model.T2S_FIRST_STAGE_DECODER,
                     stage_decoder=gsv_model.T2S_STAGE_DECODER,
                     vocoder=gsv_model.VITS,
+                    # 流式音频块同样经过声码器队列，保证与前面句子的音频按顺序输出。
+                    audio_callback=(lambda chunk: self._put_without_slot(slot, chunk))
+                    if self._stream_vocoder else None,
                 )
+                if semantic_tokens is not None and not self._stream_vocoder:
+                    task.semantic_tokens = semantic_tokens
+                    result = task
+            except Exception as e:
+                logger.error(f"A critical error occurred while processing the TTS task: {e}", exc_info=True)
+                result = TASK_FAILED
+            finally:
+                slot.release()
+            if result is not None:
+                self._put(self._vocoder_queue, result)
+
+    def _put_without_slot(self, slot: SentenceSlot, chunk: np.ndarray) -> None:
+        with slot.suspended():
+            self._put(self._vocoder_queue, chunk)
+
+    def _vocoder_worker_loop(self):
+        """流水线第三阶段：运行声码器，并通过回调函数或音频队列分发音频。"""
+        while True:
+            task = self._get(self._vocoder_queue)
+            if task is None:
+                break
 
-                if audio_chunk is not None:
-                    if self._end_time is None:
-                        self._end_time = time.time()
-                        if self._start_time:
-                            duration: float = self._end_time - self._start_time
-                            logger.info(f"First packet latency: {duration:.3f} seconds.")
+            try:
+                if task is STREAM_END:
+                    if not self._session_failed:
+                        self._output.put_to_cache()
+                    self._finish_session()
+                    continue
 
-                    if self._play:
-                        self._audio_queue.put(audio_chunk)
-                    if self._current_save_path:
-                        self._session_audio_chunks.append(audio_chunk)
+                if task is TASK_FAILED:
+                    self._session_failed = True
+                    raise RuntimeError("An upstream pipeline stage failed.")
 
-                    # 使用回调函数处理流式数据
-                    if self._chunk_callback:
-                        audio_data = self._preprocess_for_playback(audio_chunk)
-                        self._chunk_callback(audio_data)
+                if isinstance(task, np.ndarray):  # 流式声码器已生成的音频块
+                    self._handle_audio_chunk(task)
+                    continue
+
+                audio_chunk = tts_client.vocode(
+                    text_seq=task.text_seq,
+                    semantic_tokens=task.semantic_tokens,
+                    prompt_audio=task.prompt_audio,
+                    vocoder=task.gsv_model.VITS,
+                )
+                self._handle_audio_chunk(audio_chunk)
 
             except Exception as e:
-                logger.error(f"A critical error occurred while processing the TTS task: {e}", exc_info=True)
+                self._session_failed = True
+                if task is not TASK_FAILED:
+                    logger.error(f"A critical error occurred while processing the TTS task: {e}", exc_info=True)
                 # 发生错误时，也要确保发送结束信号
-                if self._chunk_callback:
-                    self._chunk_callback(None)
+                if self._output.chunk_callback:
+                    self._output.chunk_callback(None)
                 self._tts_done_event.set()
 
+    def _finish_session(self):
+        """保存音频，并通过回调发送结束信号。"""
+        self._output.save()
+        self._output.close()
+        self._tts_done_event.set()
+
+    def _serve_cached_audio(self):
+        """缓存命中：不经过推理流水线，直接通过与合成时相同的路径输出缓存的音频。"""
+        if self._play:
+            self._put(self._audio_queue, pcm16_to_audio(self._cached_pcm))
+        self._output.write_cached(self._cached_pcm)
+        self._finish_session()
+
+    def _handle_audio_chunk(self, audio_chunk: np.ndarray):
+        """分发一段生成好的音频：播放、保存，或通过回调函数流式输出。"""
+        if self._play:
+            self._put(self._audio_queue, audio_chunk)
+        self._output.write(audio_chunk)
+
     def _playback_worker_loop(self):
         p = None
         stream = None
@@ -128,7 +210,7 @@ class TTSPlayer:
                                         channels=self.channels,
                                         rate=self.sample_rate,
                                         output=True)
-                    audio_data = self._preprocess_for_playback(audio_chunk)
+                    audio_data = audio_to_pcm16(audio_chunk)
                     stream.write(audio_data)
                 except queue.Empty:
                     if stream is not None:
@@ -148,84 +230,136 @@ class TTSPlayer:
             if p:
                 p.terminate()
 
-    def _save_session_audio(self):
-        try:
-            full_audio = np.concatenate(self._session_audio_chunks, axis=0)
-            with wave.open(self._current_save_path, 'wb') as wf:
-                wf.setnchannels(self.channels)
-                wf.setsampwidth(self.bytes_per_sample)
-                wf.setframerate(self.sample_rate)
-                wf.writeframes(self._preprocess_for_playback(full_audio))
-            logger.info(f"Audio successfully saved to {os.path.abspath(self._current_save_path)}")
-        except Exception as e:
-            logger.error(f"Failed to save audio: {e}")
-        finally:
-            self._session_audio_chunks = []
-            self._current_save_path = None
-
     def start_session(self,
                       play: bool = False,
-                      split: bool = False,
+                      split: Union[bool, str] = False,
                       save_path: Optional[str] = None,
-                      chunk_callback: Optional[Callable[[Optional[bytes]], None]] = None
+                      chunk_callback: Optional[Callable[[Optional[bytes]], None]] = None,
+                      stream_vocoder: bool = False,
+                      flush_timeout: Optional[float] = None,
+                      cache_key: Optional[str] = None,
+                      priority: str = PRIORITY_INTERACTIVE,
                       ):
+        """
+        开始一个新的 TTS 会话。
+
+        split 为 True 或 SPLIT_MODE_LOW_LATENCY 时，feed 传入的文本会被增量分句：句子一旦被句末标点结束就立即送入合成队列，
+        未完成的部分在多次 feed 之间保留。若设置了 flush_timeout（秒），文本流停顿超过该时长时，
+        缓冲区中未完成的句子也会被送入合成队列。
+        SPLIT_MODE_LOW_LATENCY 模式下，句子会再按 split_japanese_text_low_latency 切分：第一段很短，之后逐步变长。
+        若传入 cache_key（由 audio_cache.make_key 计算，对应本次会话将要 feed 的全部文本），命中时 feed 的文本被忽略，
+        end_session 时直接输出缓存的音频；未命中时会话成功结束后把生成的音频写入缓存。
+        priority 为每句话向 sentence_scheduler 申请推理名额时使用的优先级。
+        """
         with self._api_lock:
             self._tts_done_event.clear()
-            self._chunk_callback = chunk_callback
             self._stop_event.clear()
+            tts_client.stop_event.clear()
+
+            if self._g2p_worker is None or not self._g2p_worker.is_alive():
+                self._g2p_worker = threading.Thread(target=self._g2p_worker_loop, daemon=True)
+                self._g2p_worker.start()
 
             if self._tts_worker is None or not self._tts_worker.is_alive():
                 self._tts_worker = threading.Thread(target=self._tts_worker_loop, daemon=True)
                 self._tts_worker.start()
 
+            if self._vocoder_worker is None or not self._vocoder_worker.is_alive():
+                self._vocoder_worker = threading.Thread(target=self._vocoder_worker_loop, daemon=True)
+                self._vocoder_worker.start()
+
             if self._playback_worker is None or not self._playback_worker.is_alive():
                 self._playback_worker = threading.Thread(target=self._playback_worker_loop, daemon=True)
                 self._playback_worker.start()
 
             clear_queue(self._text_queue)
+            clear_queue(self._phones_queue)
+            clear_queue(self._vocoder_queue)
             clear_queue(self._audio_queue)
 
             self._play = play
             self._split = split
-            self._current_save_path = save_path
-            self._session_audio_chunks = []
-            self._start_time = None
-            self._end_time = None
+            self._segment_index = 0
+            self._cancel_flush_timer()
+            self._splitter = StreamingTextSplitter()
+            self._flush_timeout = flush_timeout
+            self._stream_vocoder = stream_vocoder
+            self._priority = priority
+            self._output = AudioOutput(chunk_callback, save_path, cache_key, self.sample_rate)
+            self._cached_pcm = audio_cache.get(cache_key) if cache_key else None
+            self._session_failed = False
 
     def feed(self, text_chunk: str):
         with self._api_lock:
             if not text_chunk:
                 return
-            if self._start_time is None:
-                self._start_time = time.time()
+            if self._output.start_time is None:
+                self._output.start_time = time.time()
+            if self._cached_pcm is not None:
+                return
 
             if self._split:
-                sentences = split_japanese_text(text_chunk.strip())
-                for sentence in sentences:
-                    self._text_queue.put(sentence)
+                self._enqueue_sentences(self._splitter.feed(text_chunk))
+                self._restart_flush_timer()
             else:
-                self._text_queue.put(text_chunk)
+                self._put(self._text_queue, text_chunk)
+
+    def _enqueue_sentences(self, sentences: List[str]):
+        if sentences and self._split == SPLIT_MODE_LOW_LATENCY:
+            sentences = split_japanese_text_low_latency(''.join(sentences), self._segment_index)
+            self._segment_index += len(sentences)
+        for sentence in sentences:
+            self._put(self._text_queue, sentence)
+
+    def _cancel_flush_timer(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    def _restart_flush_timer(self):
+        self._cancel_flush_timer()
+        if self._flush_timeout is not None and self._splitter.has_pending_text:
+            self._flush_timer = threading.Timer(self._flush_timeout, self._on_flush_timeout)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _on_flush_timeout(self):
+        with self._api_lock:
+            self._flush_timer = None
+            self._enqueue_sentences(self._splitter.flush())
 
     def end_session(self):
         with self._api_lock:
-            self._text_queue.put(STREAM_END)
+            if self._cached_pcm is not None:
+                if self._output.start_time is None:
+                    self._output.start_time = time.time()
+                self._serve_cached_audio()
+                return
+            self._cancel_flush_timer()
+            self._enqueue_sentences(self._splitter.flush())
+            self._put(self._text_queue, STREAM_END)
 
     def stop(self):
+        # 先于获取锁设置停止标志：feed 可能正持锁等待文本队列的空位，需要让它先返回。
+        self._stop_event.set()
+        tts_client.stop_event.set()
         with self._api_lock:
             if self._tts_worker is None and self._playback_worker is None:
                 return
-            if self._stop_event.is_set():
-                return
-            tts_client.stop_event.set()
-            self._stop_event.set()
+            self._cancel_flush_timer()
             self._tts_done_event.set()
-            self._text_queue.put(None)
-            self._audio_queue.put(None)
-            if self._tts_worker and self._tts_worker.is_alive():
-                self._tts_worker.join()
-            if self._playback_worker and self._playback_worker.is_alive():
-                self._playback_worker.join()
+            for q in (self._text_queue, self._phones_queue, self._vocoder_queue, self._audio_queue):
+                clear_queue(q)
+                try:
+                    q.put_nowait(None)
+                except queue.Full:
+                    pass  # 工作线程会通过 _stop_event 自行退出。
+            for worker in (self._g2p_worker, self._tts_worker, self._vocoder_worker, self._playback_worker):
+                if worker and worker.is_alive():
+                    worker.join()
+            self._g2p_worker = None
             self._tts_worker = None
+            self._vocoder_worker = None
             self._playback_worker = None
 
     def wait_for_tts_completion(self):
@@ -0,0 +1,278 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Union
+
+import numpy as np
+import onnxruntime as ort
+
+from ..Audio.AudioCache import audio_cache
+from ..Audio.ReferenceAudio import ReferenceAudio
+from ..Core.Inference import tts_client
+from ..Core.Pipeline import (STREAM_END, PIPELINE_QUEUE_SIZE, SentenceTask, AudioOutput,
+                             put_until_stopped, get_until_stopped)
+from ..Core.SentenceScheduler import sentence_scheduler, SentenceSlot, PRIORITY_INTERACTIVE
+from ..Japanese.Split import split_text
+from ..ModelManager import model_manager, GSVModel
+
+logger = logging.getLogger(__name__)
+
+
+class TTSSession:
+    """
+    一次独立的 TTS 请求。
+
+    与全局的 tts_player 不同，会话自己持有角色、参考音频、回调函数与停止标志，
+    不读写全局 context，因此多个会话可以在共享的推理线程池上并行执行、互不干扰。
+    与 tts_player 相同，合成按 G2P -> T2S -> 声码器分阶段流水线进行：各阶段之间是本会话自己的有界队列，
+    T2S 与声码器阶段运行在 TTSSessionPool 共享的线程池上，下一句的 T2S 可以与上一句的声码器并行。
+    """
+
+    def __init__(
+            self,
+            character_name: str,
+            prompt_audio: ReferenceAudio,
+            split: Union[bool, str] = False,
+            save_path: Optional[str] = None,
+            chunk_callback: Optional[Callable[[Optional[bytes]], None]] = None,
+            stream_vocoder: bool = False,
+            sample_rate: int = 32000,
+            cache_key: Optional[str] = None,
+            tenant: Optional[str] = None,
+            priority: str = PRIORITY_INTERACTIVE,
+    ):
+        self.character_name: str = character_name
+        self.prompt_audio: ReferenceAudio = prompt_audio
+        self.split: Union[bool, str] = split
+        self.stream_vocoder: bool = stream_vocoder
+        # 句子调度：每句话合成前按优先级与租户向 sentence_scheduler 申请名额，租户默认为角色名。
+        self.tenant: str = tenant or character_name
+        self.priority: str = priority
+
+        self.stop_event: threading.Event = threading.Event()
+        # 停止时设置 terminate，中止正在运行的声码器调用；T2S 解码则由 stop_event 在步与步之间结束。
+        self.run_options: ort.RunOptions = ort.RunOptions()
+        self.done_event: threading.Event = threading.Event()
+        # cache_key 由 audio_cache.make_key 计算，None 表示不使用整句音频缓存。
+        self._output: AudioOutput = AudioOutput(chunk_callback, save_path, cache_key, sample_rate)
+        self._phones_queue: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self._vocoder_queue: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    @property
+    def cache_key(self) -> Optional[str]:
+        return self._output.cache_key
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.run_options.terminate = True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done_event.wait(timeout)
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        return put_until_stopped(q, item, self.stop_event)
+
+    def _get(self, q: queue.Queue):
+        return get_until_stopped(q, self.stop_event)
+
+    def _fail(self, e: Exception) -> None:
+        """某个阶段出错时停止整个会话，其余阶段会在下一次读写队列时退出。"""
+        if self.stop_event.is_set():  # 被停止时中止的声码器调用会抛出异常
+            logger.info("TTS session stopped.")
+        else:
+            logger.error(f"A critical error occurred while processing the TTS task: {e}", exc_info=True)
+        self.stop()
+
+    def run(self, text: str, pool: 'TTSSessionPool') -> None:
+        """
+        合成整段文本，结束（包括出错或被停止）时通过回调发送 None。
+
+        当前线程执行 G2P 阶段，T2S 与声码器阶段由 pool 提交到共享的线程池，本方法在所有阶段结束后返回。
+        """
+        self._output.start_time = time.time()
+        try:
+            gsv_model = model_manager.get(self.character_name)
+            if not gsv_model:
+                logger.error(f"Character '{self.character_name}' is not loaded.")
+                return
+
+            cached_pcm = audio_cache.get(self.cache_key) if self.cache_key else None
+            if cached_pcm is not None:
+                self._output.write_cached(cached_pcm)
+                self._output.save()
+                return
+
+            stages = pool.start_stages(self._t2s_stage, self._vocoder_stage)
+            try:
+                self._g2p_stage(gsv_model, text)
+            except Exception as e:
+                self._fail(e)
+            wait(stages)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._output.close()
+            self.done_event.set()
+
+    def _g2p_stage(self, gsv_model: GSVModel, text: str) -> None:
+        """流水线第一阶段：分句并转换为音素序列。"""
+        sentences = split_text(text.strip(), self.split) if self.split else [text]
+        for sentence in sentences:
+            task = SentenceTask(sentence, self.character_name, gsv_model, self.prompt_audio)
+            task.text_seq = tts_client.text_to_phones(sentence)
+            if not self._put(self._phones_queue, task):
+                return
+        self._put(self._phones_queue, STREAM_END)
+
+    def _t2s_stage(self) -> None:
+        """
+        流水线第二阶段：在持有名额时运行 T2S。
+
+        整句的语义 Token 与流式声码器的音频块都经声码器队列按顺序交付；
+        交付（队列已满时会阻塞）之前先归还名额，避免慢速的消费方占着名额让其他会话等待。
+        """
+        # 每次申请名额时读取 self.priority，合成过程中被提升的优先级从下一句开始生效。
+        slot = SentenceSlot(sentence_scheduler, self.tenant, lambda: self.priority, self.stop_event)
+        try:
+            while True:
+                task = self._get(self._phones_queue)
+                if task is None:
+                    return
+                if task is STREAM_END:
+                    self._put(self._vocoder_queue, STREAM_END)
+                    return
+                if not slot.acquire():
+                    return
+                try:
+                    semantic_tokens = tts_client.generate_semantic_tokens(
+                        text_seq=task.text_seq,
+                        prompt_audio=task.prompt_audio,
+                        encoder=task.gsv_model.T2S_ENCODER,
+                        first_stage_decoder=task.gsv_model.T2S_FIRST_STAGE_DECODER,
+                        stage_decoder=task.gsv_model.T2S_STAGE_DECODER,
+                        vocoder=task.gsv_model.VITS,
+                        audio_callback=(lambda chunk: self._put_without_slot(slot, chunk))
+                        if self.stream_vocoder else None,
+                        stop_event=self.stop_event,
+                        run_options=self.run_options,
+                    )
+                finally:
+                    slot.release()
+                if semantic_tokens is not None and not self.stream_vocoder:
+                    task.semantic_tokens = semantic_tokens
+                    self._put(self._vocoder_queue, task)
+        except Exception as e:
+            self._fail(e)
+
+    def _put_without_slot(self, slot: SentenceSlot, chunk: np.ndarray) -> None:
+        with slot.suspended():
+            self._put(self._vocoder_queue, chunk)
+
+    def _vocoder_stage(self) -> None:
+        """流水线第三阶段：运行声码器并输出音频；收到 STREAM_END 时写入整句音频缓存并保存文件。"""
+        try:
+            while True:
+                task = self._get(self._vocoder_queue)
+                if task is None:
+                    return
+                if task is STREAM_END:
+                    self._output.put_to_cache()
+                    self._output.save()
+                    return
+                if isinstance(task, np.ndarray):  # 流式声码器已生成的音频块
+                    self._output.write(task)
+                    continue
+                self._output.write(tts_client.vocode(
+                    text_seq=task.text_seq,
+                    semantic_tokens=task.semantic_tokens,
+                    prompt_audio=task.prompt_audio,
+                    vocoder=task.gsv_model.VITS,
+                    run_options=self.run_options,
+                ))
+        except Exception as e:
+            self._fail(e)
+
+
+class TTSSessionPool:
+    """
+    在共享的推理线程池上执行 TTS 会话，并记录进行中的会话以便统一停止。
+
+    准入控制：正在执行与排队等待的会话总数不超过 max_workers + max_queued，
+    调用方应先通过 try_admit 占用名额，名额已满时拒绝请求，而不是让线程池的等待队列无限增长。
+    每个被接纳的会话都有自己的线程（运行 G2P 阶段），T2S 与声码器阶段运行在各自共享的线程池上，
+    同时进行推理的句子数由 sentence_scheduler 控制（默认同为 max_workers），因此后到的交互式请求不会排在长文本会话之后等待线程。
+    """
+
+    def __init__(self, max_workers: int = 4, max_queued: int = 16):
+        self.max_workers: int = max(1, max_workers)
+        self.max_queued: int = max(0, max_queued)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._t2s_executor: Optional[ThreadPoolExecutor] = None
+        self._vocoder_executor: Optional[ThreadPoolExecutor] = None
+        self._sessions: set[TTSSession] = set()
+        self._admitted: int = 0  # 已占用的名额，包括尚未提交的
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queued
+
+    def try_admit(self) -> bool:
+        """占用一个名额，已满时返回 False。占用后必须调用 submit(..., admitted=True) 或 cancel_admission。"""
+        with self._lock:
+            if self._admitted >= self.capacity:
+                return False
+            self._admitted += 1
+            return True
+
+    def cancel_admission(self) -> None:
+        with self._lock:
+            self._admitted -= 1
+
+    def submit(self, session: TTSSession, text: str, admitted: bool = False) -> Future:
+        """提交会话；admitted 为 False 时不受准入限制，但同样计入名额。"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.capacity,
+                                                    thread_name_prefix='genie-tts-session')
+                self._t2s_executor = ThreadPoolExecutor(max_workers=self.capacity,
+                                                        thread_name_prefix='genie-tts-t2s')
+                self._vocoder_executor = ThreadPoolExecutor(max_workers=self.capacity,
+                                                            thread_name_prefix='genie-tts-vocoder')
+            self._sessions.add(session)
+            if not admitted:
+                self._admitted += 1
+        return self._executor.submit(self._run, session, text)
+
+    def start_stages(self, t2s_stage: Callable[[], None], vocoder_stage: Callable[[], None]) -> List[Future]:
+        """
+        把一个会话的 T2S 与声码器阶段提交到共享的线程池。
+
+        T2S 阶段会等待同一会话的声码器阶段读取队列，因此持锁提交，使各会话在两个线程池中的排队顺序一致：
+        先获得 T2S 线程的会话也总是先获得声码器线程，不会出现两个会话各占一个阶段、互相等待的情况。
+        """
+        with self._lock:
+            return [self._t2s_executor.submit(t2s_stage), self._vocoder_executor.submit(vocoder_stage)]
+
+    def _run(self, session: TTSSession, text: str) -> None:
+        try:
+            session.run(text, self)
+        finally:
+            with self._lock:
+                self._sessions.discard(session)
+                self._admitted -= 1
+
+    def stop_all(self) -> None:
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            session.stop()
+
+
+tts_session_pool: TTSSessionPool = TTSSessionPool(
+    max_workers=int(os.getenv('Max_Concurrent_TTS_Sessions', '4')),
+    max_queued=int(os.getenv('Max_Queued_TTS_Sessions', '16')),
+)
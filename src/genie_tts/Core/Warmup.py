@@ -0,0 +1,45 @@
+import logging
+import time
+
+import numpy as np
+
+from .Inference import tts_client
+from ..ModelManager import GSVModel
+from ..Utils.Constants import BERT_FEATURE_DIM
+
+logger = logging.getLogger(__name__)
+
+# 预热使用的合成输入：约 1 秒的参考音频特征、10 个音素，以及少量解码步。
+WARMUP_PHONEMES: int = 10
+WARMUP_SSL_FRAMES: int = 50
+WARMUP_DECODE_STEPS: int = 8
+WARMUP_SEMANTIC_TOKENS: int = 25
+
+
+def warmup_model(gsv_model: GSVModel) -> None:
+    """
+    用合成输入依次运行 Encoder、First Stage Decoder、若干步 Stage Decoder 与 VITS，
+    提前完成内核选择、内存池分配与解码引擎的创建，使第一个真实请求不必承担这部分开销。
+    """
+    start_time = time.perf_counter()
+    phones = np.arange(1, WARMUP_PHONEMES + 1, dtype=np.int64)[None, :]
+    bert = np.zeros((WARMUP_PHONEMES, BERT_FEATURE_DIM), dtype=np.float32)
+    x, prompts = gsv_model.T2S_ENCODER.run(None, {
+        "ref_seq": phones,
+        "text_seq": phones,
+        "ref_bert": bert,
+        "text_bert": bert,
+        "ssl_content": np.zeros((1, 768, WARMUP_SSL_FRAMES), dtype=np.float32),
+    })
+
+    engine = tts_client.get_engine(gsv_model.T2S_STAGE_DECODER)
+    state = engine.start(gsv_model.T2S_FIRST_STAGE_DECODER, x, prompts)
+    for _ in range(WARMUP_DECODE_STEPS):
+        engine.step(state)
+
+    gsv_model.VITS.run(None, {
+        "text_seq": phones,
+        "pred_semantic": np.zeros((1, 1, WARMUP_SEMANTIC_TOKENS), dtype=np.int64),
+        "ref_audio": np.zeros((1, 32000), dtype=np.float32),
+    })
+    logger.info(f"Model warm-up finished in {time.perf_counter() - start_time:.3f} seconds.")
@@ -0,0 +1,123 @@
+import atexit
+import json
+import logging
+import os
+import threading
+from importlib import metadata
+from typing import Dict, List, Optional, Tuple
+
+from ..Utils.Utils import LRUCacheDict
+
+logger = logging.getLogger(__name__)
+
+
+def _pyopenjtalk_version() -> str:
+    try:
+        return metadata.version('pyopenjtalk')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+# G2P 结果的版本：修改 G2P 的处理逻辑或音素表时递增，使持久化的 G2P 结果（G2P 缓存文件、参考文本的音素缓存）失效。
+# pyopenjtalk 的版本决定其自带的词典，同样计入。
+G2P_VERSION: str = f'1+pyopenjtalk-{_pyopenjtalk_version()}'
+
+
+class G2PCache:
+    """
+    G2P 结果的 LRU 缓存，以规范化后的文本片段为键。
+
+    pyopenjtalk 对每个片段独立分析，片段的结果与上下文无关，因此缓存命中时结果与重新计算完全一致。
+    若设置了持久化路径，启动时从 JSON 文件加载，进程退出时写回；文件记录写入时的 G2P_VERSION，版本不同时不加载。
+    """
+
+    def __init__(self, capacity: int, persist_path: Optional[str] = None):
+        self.capacity: int = capacity
+        self.persist_path: Optional[str] = persist_path
+        self.hits: int = 0
+        self.misses: int = 0
+        self._cache: Dict[Tuple[str, bool], List[str]] = LRUCacheDict(capacity=max(1, capacity))
+        self._lock: threading.Lock = threading.Lock()
+        if self.persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def get(self, segment: str, with_prosody: bool) -> Optional[List[str]]:
+        if not self.enabled:
+            return None
+        key = (segment, with_prosody)
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+            return None
+
+    def put(self, segment: str, with_prosody: bool, phones: List[str]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._cache[(segment, with_prosody)] = phones
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._cache),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def load(self) -> None:
+        if not (self.persist_path and os.path.isfile(self.persist_path)):
+            return
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            version = data.get('version') if isinstance(data, dict) else None
+            if version != G2P_VERSION:
+                logger.info(f"Ignoring G2P cache '{self.persist_path}' written by G2P version {version} "
+                            f"(current: {G2P_VERSION}).")
+                return
+            entries = data['entries']
+            with self._lock:
+                for segment, with_prosody, phones in entries:
+                    self._cache[(segment, bool(with_prosody))] = phones
+            logger.info(f"Loaded {len(self._cache)} G2P cache entries from {self.persist_path}")
+        except Exception as e:
+            logger.warning(f"Failed to load G2P cache from '{self.persist_path}': {e}")
+
+    def save(self) -> None:
+        if not self.persist_path:
+            return
+        try:
+            with self._lock:
+                entries = [[segment, with_prosody, phones] for (segment, with_prosody), phones in self._cache.items()]
+            parent_dir = os.path.dirname(self.persist_path)
+            if parent_dir:
+                os.makedirs(parent_dir, exist_ok=True)
+            tmp_path = self.persist_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': G2P_VERSION, 'entries': entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.persist_path)
+        except Exception as e:
+            logger.warning(f"Failed to save G2P cache to '{self.persist_path}': {e}")
+
+
+# Max_Cached_G2P_Segments 为 0 时关闭缓存；设置 G2P_Cache_Path 可在重启之间保留缓存。
+g2p_cache: G2PCache = G2PCache(
+    capacity=int(os.getenv('Max_Cached_G2P_Segments', '10000')),
+    persist_path=os.getenv('G2P_Cache_Path') or None,
+)
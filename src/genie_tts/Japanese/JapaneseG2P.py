@@ -7,8 +7,9 @@
 
 import re
 import pyopenjtalk
-from typing import List
+from typing import List, NamedTuple
 from .SymbolsV2 import symbols_v2, symbol_to_id_v2
+from .G2PCache import g2p_cache
 
 # 匹配连续的标点符号
 _CONSECUTIVE_PUNCTUATION_RE = re.compile(r"([,./?!~…・])\1+")
@@ -29,6 +30,56 @@ _JAPANESE_MARKS_RE = re.compile(
     r"[^A-Za-z\d\u3005\u3040-\u30ff\u4e00-\u9fff\uff11-\uff19\uff21-\uff3a\uff41-\uff5a\uff66-\uff9d]"
 )
 
+# 一次匹配完整上下文标签中需要的全部字段：p3、A 字段（a1/a2/a3）、e3 与 f1。
+_LABEL_RE = re.compile(
+    r"^[^-]*-([^+]*)\+[^/]*/A:([0-9\-]+|xx)\+(\d+|xx)\+(\d+|xx)/[^!]*!(\d+|xx)_.*?/F:(\d+|xx)_"
+)
+# 逐字段匹配的正则，仅在标签不符合上述格式或字段缺失时回退使用，与逐项搜索的结果保持一致。
+_P3_RE = re.compile(r"-(.*?)\+")
+_A1_RE = re.compile(r"/A:([0-9\-]+)\+")
+_A2_RE = re.compile(r"\+(\d+)\+")
+_A3_RE = re.compile(r"\+(\d+)/")
+_E3_RE = re.compile(r"!(\d+)_")
+_F1_RE = re.compile(r"/F:(\d+)_")
+
+
+class _LabelFeatures(NamedTuple):
+    p3: str
+    a1: int
+    a2: int
+    a3: int
+    f1: int
+    e3: int
+
+
+def _search_feature(regex: re.Pattern, label: str) -> int:
+    match = regex.search(label)
+    return int(match.group(1)) if match else -50
+
+
+def _parse_label(label: str) -> _LabelFeatures:
+    """解析一条 OpenJTalk 完整上下文标签，缺失的数值字段记为 -50。"""
+    match = _LABEL_RE.search(label)
+    if match is None:
+        return _LabelFeatures(
+            p3=_P3_RE.search(label).group(1),
+            a1=_search_feature(_A1_RE, label),
+            a2=_search_feature(_A2_RE, label),
+            a3=_search_feature(_A3_RE, label),
+            f1=_search_feature(_F1_RE, label),
+            e3=_search_feature(_E3_RE, label),
+        )
+    p3, a1, a2, a3, e3, f1 = match.groups()
+    # 字段为 xx（如静音、停顿）时，逐项搜索可能匹配到标签中其他字段的数字，回退以保持相同的结果。
+    return _LabelFeatures(
+        p3=p3,
+        a1=_search_feature(_A1_RE, label) if a1 == 'xx' else int(a1),
+        a2=_search_feature(_A2_RE, label) if a2 == 'xx' else int(a2),
+        a3=_search_feature(_A3_RE, label) if a3 == 'xx' else int(a3),
+        f1=_search_feature(_F1_RE, label) if f1 == 'xx' else int(f1),
+        e3=_search_feature(_E3_RE, label) if e3 == 'xx' else int(e3),
+    )
+
 
 class JapaneseG2P:
     """
@@ -57,28 +108,27 @@ class JapaneseG2P:
         }
         return rep_map.get(ph, ph)
 
-    @staticmethod
-    def _numeric_feature_by_regex(regex: str, s: str) -> int:
-        """从OpenJTalk标签中提取数值特征。"""
-        match = re.search(regex, s)
-        return int(match.group(1)) if match else -50
-
     @staticmethod
     def _pyopenjtalk_g2p_prosody(text: str) -> List[str]:
         """使用pyopenjtalk提取音素及韵律符号。"""
         labels = pyopenjtalk.make_label(pyopenjtalk.run_frontend(text))
+        return JapaneseG2P._labels_to_prosody_phones(labels)
+
+    @staticmethod
+    def _labels_to_prosody_phones(labels: List[str]) -> List[str]:
+        """由OpenJTalk完整上下文标签得到音素及韵律符号。"""
+        features = [_parse_label(label) for label in labels]  # 每条标签只解析一次
         phones = []
-        for n, lab_curr in enumerate(labels):
-            p3 = re.search(r"-(.*?)\+", lab_curr).group(1)
+        for n, feature in enumerate(features):
+            p3 = feature.p3
             if p3 in "AEIOU":
                 p3 = p3.lower()
 
             if p3 == "sil":
                 if n == 0:
                     phones.append("^")
-                elif n == len(labels) - 1:
-                    e3 = JapaneseG2P._numeric_feature_by_regex(r"!(\d+)_", lab_curr)
-                    phones.append("?" if e3 == 1 else "$")
+                elif n == len(features) - 1:
+                    phones.append("?" if feature.e3 == 1 else "$")
                 continue
             elif p3 == "pau":
                 phones.append("_")
@@ -86,12 +136,8 @@ class JapaneseG2P:
             else:
                 phones.append(p3)
 
-            a1 = JapaneseG2P._numeric_feature_by_regex(r"/A:([0-9\-]+)\+", lab_curr)
-            a2 = JapaneseG2P._numeric_feature_by_regex(r"\+(\d+)\+", lab_curr)
-            a3 = JapaneseG2P._numeric_feature_by_regex(r"\+(\d+)/", lab_curr)
-            f1 = JapaneseG2P._numeric_feature_by_regex(r"/F:(\d+)_", lab_curr)
-            lab_next = labels[n + 1] if n + 1 < len(labels) else ""
-            a2_next = JapaneseG2P._numeric_feature_by_regex(r"\+(\d+)\+", lab_next)
+            a1, a2, a3, f1 = feature.a1, feature.a2, feature.a3, feature.f1
+            a2_next = features[n + 1].a2 if n + 1 < len(features) else -50
 
             if a3 == 1 and a2_next == 1 and p3 in "aeiouAEIOUNcl":
                 phones.append("#")
@@ -127,10 +173,13 @@ class JapaneseG2P:
         phonemes = []
         for i, segment in enumerate(japanese_segments):
             if segment:
-                if with_prosody:  # 移除分析结果中句首(^)/句尾($)的符号，因为我们按片段处理
-                    phones = JapaneseG2P._pyopenjtalk_g2p_prosody(segment)[1:-1]
-                else:
-                    phones = pyopenjtalk.g2p(segment).split(" ")
+                phones = g2p_cache.get(segment, with_prosody)
+                if phones is None:
+                    if with_prosody:  # 移除分析结果中句首(^)/句尾($)的符号，因为我们按片段处理
+                        phones = JapaneseG2P._pyopenjtalk_g2p_prosody(segment)[1:-1]
+                    else:
+                        phones = pyopenjtalk.g2p(segment).split(" ")
+                    g2p_cache.put(segment, with_prosody, phones)
                 phonemes.extend(phones)
 
             # 将对应的标点符号添加回来
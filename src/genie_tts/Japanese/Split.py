@@ -1,12 +1,21 @@
 import re
 import logging
+from typing import Union
 
 logger = logging.getLogger(__name__)
 
 MIN_SENTENCE_LENGTH = 5
 
+# 低首包延迟分句模式：第一段的最大有效长度、之后每段的增长倍数，以及任何一段的有效长度上限
+SPLIT_MODE_LOW_LATENCY = 'low_latency'
+FIRST_SEGMENT_LENGTH = 12
+SEGMENT_GROWTH_FACTOR = 2
+MAX_SEGMENT_LENGTH = 60
+
 # 定义用于分割句子的标点
 SENTENCE_TERMINATORS = "、。！？…"
+# 匹配连续的句末标点（如 "！？"、"……"），它们属于同一个句子
+_TERMINATOR_RE = re.compile(f'[{SENTENCE_TERMINATORS}]+')
 # 定义有效字符的正则表达式，用于精确计算长度
 VALID_CHAR_PATTERN = re.compile(
     r'[\u3040-\u309F'  # 平假名
@@ -43,3 +52,148 @@ def split_japanese_text(long_text: str) -> list[str]:
         else:
             final_sentences.append(sentence)
     return final_sentences
+
+
+class StreamingTextSplitter:
+    """
+    增量分句器，用于 LLM 等逐 Token 输出的文本流。
+
+    未完成的文本会在多次 feed 之间保留，一旦某个句子被 SENTENCE_TERMINATORS 中的标点结束，立即返回该句。
+    流式场景下已输出的句子无法再修改，因此有效长度不足 MIN_SENTENCE_LENGTH 的短句会与后续文本合并，
+    而不是像 split_japanese_text 那样并入上一句。
+    """
+
+    def __init__(self):
+        self._buffer: str = ''
+
+    @property
+    def has_pending_text(self) -> bool:
+        return bool(self._buffer.strip())
+
+    def feed(self, text_chunk: str) -> list[str]:
+        """追加一段文本，返回其中已经完整的句子（句末标点之后已出现其他字符）。"""
+        self._buffer += text_chunk
+        sentences = []
+        search_start = 0
+        while True:
+            match = _TERMINATOR_RE.search(self._buffer, search_start)
+            # 标点位于缓冲区末尾时，下一段文本可能还会接上更多标点（如 "！" 之后的 "？"），暂不切分。
+            if match is None or match.end() >= len(self._buffer):
+                break
+            candidate = self._buffer[:match.end()]
+            if get_valid_text_length(candidate) < MIN_SENTENCE_LENGTH:
+                search_start = match.end()  # 短句暂不输出，等待与后面的文本合并
+                continue
+            sentence = candidate.strip()
+            if sentence:
+                sentences.append(sentence)
+            self._buffer = self._buffer[match.end():]
+            search_start = 0
+        return sentences
+
+    def flush(self) -> list[str]:
+        """输出缓冲区中剩余的文本（例如文本流结束或等待超时时），不含有效字符的残余标点会被丢弃。"""
+        remaining = self._buffer.strip()
+        self._buffer = ''
+        if remaining and get_valid_text_length(remaining) > 0:
+            return [remaining]
+        return []
+
+
+def _is_hiragana(char: str) -> bool:
+    return '぀' <= char <= 'ゟ'
+
+
+def _is_phrase_start(char: str) -> bool:
+    """汉字或片假名通常是新文节的开头。"""
+    return '一' <= char <= '鿿' or '゠' <= char <= 'ヿ'
+
+
+def _cut_at_phrase_boundary(text: str, max_length: int, min_length: int = 1) -> tuple[str, str]:
+    """
+    从 text 开头切出有效长度不超过 max_length 的一段，尽量切在文节边界
+    （平假名之后紧跟汉字或片假名的位置、空格之后），找不到时按长度硬切。
+    只使用前面已有至少 min_length 个有效字符的边界，避免切出过短的片段。
+    """
+    valid_count = 0
+    boundary = 0
+    for i, char in enumerate(text):
+        if (i > 0 and valid_count >= min_length
+                and ((_is_hiragana(text[i - 1]) and _is_phrase_start(char)) or text[i - 1] in ' 　')):
+            boundary = i
+        if VALID_CHAR_PATTERN.match(char):
+            if valid_count >= max_length:
+                cut = boundary if boundary > 0 else i
+                return text[:cut], text[cut:]
+            valid_count += 1
+    return text, ''
+
+
+def _segment_target_length(index: int) -> int:
+    return min(MAX_SEGMENT_LENGTH, FIRST_SEGMENT_LENGTH * (SEGMENT_GROWTH_FACTOR ** index))
+
+
+def split_japanese_text_low_latency(long_text: str, start_index: int = 0) -> list[str]:
+    """
+    面向首包延迟的分句：第一段很短（必要时在 "、" 或文节边界处切开），之后的分段逐步变长以提高效率，
+    任何一段的有效长度都不超过 MAX_SEGMENT_LENGTH。
+
+    start_index 为此前已经输出的分段数量，用于在流式输入时延续分段长度的增长。
+    """
+    if not long_text or not long_text.strip():
+        return []
+    # 先在所有句末标点（包括 "、"）处切成子句
+    clauses = [s.strip() for s in re.split(f'(?<=[{SENTENCE_TERMINATORS}])', long_text) if s.strip()]
+
+    segments: list[str] = []
+    current = ''
+    for piece in clauses:
+        while piece:
+            target = _segment_target_length(start_index + len(segments))
+            current_length = get_valid_text_length(current)
+            piece_length = get_valid_text_length(piece)
+            if current_length + piece_length <= target:
+                current += piece
+                break
+            if current_length >= MIN_SENTENCE_LENGTH:  # 当前分段已足够长，先输出
+                segments.append(current)
+                current = ''
+                continue
+            # 当前分段过短，从子句中切出一部分补足到目标长度，切出的部分至少补足到 MIN_SENTENCE_LENGTH
+            head, piece = _cut_at_phrase_boundary(piece, target - current_length,
+                                                  MIN_SENTENCE_LENGTH - current_length)
+            segments.append(current + head)
+            current = ''
+
+    if current:
+        current_length = get_valid_text_length(current)
+        if segments and current_length < MIN_SENTENCE_LENGTH:
+            merged = segments.pop() + current
+            merged_length = get_valid_text_length(merged)
+            if merged_length <= MAX_SEGMENT_LENGTH:
+                segments.append(merged)
+            else:
+                # 合并后超出上限时重新切分最后两段，使末段也不短于 MIN_SENTENCE_LENGTH
+                head, tail = _cut_at_phrase_boundary(merged, merged_length - MIN_SENTENCE_LENGTH,
+                                                     MIN_SENTENCE_LENGTH)
+                segments.extend([head, tail])
+        else:
+            segments.append(current)
+    return segments
+
+
+def validate_split_mode(mode: Union[bool, str]) -> None:
+    """检查用户传入的分句模式：只接受 True、False 与 SPLIT_MODE_LOW_LATENCY，其他值抛出 ValueError。"""
+    if isinstance(mode, bool) or mode == SPLIT_MODE_LOW_LATENCY:
+        return
+    raise ValueError(f"Unknown split mode {mode!r}. Expected True, False or '{SPLIT_MODE_LOW_LATENCY}'.")
+
+
+def split_text(long_text: str, mode: Union[bool, str], start_index: int = 0) -> list[str]:
+    """按分句模式切分文本：False 不切分，True 按句切分，SPLIT_MODE_LOW_LATENCY 使用低首包延迟的分段。"""
+    validate_split_mode(mode)
+    if mode == SPLIT_MODE_LOW_LATENCY:
+        return split_japanese_text_low_latency(long_text, start_index)
+    if mode:
+        return split_japanese_text(long_text)
+    return [long_text] if long_text.strip() else []
@@ -1,8 +1,14 @@
-import atexit
+import ctypes
 import gc
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 import os
 import logging
+import sys
+import threading
+import time
+import onnx
 import onnxruntime
 from onnxruntime import InferenceSession
 from typing import Optional
@@ -10,12 +16,16 @@ import numpy as np
 # from importlib.resources import files
 from huggingface_hub import hf_hub_download
 
+from .OptimizedModelCache import optimized_model_cache
+from .ThreadSettings import STAGE_DECODER, STAGE_ENCODER, STAGE_HUBERT, STAGE_VITS, thread_settings
 from .Utils.Shared import context
 # from .Utils.Constants import PACKAGE_NAME
-from .Utils.Utils import LRUCacheDict
+from .Utils.Utils import BudgetLRUCacheDict
 
 logger = logging.getLogger(__name__)
 
+_MB: int = 1024 * 1024
+
 SESS_OPTIONS = onnxruntime.SessionOptions()
 SESS_OPTIONS.log_severity_level = 3
 
@@ -24,6 +34,7 @@ class _GSVModelFile:
     T2S_ENCODER: str = 't2s_encoder_fp32.onnx'
     T2S_FIRST_STAGE_DECODER: str = 't2s_first_stage_decoder_fp32.onnx'
     T2S_STAGE_DECODER: str = 't2s_stage_decoder_fp32.onnx'
+    T2S_STAGE_DECODER_FIXED_KV: str = 't2s_stage_decoder_kv_fp32.onnx'
     VITS: str = 'vits_fp32.onnx'
     T2S_DECODER_WEIGHT_FP32: str = 't2s_shared_fp32.bin'
     T2S_DECODER_WEIGHT_FP16: str = 't2s_shared_fp16.bin'
@@ -39,12 +50,173 @@ class GSVModel:
     VITS: InferenceSession
 
 
-def convert_bin_to_fp32(
-        fp16_bin_path: str, output_fp32_bin_path: str
-) -> None:
-    fp16_array = np.fromfile(fp16_bin_path, dtype=np.float16)
-    fp32_array = fp16_array.astype(np.float32)
-    fp32_array.tofile(output_fp32_bin_path)
+# 以 fp16 形式存储、加载时在内存中展开为 fp32 的权重文件：模型引用的 fp32 文件名 -> 磁盘上的 fp16 文件名。
+_FP16_WEIGHT_SOURCES: dict[str, str] = {
+    _GSVModelFile.T2S_DECODER_WEIGHT_FP32: _GSVModelFile.T2S_DECODER_WEIGHT_FP16,
+    _GSVModelFile.VITS_WEIGHT_FP32: _GSVModelFile.VITS_WEIGHT_FP16,
+}
+
+
+def create_session_options(stage: Optional[str] = None) -> onnxruntime.SessionOptions:
+    """
+    创建与 SESS_OPTIONS 设置相同的新 SessionOptions，并应用 stage 所属阶段的线程设置；
+    每个会话单独创建，以便附加内存中的权重或优化模型缓存的设置。
+    """
+    sess_options = onnxruntime.SessionOptions()
+    sess_options.log_severity_level = SESS_OPTIONS.log_severity_level
+    sess_options.graph_optimization_level = SESS_OPTIONS.graph_optimization_level
+    thread_settings.apply(sess_options, stage)
+    return sess_options
+
+
+def load_fp16_weights(model_dir: str) -> dict[str, np.ndarray]:
+    """以 mmap 读取 fp16 权重文件并在内存中展开为 fp32，返回 fp32 文件名 -> 权重数组，不在磁盘上写入任何文件。"""
+    weights: dict[str, np.ndarray] = {}
+    for fp32_name, fp16_name in _FP16_WEIGHT_SOURCES.items():
+        fp16_bin = os.path.normpath(os.path.join(model_dir, fp16_name))
+        if not os.path.exists(fp16_bin):
+            raise FileNotFoundError(f"Weight file {fp16_bin} does not exist!")
+        fp16_array = np.memmap(fp16_bin, dtype=np.float16, mode='r')
+        weights[fp32_name] = fp16_array.astype(np.float32)
+        del fp16_array
+    return weights
+
+
+def external_data_locations(model_path: str) -> set[str]:
+    """返回模型引用的外部数据文件名（不读取权重）。"""
+    model = onnx.load(model_path, load_external_data=False)
+    return {
+        entry.value
+        for tensor in model.graph.initializer if tensor.data_location == onnx.TensorProto.EXTERNAL
+        for entry in tensor.external_data if entry.key == 'location'
+    }
+
+
+def estimate_session_bytes(model_path: str) -> int:
+    """按文件大小估算会话的常驻内存：图文件加上引用的权重（fp16 权重按展开后的 fp32 计）。"""
+    model_dir = os.path.dirname(model_path)
+    total = os.path.getsize(model_path)
+    for name in external_data_locations(model_path):
+        if name in _FP16_WEIGHT_SOURCES:
+            total += 2 * os.path.getsize(os.path.join(model_dir, _FP16_WEIGHT_SOURCES[name]))
+        elif os.path.exists(os.path.join(model_dir, name)):
+            total += os.path.getsize(os.path.join(model_dir, name))
+    return total
+
+
+def resident_memory() -> Optional[int]:
+    """
+    当前进程的常驻内存（字节），仅 Linux 可用，其他平台返回 None。
+    测量前把已释放的堆内存归还给系统，使加载前后两次测量的差值接近模型实际占用的内存。
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# 各模型所属的推理阶段，用于线程设置。
+_MODEL_STAGES: dict[str, str] = {
+    _GSVModelFile.T2S_ENCODER: STAGE_ENCODER,
+    _GSVModelFile.T2S_FIRST_STAGE_DECODER: STAGE_DECODER,
+    _GSVModelFile.T2S_STAGE_DECODER: STAGE_DECODER,
+    _GSVModelFile.VITS: STAGE_VITS,
+}
+
+
+class FP16Weights:
+    """角色的 fp16 权重，首次需要时才展开为 fp32；所有会话都命中优化模型缓存时不会读取权重文件。"""
+
+    def __init__(self, model_dir: str):
+        self.model_dir: str = model_dir
+        self._weights: Optional[dict[str, np.ndarray]] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def get(self) -> dict[str, np.ndarray]:
+        with self._lock:
+            if self._weights is None:
+                self._weights = load_fp16_weights(self.model_dir)
+            return self._weights
+
+
+def create_session(model_path: str, providers: list[str], fp16_weights: Optional[FP16Weights] = None,
+                   stage: Optional[str] = None) -> InferenceSession:
+    """
+    创建 InferenceSession。模型引用的 fp32 权重文件由 fp16_weights 在内存中提供（布局与磁盘上的 fp32 文件一致），
+    其余外部数据文件（如 Encoder 的权重）仍从磁盘读取。ONNX Runtime 在创建会话时复制所需的数据，权重只需保持到创建完成。
+    启用优化模型缓存时，优先加载缓存的优化图并跳过图优化；未命中时先写入缓存，再从缓存加载。
+    stage 为会话所属的推理阶段，决定其线程设置。
+    """
+    locations: set[str] = external_data_locations(model_path)
+    in_memory: list[str] = sorted(name for name in locations if name in _FP16_WEIGHT_SOURCES) \
+        if fp16_weights is not None else []
+    model_dir = os.path.dirname(model_path)
+    weight_paths: list[str] = [
+        os.path.join(model_dir, _FP16_WEIGHT_SOURCES[name] if name in in_memory else name) for name in locations
+    ]
+
+    key: Optional[str] = optimized_model_cache.make_key(model_path, weight_paths, providers, SESS_OPTIONS)
+    if key is not None:
+        session = _load_optimized_session(model_path, key, providers, stage)
+        # 未命中时用一个临时会话写入缓存，随后丢弃它并从缓存重新加载：
+        # 写入缓存的会话会同时保留原图与优化过程中的内存，直接用它推理的常驻内存明显更高。
+        if session is None and _write_optimized_model(model_path, key, providers, in_memory, fp16_weights, stage):
+            session = _load_optimized_session(model_path, key, providers, stage)
+        if session is not None:
+            return session
+
+    sess_options = create_session_options(stage)
+    if in_memory:
+        weights = fp16_weights.get()
+        buffers: list[np.ndarray] = [weights[name] for name in in_memory]
+        sess_options.add_external_initializers_from_files_in_memory(in_memory, buffers, [b.nbytes for b in buffers])
+    return onnxruntime.InferenceSession(model_path, providers=providers, sess_options=sess_options)
+
+
+def _load_optimized_session(model_path: str, key: str, providers: list[str],
+                            stage: Optional[str]) -> Optional[InferenceSession]:
+    """加载已缓存的优化图并跳过图优化；未缓存或加载失败时返回 None（失败的缓存条目会被删除）。"""
+    cached_path = optimized_model_cache.get(key)
+    if cached_path is None:
+        return None
+    sess_options = create_session_options(stage)
+    sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+    try:
+        return onnxruntime.InferenceSession(cached_path, providers=providers, sess_options=sess_options)
+    except Exception as e:
+        logger.warning(f"Failed to load cached optimized model for '{model_path}', rebuilding it: {e}")
+        optimized_model_cache.invalidate(key)
+        return None
+
+
+def _write_optimized_model(model_path: str, key: str, providers: list[str], in_memory: list[str],
+                           fp16_weights: Optional[FP16Weights], stage: Optional[str]) -> bool:
+    """创建一个只用于写入缓存的临时会话，返回是否写入成功。"""
+    sess_options = create_session_options(stage)
+    staging_dir: Optional[str] = optimized_model_cache.prepare(sess_options)
+    if staging_dir is None:
+        return False
+    try:
+        if in_memory:
+            weights = fp16_weights.get()
+            buffers: list[np.ndarray] = [weights[name] for name in in_memory]
+            sess_options.add_external_initializers_from_files_in_memory(
+                in_memory, buffers, [b.nbytes for b in buffers])
+        session = onnxruntime.InferenceSession(model_path, providers=providers, sess_options=sess_options)
+        del session
+    except Exception as e:
+        logger.warning(f"Failed to write optimized model cache for '{model_path}': {e}")
+        optimized_model_cache.discard(staging_dir)
+        return False
+    optimized_model_cache.commit(key, staging_dir)
+    return True
 
 
 def download_model(filename: str, repo_id: str = 'High-Logic/Genie') -> Optional[str]:
@@ -64,48 +236,72 @@ def download_model(filename: str, repo_id: str = 'High-Logic/Genie') -> Optional
         logger.error(f"Failed to download model {filename}: {str(e)}", exc_info=True)
 
 
-def convert_bins_to_fp32(model_dir: str) -> None:
-    fp16_fp32_pairs = [
-        (_GSVModelFile.T2S_DECODER_WEIGHT_FP16, _GSVModelFile.T2S_DECODER_WEIGHT_FP32),
-        (_GSVModelFile.VITS_WEIGHT_FP16, _GSVModelFile.VITS_WEIGHT_FP32),
-    ]
-
-    for fp16_name, fp32_name in fp16_fp32_pairs:
-        fp16_bin = os.path.normpath(os.path.join(model_dir, fp16_name))
-        fp32_bin = os.path.normpath(os.path.join(model_dir, fp32_name))
-
-        if not os.path.exists(fp16_bin):
-            raise FileNotFoundError(f"Weight file {fp16_bin} does not exist!")
-        if not os.path.exists(fp32_bin):
-            convert_bin_to_fp32(fp16_bin, fp32_bin)
-
-    logger.info("Successfully generated temporary FP32 weights to improve inference speed.")
-
-
 class ModelManager:
     def __init__(self):
-        capacity_str = os.getenv('Max_Cached_Character_Models', '3')
-        self.character_to_model: dict[str, dict[str, InferenceSession]] = LRUCacheDict(
-            capacity=int(capacity_str))
+        # 按常驻内存预算淘汰角色；设置了预算时默认不再限制角色数量。
+        memory_budget = int(float(os.getenv('Max_Character_Model_Memory_MB', '0')) * _MB)
+        capacity_str = os.getenv('Max_Cached_Character_Models', '0' if memory_budget else '3')
+        self.character_to_model: BudgetLRUCacheDict = BudgetLRUCacheDict(
+            max_bytes=memory_budget, capacity=int(capacity_str), on_evict=self._on_evict)
+        self.character_to_model.pinned.update(
+            name.strip().lower() for name in os.getenv('Pinned_Characters', '').split(',') if name.strip())
         self.character_model_paths: dict[str, str] = {}  # 创建一个持久化字典来存储角色模型路径
+        self.fixed_kv_characters: set[str] = set()  # 使用固定容量 KV Cache 变体的角色，重载时沿用该选择
         self.providers = ["CPUExecutionProvider"]
 
         self.cn_hubert: Optional[InferenceSession] = None
-
-    def load_cn_hubert(self) -> bool:
+        self._cn_hubert_identity: Optional[str] = None
+        # 就绪状态只由显式加载（load_character，例如启动时的预加载）决定：正在进行的显式加载（包括预热）数量，
+        # 以及显式加载成功且未被卸载的角色。淘汰后由 get 自动重载不影响就绪状态。
+        self._loading: int = 0
+        self._loaded_characters: set[str] = set()
+        self._state_lock: threading.Lock = threading.Lock()
+        # 串行执行角色加载，使加载前后的内存测量不受其他加载影响。
+        self._load_lock: threading.Lock = threading.Lock()
+
+    @property
+    def is_ready(self) -> bool:
+        """至少有一个显式加载的角色（未被卸载），且当前没有正在进行的显式加载。"""
+        with self._state_lock:
+            return bool(self._loaded_characters) and self._loading == 0
+
+    @staticmethod
+    def get_cn_hubert_path() -> Optional[str]:
+        """返回本地 CN_HuBERT 模型路径，若不存在则先下载。"""
         model_path: Optional[str] = os.getenv("HUBERT_MODEL_PATH")
         if not (model_path and os.path.isfile(model_path)):
             logger.info("Chinese HuBERT model not found locally. Starting download of 'chinese-hubert-base.onnx'...")
             model_path = download_model('chinese-hubert-base.onnx')
-            logger.info(f"Chinese HuBERT model download completed. Saved to: {os.path.abspath(model_path)}")
+            if model_path:
+                logger.info(f"Chinese HuBERT model download completed. Saved to: {os.path.abspath(model_path)}")
+        return model_path
+
+    def cn_hubert_identity(self) -> Optional[str]:
+        """
+        标识所用 CN-HuBERT 模型的字符串（文件名、大小与文件开头 1 MB 的 sha256），模型不可用时返回 None。
+        用作参考音频特征缓存的键的一部分，进程内只计算一次。
+        """
+        if self._cn_hubert_identity is None:
+            model_path: Optional[str] = self.get_cn_hubert_path()
+            if not model_path:
+                return None
+            try:
+                with open(model_path, 'rb') as f:
+                    head_hash = hashlib.sha256(f.read(1 << 20)).hexdigest()
+                self._cn_hubert_identity = f'{os.path.basename(model_path)}:{os.path.getsize(model_path)}:{head_hash}'
+            except OSError as e:
+                logger.warning(f"Failed to read CN_HuBERT model '{model_path}': {e}")
+                return None
+        return self._cn_hubert_identity
+
+    def load_cn_hubert(self) -> bool:
+        model_path: Optional[str] = self.get_cn_hubert_path()
         if not model_path:
             return False
         logger.info(f"Found existing Chinese HuBERT model at: {os.path.abspath(model_path)}")
 
         try:
-            self.cn_hubert = onnxruntime.InferenceSession(model_path,
-                                                          providers=self.providers,
-                                                          sess_options=SESS_OPTIONS)
+            self.cn_hubert = create_session(model_path, self.providers, stage=STAGE_HUBERT)
             logger.info("Successfully loaded CN_HuBERT model.")
             return True
         except Exception as e:
@@ -116,35 +312,88 @@ class ModelManager:
         return False
 
     def get(self, character_name: str) -> Optional[GSVModel]:
-        if character_name in self.character_to_model:
-            model_map = self.character_to_model[character_name]
-            return GSVModel(
-                T2S_ENCODER=model_map[_GSVModelFile.T2S_ENCODER],
-                T2S_FIRST_STAGE_DECODER=model_map[_GSVModelFile.T2S_FIRST_STAGE_DECODER],
-                T2S_STAGE_DECODER=model_map[_GSVModelFile.T2S_STAGE_DECODER],
-                VITS=model_map[_GSVModelFile.VITS]
-            )
-        if character_name in self.character_model_paths:
-            model_dir = self.character_model_paths[character_name]
-            if self.load_character(character_name, model_dir):
-                return self.get(character_name)
-            else:
-                del self.character_model_paths[character_name]  # 如果重载失败，可以考虑从路径记录中移除，防止反复失败
+        model_map = self.character_to_model.get(character_name)
+        if model_map is None and character_name in self.character_model_paths:
+            model_map = self._reload_character(character_name)
+        if model_map is None:
+            return None
+        return GSVModel(
+            T2S_ENCODER=model_map[_GSVModelFile.T2S_ENCODER],
+            T2S_FIRST_STAGE_DECODER=model_map[_GSVModelFile.T2S_FIRST_STAGE_DECODER],
+            T2S_STAGE_DECODER=model_map[_GSVModelFile.T2S_STAGE_DECODER],
+            VITS=model_map[_GSVModelFile.VITS]
+        )
+
+    def _reload_character(self, character_name: str) -> Optional[dict[str, InferenceSession]]:
+        """重新加载已被淘汰的角色；在加载锁内再次检查缓存，并发请求同一角色时只加载一次。"""
+        with self._load_lock:
+            model_map = self.character_to_model.get(character_name)
+            if model_map is not None:
+                return model_map
+            model_dir = self.character_model_paths.get(character_name)
+            if model_dir is None:
                 return None
-        return None
+            model_map = self._load_character(character_name, model_dir, None)
+            if model_map is None:
+                self.character_model_paths.pop(character_name, None)  # 重载失败时从路径记录中移除，防止反复失败
+            return model_map
 
     def has_character(self, character_name: str) -> bool:
         character_name = character_name.lower()
         return character_name in self.character_model_paths
 
-    def load_character(self, character_name: str, model_dir: str) -> bool:
+    def model_identity(self, character_name: str) -> Optional[str]:
+        """返回标识角色当前所用模型文件的字符串（模型目录、KV Cache 变体与各文件的修改时间），角色未加载时返回 None。"""
         character_name = character_name.lower()
-        if character_name in self.character_to_model:
+        model_dir = self.character_model_paths.get(character_name)
+        if model_dir is None:
+            return None
+        stage_decoder_file: str = _GSVModelFile.T2S_STAGE_DECODER_FIXED_KV \
+            if character_name in self.fixed_kv_characters else _GSVModelFile.T2S_STAGE_DECODER
+        parts: list[str] = [os.path.abspath(model_dir), stage_decoder_file]
+        for filename in (_GSVModelFile.T2S_ENCODER, _GSVModelFile.T2S_FIRST_STAGE_DECODER, stage_decoder_file,
+                         _GSVModelFile.VITS, _GSVModelFile.T2S_DECODER_WEIGHT_FP16, _GSVModelFile.VITS_WEIGHT_FP16):
+            try:
+                parts.append(str(os.path.getmtime(os.path.join(model_dir, filename))))
+            except OSError:
+                parts.append('-')
+        return '|'.join(parts)
+
+    def load_character(self, character_name: str, model_dir: str, fixed_kv_cache: Optional[bool] = None,
+                       warmup: bool = False) -> bool:
+        """
+        加载角色的四个模型（并行构建 InferenceSession）。
+        warmup 为 True 时，加载后用合成输入运行一次完整的推理流程，使第一个真实请求不必承担预热开销。
+        """
+        with self._state_lock:
+            self._loading += 1
+        try:
+            with self._load_lock:
+                loaded = self._load_character(character_name, model_dir, fixed_kv_cache) is not None
+            if loaded and warmup:
+                from .Core.Warmup import warmup_model  # 延迟导入，避免循环依赖
+                try:
+                    warmup_model(self.get(character_name.lower()))
+                except Exception as e:
+                    logger.warning(f"Model warm-up failed for '{character_name}': {e}")
+            if loaded:
+                with self._state_lock:
+                    self._loaded_characters.add(character_name.lower())
+            return loaded
+        finally:
+            with self._state_lock:
+                self._loading -= 1
+
+    def _load_character(self, character_name: str, model_dir: str,
+                        fixed_kv_cache: Optional[bool]) -> Optional[dict[str, InferenceSession]]:
+        """在持有 _load_lock 时调用，返回角色的模型字典，失败时返回 None。"""
+        character_name = character_name.lower()
+        if fixed_kv_cache is None:
+            fixed_kv_cache = character_name in self.fixed_kv_characters
+        cached = self.character_to_model.get(character_name)  # 同时更新其在 LRU 缓存中的位置
+        if cached is not None:
             logger.info(f"Character '{character_name}' is already in cache; no need to reload.")
-            _ = self.character_to_model[character_name]  # 访问一次以更新其在LRU缓存中的位置
-            return True
-
-        convert_bins_to_fp32(model_dir)
+            return cached
 
         model_dict: dict[str, InferenceSession] = {}
         model_filename: list[str] = [_GSVModelFile.T2S_ENCODER,
@@ -152,51 +401,113 @@ class ModelManager:
                                      _GSVModelFile.T2S_STAGE_DECODER,
                                      _GSVModelFile.VITS]
 
+        stage_decoder_file: str = _GSVModelFile.T2S_STAGE_DECODER
+        if fixed_kv_cache:
+            if os.path.exists(os.path.join(model_dir, _GSVModelFile.T2S_STAGE_DECODER_FIXED_KV)):
+                stage_decoder_file = _GSVModelFile.T2S_STAGE_DECODER_FIXED_KV
+            else:
+                logger.warning(
+                    f"'{_GSVModelFile.T2S_STAGE_DECODER_FIXED_KV}' was not found in {model_dir}. "
+                    f"Please re-convert the model to use the fixed KV cache. Falling back to the default stage decoder."
+                )
+
+        model_paths: dict[str, str] = {}
         for model_file in model_filename:
-            model_path: str = os.path.join(model_dir, model_file)
-            model_path = os.path.normpath(model_path)
+            source_file: str = stage_decoder_file if model_file == _GSVModelFile.T2S_STAGE_DECODER else model_file
+            model_paths[model_file] = os.path.normpath(os.path.join(model_dir, source_file))
+
+        try:
+            estimated_bytes = sum(estimate_session_bytes(path) for path in model_paths.values())
+        except Exception as e:
+            logger.error(f"Error: Failed to read ONNX models in '{model_dir}'.\nDetails: {e}")
+            return None
+        # 其他角色在新角色加载成功、放入缓存时才按预算淘汰，加载失败不会影响已缓存的角色。
+        gc.collect()
+        memory_before = resident_memory()
+        start_time = time.perf_counter()
+        weights: FP16Weights = FP16Weights(model_dir)
+
+        # 四个模型的图优化与权重加载互不依赖，并行构建会话以缩短冷启动时间。
+        with ThreadPoolExecutor(max_workers=len(model_paths), thread_name_prefix='genie-model-load') as executor:
+            futures = {
+                model_file: executor.submit(create_session, model_path, self.providers, weights,
+                                            _MODEL_STAGES[model_file])
+                for model_file, model_path in model_paths.items()
+            }
+        del weights  # 会话已复制所需的权重，释放内存中的 fp32 副本（若曾展开）
+        for model_file, future in futures.items():
+            model_path = model_paths[model_file]
             try:
-                model_dict[model_file] = onnxruntime.InferenceSession(model_path,
-                                                                      providers=self.providers,
-                                                                      sess_options=SESS_OPTIONS)
+                model_dict[model_file] = future.result()
                 logger.info(f"Model loaded successfully: {model_path}")
             except Exception as e:
                 logger.error(
                     f"Error: Failed to load ONNX model '{model_path}'.\n"
                     f"Details: {e}"
                 )
-                return False
+                return None
+        logger.info(f"Loaded {len(model_dict)} models in {time.perf_counter() - start_time:.3f} seconds.")
+
+        memory_after = resident_memory()
+        resident_bytes = estimated_bytes
+        if memory_before is not None and memory_after is not None and memory_after > memory_before:
+            resident_bytes = memory_after - memory_before
+        logger.info(f"Character '{character_name}' uses about {resident_bytes / _MB:.1f} MB of memory.")
 
-        self.character_to_model[character_name] = model_dict
+        self.character_to_model.put(character_name, model_dict, resident_bytes)
         self.character_model_paths[character_name] = model_dir
+        if fixed_kv_cache:
+            self.fixed_kv_characters.add(character_name)
+        else:
+            self.fixed_kv_characters.discard(character_name)
 
         if not context.current_speaker:
             context.current_speaker = character_name
 
-        return True
+        return model_dict
 
     def remove_character(self, character_name: str) -> None:
         character_name = character_name.lower()
-        if character_name in self.character_to_model:
-            del self.character_to_model[character_name]
+        with self._state_lock:
+            self._loaded_characters.discard(character_name)
+        if self.character_to_model.discard(character_name):
             gc.collect()
             logger.info(f"Character {character_name.capitalize()} removed successfully.")
 
-    def clean_cache(self) -> None:
-        temp_weights: list[str] = [_GSVModelFile.T2S_DECODER_WEIGHT_FP32, _GSVModelFile.VITS_WEIGHT_FP32]
-        deleted_any: bool = False
-        try:
-            for character, model_dir in self.character_model_paths.items():
-                for filename in temp_weights:
-                    filepath: str = os.path.join(model_dir, filename)
-                    if os.path.exists(filepath):
-                        os.remove(filepath)
-                        deleted_any = True
-            if deleted_any:
-                logger.info("All temporary weight files have been successfully deleted.")
-        except Exception as e:
-            logger.error(f"Failed to delete temporary weight file: {e}")
+    def pin_character(self, character_name: str, pinned: bool = True) -> None:
+        """固定的角色不会被自动淘汰（仍可通过 remove_character 卸载）；可以在加载之前固定。"""
+        character_name = character_name.lower()
+        with self.character_to_model.lock:
+            if pinned:
+                self.character_to_model.pinned.add(character_name)
+            else:
+                self.character_to_model.pinned.discard(character_name)
+
+    def _on_evict(self, character_name: str, resident_bytes: int, reason: str) -> None:
+        gc.collect()
+        logger.info(f"Character '{character_name}' evicted ({reason} limit), "
+                    f"freeing about {resident_bytes / _MB:.1f} MB.")
+
+    def model_cache_stats(self) -> dict:
+        cache = self.character_to_model
+        with cache.lock:
+            return {
+                'memory_budget_bytes': cache.max_bytes,
+                'max_characters': cache.capacity,
+                'resident_bytes': cache.total_bytes,
+                'characters': [
+                    {'name': name, 'bytes': cache.sizes.get(name, 0), 'pinned': name in cache.pinned}
+                    for name in cache  # 按最久未使用到最近使用排列
+                ],
+                'pinned': sorted(cache.pinned),
+                'evictions': cache.evictions,
+                'evicted_bytes': cache.evicted_bytes,
+                'recent_evictions': [
+                    {'character': event['key'], 'bytes': event['bytes'], 'reason': event['reason'],
+                     'time': event['time']}
+                    for event in cache.eviction_events
+                ],
+            }
 
 
 model_manager: ModelManager = ModelManager()
-atexit.register(model_manager.clean_cache)
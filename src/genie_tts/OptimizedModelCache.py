@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import tempfile
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import onnxruntime
+
+logger = logging.getLogger(__name__)
+
+_MODEL_FILENAME: str = 'model.onnx'
+_WEIGHT_FILENAME: str = 'model.data'
+
+
+@lru_cache(maxsize=None)
+def cpu_features() -> str:
+    """
+    CPU 架构与指令集特性。ONNX Runtime 会按当前 CPU 支持的指令集（如 AVX2、AVX-512）选择内核并改写图，
+    优化结果不能在特性不同的机器间共用；目录可能被多台机器共享，因此特性也计入缓存键。
+    """
+    features = [platform.machine(), platform.processor()]
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                # x86 为 flags，ARM 为 Features
+                if line.startswith(('flags', 'Features')):
+                    features.append(' '.join(sorted(line.split(':', 1)[1].split())))
+                    break
+    except OSError:
+        pass
+    return '|'.join(features)
+
+
+class OptimizedModelCache:
+    """
+    ONNX Runtime 图优化结果的磁盘缓存。
+
+    首次创建会话时让 ONNX Runtime 把优化后的图（及 fp32 权重）保存到 <cache_dir>/ort-<版本>/<key>/，
+    之后的加载直接读取该文件并关闭图优化，同时省去 fp16 权重的展开。
+    键由模型文件内容、其引用的外部权重文件（大小与修改时间）、ONNX Runtime 版本、执行提供者、
+    图优化级别与 CPU 架构及指令集特性计算；任何一项变化都会使用新的目录，旧目录可以直接删除。
+    """
+
+    def __init__(self, cache_dir: Optional[str]):
+        self.cache_dir: Optional[str] = os.path.abspath(cache_dir) if cache_dir else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache_dir is not None
+
+    @property
+    def _version_dir(self) -> str:
+        return os.path.join(self.cache_dir, f'ort-{onnxruntime.__version__}')
+
+    def make_key(
+            self,
+            model_path: str,
+            weight_paths: Iterable[str],
+            providers: list[str],
+            sess_options: onnxruntime.SessionOptions,
+    ) -> Optional[str]:
+        """计算缓存键；缓存未启用或文件无法读取时返回 None（即不使用缓存）。"""
+        if not self.enabled:
+            return None
+        try:
+            with open(model_path, 'rb') as f:
+                model_hash = hashlib.sha256(f.read()).hexdigest()
+            # 权重文件较大，以大小与修改时间代替内容哈希。
+            weights = []
+            for path in sorted(weight_paths):
+                stat = os.stat(path)
+                weights.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            return None
+        payload = json.dumps([
+            model_hash,
+            weights,
+            list(providers),
+            int(sess_options.graph_optimization_level),
+            onnxruntime.__version__,
+            cpu_features(),
+        ])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """返回已缓存的优化模型路径，不存在时返回 None。"""
+        model_path = os.path.join(self._version_dir, key, _MODEL_FILENAME)
+        return model_path if os.path.isfile(model_path) else None
+
+    def prepare(self, sess_options: onnxruntime.SessionOptions) -> Optional[str]:
+        """
+        创建临时目录，并让 sess_options 在创建会话时把优化后的模型写入其中（权重另存为外部数据文件）。
+        返回临时目录，会话创建成功后交给 commit，失败时交给 discard。
+        """
+        try:
+            os.makedirs(self._version_dir, exist_ok=True)
+            staging_dir = tempfile.mkdtemp(suffix='.tmp', dir=self._version_dir)
+        except OSError as e:
+            logger.warning(f"Failed to create optimized model cache directory: {e}")
+            return None
+        sess_options.optimized_model_filepath = os.path.join(staging_dir, _MODEL_FILENAME)
+        sess_options.add_session_config_entry(
+            'session.optimized_model_external_initializers_file_name', _WEIGHT_FILENAME)
+        sess_options.add_session_config_entry(
+            'session.optimized_model_external_initializers_min_size_in_bytes', '1024')
+        return staging_dir
+
+    def commit(self, key: str, staging_dir: str) -> None:
+        """把临时目录原子地重命名为缓存条目；其他进程已写入同一条目时丢弃本次结果。"""
+        if not os.path.isfile(os.path.join(staging_dir, _MODEL_FILENAME)):
+            self.discard(staging_dir)
+            return
+        try:
+            os.rename(staging_dir, os.path.join(self._version_dir, key))
+        except OSError:
+            self.discard(staging_dir)
+
+    def discard(self, staging_dir: str) -> None:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def invalidate(self, key: str) -> None:
+        """删除无法加载的缓存条目。"""
+        shutil.rmtree(os.path.join(self._version_dir, key), ignore_errors=True)
+
+
+# 未设置 Optimized_Model_Cache_Dir 时关闭缓存；缓存目录需可写，可与只读的模型目录分开。
+optimized_model_cache: OptimizedModelCache = OptimizedModelCache(
+    cache_dir=os.getenv('Optimized_Model_Cache_Dir') or None,
+)
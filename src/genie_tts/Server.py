@@ -1,22 +1,35 @@
 import asyncio
 import os
-from typing import AsyncIterator, Optional, Callable, Union
+import threading
+from typing import AsyncIterator, Optional, Callable, Union, List, Tuple
 import logging
 
 import uvicorn
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 
+from .Audio.AudioCache import audio_cache, normalize_text
 from .Audio.ReferenceAudio import ReferenceAudio
-from .Core.TTSPlayer import tts_player
+from .Audio.FeatureStore import feature_store
+from .Audio.Precompute import collect_reference_items, precompute_reference_audios
+from .Core.DecodeGuard import DECODE_GUARD_ENABLED, decode_stats
+from .Core.SemanticTokenCache import semantic_token_cache
+from .Core.SentenceScheduler import PRIORITIES, PRIORITY_INTERACTIVE, sentence_scheduler
+from .Core.TTSSession import TTSSession, tts_session_pool
+from .Japanese.G2PCache import g2p_cache
+from .Japanese.Split import validate_split_mode
 from .ModelManager import model_manager
-from .Utils.Shared import context
+from .Utils.Utils import ThreadToAsyncQueue, STREAM_QUEUE_SIZE
 
 logger = logging.getLogger(__name__)
 
 _reference_audios: dict[str, dict] = {}
 SUPPORTED_AUDIO_EXTS = {'.wav', '.flac', '.ogg', '.aiff', '.aif'}
+# 单个 /tts 请求的最大文本长度；会话名额已满时返回 503，并通过 Retry-After 建议客户端的重试间隔（秒）。
+MAX_TTS_TEXT_LENGTH: int = int(os.getenv('Max_TTS_Text_Length', '5000'))
+RETRY_AFTER_SECONDS: int = int(os.getenv('TTS_Retry_After_Seconds', '2'))
 
 app = FastAPI()
 
@@ -24,23 +37,41 @@ app = FastAPI()
 class CharacterPayload(BaseModel):
     character_name: str
     onnx_model_dir: str
+    fixed_kv_cache: bool = False
+    warmup: bool = False
 
 
 class UnloadCharacterPayload(BaseModel):
     character_name: str
 
 
+class PinCharacterPayload(BaseModel):
+    character_name: str
+    pinned: bool = True
+
+
 class ReferenceAudioPayload(BaseModel):
     character_name: str
     audio_path: str
     audio_text: str
 
 
+class PrecomputeReferenceAudioPayload(BaseModel):
+    source: str
+    cache_dir: Optional[str] = None
+    num_workers: Optional[int] = None
+    overwrite: bool = False
+
+
 class TTSPayload(BaseModel):
     character_name: str
     text: str
-    split_sentence: bool = False
+    split_sentence: Union[bool, str] = False  # True、False 或 "low_latency"
     save_path: Optional[str] = None
+    stream_vocoder: bool = False
+    use_cache: bool = True
+    priority: str = PRIORITY_INTERACTIVE  # "interactive" 或 "batch"
+    tenant: Optional[str] = None  # 公平调度与限流的单位，默认为角色名
 
 
 @app.post("/load_character")
@@ -49,12 +80,22 @@ def load_character_endpoint(payload: CharacterPayload):
         model_manager.load_character(
             character_name=payload.character_name,
             model_dir=payload.onnx_model_dir,
+            fixed_kv_cache=payload.fixed_kv_cache,
+            warmup=payload.warmup,
         )
         return {"status": "success", "message": f"Character '{payload.character_name}' loaded."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/ready")
+def ready_endpoint():
+    """就绪探针：至少有一个显式加载的角色且没有正在进行的显式加载时返回 200，否则返回 503；淘汰后的自动重载不影响就绪状态。"""
+    if not model_manager.is_ready:
+        raise HTTPException(status_code=503, detail="Models are not loaded yet.")
+    return {"status": "ready"}
+
+
 @app.post("/unload_character")
 def unload_character_endpoint(payload: UnloadCharacterPayload):
     try:
@@ -64,6 +105,18 @@ def unload_character_endpoint(payload: UnloadCharacterPayload):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/pin_character")
+def pin_character_endpoint(payload: PinCharacterPayload):
+    model_manager.pin_character(character_name=payload.character_name, pinned=payload.pinned)
+    state = "pinned" if payload.pinned else "unpinned"
+    return {"status": "success", "message": f"Character '{payload.character_name}' {state}."}
+
+
+@app.get("/model_cache_stats")
+def model_cache_stats_endpoint():
+    return model_manager.model_cache_stats()
+
+
 @app.post("/set_reference_audio")
 def set_reference_audio_endpoint(payload: ReferenceAudioPayload):
     ext = os.path.splitext(payload.audio_path)[1].lower()
@@ -79,68 +132,261 @@ def set_reference_audio_endpoint(payload: ReferenceAudioPayload):
     return {"status": "success", "message": f"Reference audio for '{payload.character_name}' set."}
 
 
+class _SharedSynthesis:
+    """
+    一次正在进行的合成，参数完全相同的并发请求共享它的音频流。
+
+    已经输出的音频块会被保留，后加入的请求先收到这些音频块，再与其他请求同步接收后续的音频块，
+    因此每个请求得到的音频流都是完整的。音频块只由合成线程按顺序发送，发送时不持锁：
+    某个请求的队列已满时合成线程会等待它读取（背压），断开连接的请求则被跳过。所有请求都断开连接后，合成会被取消。
+    """
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.subscribers: dict[ThreadToAsyncQueue, int] = {}  # 每个请求的队列 -> 已发送到的音频块位置
+        self.finished: bool = False
+        self.cancelled: bool = False
+        self.session: Optional[TTSSession] = None
+        self.priority: str = PRIORITY_INTERACTIVE
+        self._lock: threading.Lock = threading.Lock()
+
+    def raise_priority(self, priority: str) -> None:
+        """交互式请求加入批量合成时，之后的句子按交互式优先级调度。"""
+        if priority != PRIORITY_INTERACTIVE:
+            return
+        with self._lock:
+            self.priority = priority
+            if self.session is not None:
+                self.session.priority = priority
+
+    def attach_session(self, session: TTSSession) -> None:
+        with self._lock:
+            self.session = session
+            session.priority = self.priority
+            cancelled = self.cancelled
+        if cancelled:  # 会话启动前请求已全部断开
+            session.stop()
+
+    def subscribe(self, stream: ThreadToAsyncQueue) -> bool:
+        """加入合成；合成已经结束或被取消时返回 False。已有的音频块由合成线程在下一次发送时补发。"""
+        with self._lock:
+            if self.finished or self.cancelled:
+                return False
+            self.subscribers[stream] = 0
+            return True
+
+    def unsubscribe(self, stream: ThreadToAsyncQueue) -> bool:
+        """移除一个请求；若这是最后一个请求且合成尚未结束，则取消合成并返回 True。"""
+        stream.close()
+        with self._lock:
+            self.subscribers.pop(stream, None)
+            if self.subscribers or self.finished or self.cancelled:
+                return False
+            self.cancelled = True
+            session = self.session
+        if session is not None:
+            session.stop()
+        return True
+
+    def publish(self, chunk: Optional[bytes]) -> None:
+        """在合成线程中把音频块（或表示结束的 None）发送给所有请求。"""
+        with self._lock:
+            if chunk is None:
+                self.finished = True
+            else:
+                self.chunks.append(chunk)
+            subscribers = list(self.subscribers.items())
+        for stream, position in subscribers:
+            while position < len(self.chunks) and stream.put(self.chunks[position]):
+                position += 1
+            with self._lock:
+                if stream in self.subscribers:
+                    self.subscribers[stream] = position
+            if chunk is None:
+                stream.put(None)
+
+    def closed_subscribers(self) -> List[ThreadToAsyncQueue]:
+        """队列已关闭（消费方已离开或等待超时）但仍登记在册的请求。"""
+        with self._lock:
+            return [stream for stream in self.subscribers if stream.closed]
+
+
+# 正在进行的合成，以请求参数为键。
+_inflight_syntheses: dict[Tuple, _SharedSynthesis] = {}
+_inflight_lock: threading.Lock = threading.Lock()
+
+
+def _join_or_start_synthesis(
+        key: Tuple,
+        stream: ThreadToAsyncQueue,
+        priority: str,
+) -> Tuple[Optional[_SharedSynthesis], bool]:
+    """
+    加入参数相同的进行中合成，若没有则占用一个会话名额并登记新的合成。
+    返回 (合成, 是否需要由调用方启动)；会话名额已满时返回 (None, False)。
+    """
+    with _inflight_lock:
+        shared = _inflight_syntheses.get(key)
+        if shared is not None and shared.subscribe(stream):
+            shared.raise_priority(priority)
+            return shared, False
+        if not tts_session_pool.try_admit():
+            return None, False
+        shared = _SharedSynthesis()
+        shared.priority = priority
+        shared.subscribe(stream)
+        _inflight_syntheses[key] = shared
+        return shared, True
+
+
+def _finish_synthesis(key: Tuple, shared: _SharedSynthesis, chunk: Optional[bytes]) -> None:
+    if chunk is None:
+        # 先移出登记表，之后到达的相同请求会启动新的合成，而不是加入已经结束的这一个。
+        with _inflight_lock:
+            if _inflight_syntheses.get(key) is shared:
+                del _inflight_syntheses[key]
+    shared.publish(chunk)
+    # 未能触发清理就离开的请求（队列因等待超时被关闭）在这里移除，全部离开时取消合成。
+    for stream in shared.closed_subscribers():
+        _leave_synthesis(key, shared, stream)
+
+
+def _leave_synthesis(key: Tuple, shared: _SharedSynthesis, stream: ThreadToAsyncQueue) -> None:
+    """请求的响应结束（包括客户端断开连接）时调用，可以重复调用。"""
+    with _inflight_lock:
+        if not shared.unsubscribe(stream):
+            return
+        if _inflight_syntheses.get(key) is shared:
+            del _inflight_syntheses[key]
+    logger.info("All clients of a TTS request disconnected; synthesis cancelled.")
+
+
+def _synthesis_key(payload: TTSPayload) -> Tuple:
+    reference = _reference_audios[payload.character_name]
+    return (payload.character_name, reference['audio_path'], reference['audio_text'], normalize_text(payload.text),
+            payload.split_sentence, payload.save_path, payload.stream_vocoder, payload.use_cache)
+
+
 def run_tts_in_background(
         character_name: str,
         text: str,
-        split_sentence: bool,
+        split_sentence: Union[bool, str],
         save_path: Optional[str],
-        chunk_callback: Callable[[Optional[bytes]], None]
-):
+        chunk_callback: Callable[[Optional[bytes]], None],
+        stream_vocoder: bool = False,
+        use_cache: bool = True,
+        admitted: bool = False,
+        tenant: Optional[str] = None,
+        on_session_created: Optional[Callable[[TTSSession], None]] = None,
+) -> Optional[TTSSession]:
+    """
+    admitted 为 True 表示调用方已通过 tts_session_pool.try_admit 占用了会话名额。
+    on_session_created 在会话创建后、提交执行前调用，此时会话尚未申请任何推理名额。
+    """
+    reference = _reference_audios[character_name]
     try:
-        context.current_speaker = character_name
-        context.current_prompt_audio = ReferenceAudio(
-            prompt_wav=_reference_audios[character_name]['audio_path'],
-            prompt_text=_reference_audios[character_name]['audio_text'],
+        # 每个请求使用独立的会话，不修改全局 context，并发请求之间互不干扰。
+        prompt_audio = ReferenceAudio(
+            prompt_wav=reference['audio_path'],
+            prompt_text=reference['audio_text'],
         )
-        tts_player.start_session(
-            play=False,
+        session = TTSSession(
+            character_name=character_name,
+            prompt_audio=prompt_audio,
             split=split_sentence,
             save_path=save_path,
             chunk_callback=chunk_callback,
+            stream_vocoder=stream_vocoder,
+            cache_key=audio_cache.make_key(character_name, prompt_audio, text, split_sentence, stream_vocoder)
+            if use_cache else None,
+            tenant=tenant,
         )
-        tts_player.feed(text)
-        tts_player.end_session()
-        tts_player.wait_for_tts_completion()
     except Exception as e:
         logger.error(f"Error in TTS background task: {e}", exc_info=True)
+        if admitted:
+            tts_session_pool.cancel_admission()
+        chunk_callback(None)
+        return None
+    if on_session_created is not None:
+        on_session_created(session)
+    tts_session_pool.submit(session, text, admitted=admitted)
+    return session
+
+
+def run_shared_tts_in_background(key: Tuple, shared: _SharedSynthesis, payload: TTSPayload) -> None:
+    def shared_chunk_callback(chunk: Optional[bytes]):
+        _finish_synthesis(key, shared, chunk)
+
+    # 先关联会话再提交执行，使会话开始前发生的优先级提升与取消都能作用于第一句话。
+    run_tts_in_background(
+        payload.character_name,
+        payload.text,
+        payload.split_sentence,
+        payload.save_path,
+        shared_chunk_callback,
+        payload.stream_vocoder,
+        payload.use_cache,
+        admitted=True,
+        tenant=payload.tenant,
+        on_session_created=shared.attach_session,
+    )
 
 
-async def audio_stream_generator(queue: asyncio.Queue) -> AsyncIterator[bytes]:
-    while True:
-        chunk = await queue.get()
-        if chunk is None:
-            break
-        yield chunk
+async def audio_stream_generator(stream: ThreadToAsyncQueue) -> AsyncIterator[bytes]:
+    try:
+        while True:
+            chunk = await stream.get()
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # 客户端断开连接时，StreamingResponse 会取消或关闭生成器。先关闭队列，让等待队列空位的合成线程立即返回。
+        stream.close()
 
 
 @app.post("/tts")
 async def tts_endpoint(payload: TTSPayload):
     if payload.character_name not in _reference_audios:
         raise HTTPException(status_code=404, detail="Character not found or reference audio not set.")
+    if len(payload.text) > MAX_TTS_TEXT_LENGTH:
+        raise HTTPException(status_code=413, detail=f"Text is longer than {MAX_TTS_TEXT_LENGTH} characters.")
+    if payload.priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority '{payload.priority}'. Supported: {PRIORITIES}")
+    try:
+        validate_split_mode(payload.split_sentence)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    loop = asyncio.get_running_loop()
-    stream_queue: asyncio.Queue[Union[bytes, None]] = asyncio.Queue()
-
-    def tts_chunk_callback(chunk: Optional[bytes]):
-        loop.call_soon_threadsafe(stream_queue.put_nowait, chunk)
+    # 合成线程通过有界队列发送音频块，客户端读取过慢时合成会暂停等待。
+    stream = ThreadToAsyncQueue(asyncio.get_running_loop(), maxsize=STREAM_QUEUE_SIZE)
 
-    loop.run_in_executor(
-        None,
-        run_tts_in_background,
-        payload.character_name,
-        payload.text,
-        payload.split_sentence,
-        payload.save_path,
-        tts_chunk_callback
+    # 参数完全相同的并发请求只合成一次，所有请求接收同一个音频流。
+    key = _synthesis_key(payload)
+    shared, is_new = _join_or_start_synthesis(key, stream, payload.priority)
+    if shared is None:
+        raise HTTPException(
+            status_code=503,
+            detail="The server is busy. Please retry later.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+    if is_new:
+        asyncio.get_running_loop().run_in_executor(None, run_shared_tts_in_background, key, shared, payload)
+    else:
+        logger.info("Joined an identical in-flight TTS request.")
+
+    # 离开合成放在响应的后台任务中：即使客户端在生成器开始迭代之前就断开（生成器的 finally 不会执行），
+    # 它也会在响应结束后运行；正常结束时合成已完成，调用不产生任何效果。
+    return StreamingResponse(
+        audio_stream_generator(stream),
+        media_type="audio/wav",
+        background=BackgroundTask(_leave_synthesis, key, shared, stream),
     )
 
-    return StreamingResponse(audio_stream_generator(stream_queue), media_type="audio/wav")
-
 
 @app.post("/stop")
 def stop_endpoint():
     try:
-        tts_player.stop()
+        tts_session_pool.stop_all()
         return {"status": "success", "message": "TTS stopped."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -155,6 +401,79 @@ def clear_reference_audio_cache_endpoint():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/scheduler_stats")
+def scheduler_stats_endpoint():
+    return sentence_scheduler.stats()
+
+
+@app.get("/audio_cache_stats")
+def audio_cache_stats_endpoint():
+    return audio_cache.stats()
+
+
+@app.post("/clear_audio_cache")
+def clear_audio_cache_endpoint():
+    try:
+        audio_cache.clear()
+        return {"status": "success", "message": "Audio cache cleared."}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/semantic_token_cache_stats")
+def semantic_token_cache_stats_endpoint():
+    return semantic_token_cache.stats()
+
+
+@app.post("/clear_semantic_token_cache")
+def clear_semantic_token_cache_endpoint():
+    try:
+        semantic_token_cache.clear()
+        return {"status": "success", "message": "Semantic token cache cleared."}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/g2p_cache_stats")
+def g2p_cache_stats_endpoint():
+    return g2p_cache.stats()
+
+
+@app.post("/clear_g2p_cache")
+def clear_g2p_cache_endpoint():
+    try:
+        g2p_cache.clear()
+        return {"status": "success", "message": "G2P cache cleared."}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/decode_stats")
+def decode_stats_endpoint():
+    return {'enabled': DECODE_GUARD_ENABLED, 'end_reasons': decode_stats.snapshot()}
+
+
+@app.post("/precompute_reference_audio")
+def precompute_reference_audio_endpoint(payload: PrecomputeReferenceAudioPayload):
+    if payload.cache_dir:
+        feature_store.set_cache_dir(payload.cache_dir)
+    if not feature_store.enabled:
+        raise HTTPException(status_code=400, detail="No reference audio cache directory is configured.")
+    if not os.path.exists(payload.source):
+        raise HTTPException(status_code=404, detail=f"Source not found: {payload.source}")
+    try:
+        items = collect_reference_items(payload.source)
+        succeeded = precompute_reference_audios(
+            items=items,
+            cache_dir=feature_store.cache_dir,
+            num_workers=payload.num_workers,
+            overwrite=payload.overwrite,
+        )
+        return {"status": "success", "message": f"Precomputed {succeeded}/{len(items)} reference audios."}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 def start_server(host: str = "127.0.0.1", port: int = 8000, workers: int = 1):
     uvicorn.run(app, host=host, port=port, workers=workers)
 
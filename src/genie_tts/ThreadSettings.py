@@ -0,0 +1,111 @@
+import logging
+import os
+import threading
+from typing import Optional
+
+import onnxruntime
+from onnxruntime.capi import _pybind_state
+
+logger = logging.getLogger(__name__)
+
+# 推理阶段：每个会话按所属阶段应用线程设置。
+STAGE_ENCODER: str = 'encoder'  # T2S Encoder
+STAGE_DECODER: str = 'decoder'  # First Stage Decoder 与 Stage Decoder
+STAGE_VITS: str = 'vits'
+STAGE_HUBERT: str = 'hubert'  # CN-HuBERT
+STAGES: tuple = (STAGE_ENCODER, STAGE_DECODER, STAGE_VITS, STAGE_HUBERT)
+
+_STAGE_ENV_PREFIX: dict[str, str] = {
+    STAGE_ENCODER: 'Encoder',
+    STAGE_DECODER: 'Decoder',
+    STAGE_VITS: 'VITS',
+    STAGE_HUBERT: 'HuBERT',
+}
+
+
+class ThreadSettings:
+    """
+    ONNX Runtime 会话的线程设置，线程数为 0 表示使用 ONNX Runtime 的默认值（物理核心数）。
+
+    - 全局模式（默认）：进程内所有会话共享一组 intra-op / inter-op 线程池，加载多个角色时不会为每个会话各建一组线程而争抢 CPU。
+      ONNX Runtime 的全局线程池一旦在进程中启用，所有会话都必须使用它，且池的大小不能再修改，因此这一模式下各阶段的线程数不生效；
+    - 会话模式：每个会话使用自己的线程池，线程数按阶段（Encoder、Decoder、VITS、CN-HuBERT）分别设置。
+
+    设置只影响之后创建的会话，应在加载模型之前完成。
+    """
+
+    def __init__(self, use_global_pool: bool, global_intra_op_threads: int, global_inter_op_threads: int,
+                 stage_threads: dict[str, tuple[int, int]]):
+        self.use_global_pool: bool = use_global_pool
+        self.global_intra_op_threads: int = max(0, global_intra_op_threads)
+        self.global_inter_op_threads: int = max(0, global_inter_op_threads)
+        self.stage_threads: dict[str, tuple[int, int]] = {stage: stage_threads.get(stage, (0, 0)) for stage in STAGES}
+        self._global_pool_created: bool = False
+        self._lock: threading.Lock = threading.Lock()
+
+    def configure_global_pool(self, enabled: bool = True, intra_op_num_threads: Optional[int] = None,
+                              inter_op_num_threads: Optional[int] = None) -> None:
+        with self._lock:
+            if self._global_pool_created:
+                logger.warning("The global ONNX Runtime thread pool has already been created; "
+                               "thread settings cannot be changed in this process.")
+                return
+            self.use_global_pool = enabled
+            if intra_op_num_threads is not None:
+                self.global_intra_op_threads = max(0, intra_op_num_threads)
+            if inter_op_num_threads is not None:
+                self.global_inter_op_threads = max(0, inter_op_num_threads)
+
+    def set_stage_threads(self, stage: str, intra_op_num_threads: int = 0, inter_op_num_threads: int = 0) -> None:
+        if stage not in self.stage_threads:
+            raise ValueError(f"Unknown stage '{stage}'. Expected one of {STAGES}.")
+        with self._lock:
+            self.stage_threads[stage] = (max(0, intra_op_num_threads), max(0, inter_op_num_threads))
+            if self.use_global_pool and (intra_op_num_threads or inter_op_num_threads):
+                logger.warning(f"Thread settings for stage '{stage}' are ignored while the global thread pool is used.")
+
+    def apply(self, sess_options: onnxruntime.SessionOptions, stage: Optional[str]) -> None:
+        """把线程设置写入即将用于创建会话的 sess_options；全局模式下首次调用时创建全局线程池。"""
+        with self._lock:
+            if self.use_global_pool and not hasattr(_pybind_state, 'set_global_thread_pool_sizes'):
+                logger.warning("This version of ONNX Runtime does not support global thread pools; "
+                               "falling back to per-session thread pools.")
+                self.use_global_pool = False
+            if self.use_global_pool or self._global_pool_created:
+                if not self._global_pool_created:
+                    _pybind_state.set_global_thread_pool_sizes(self.global_intra_op_threads,
+                                                               self.global_inter_op_threads)
+                    self._global_pool_created = True
+                sess_options.use_per_session_threads = False
+                return
+            intra_op_num_threads, inter_op_num_threads = self.stage_threads.get(stage, (0, 0))
+        sess_options.intra_op_num_threads = intra_op_num_threads
+        sess_options.inter_op_num_threads = inter_op_num_threads
+        if inter_op_num_threads > 1:
+            # inter-op 线程只在并行执行模式下使用。
+            sess_options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'use_global_pool': self.use_global_pool or self._global_pool_created,
+                'global_intra_op_threads': self.global_intra_op_threads,
+                'global_inter_op_threads': self.global_inter_op_threads,
+                'stage_threads': {
+                    stage: {'intra_op_num_threads': intra, 'inter_op_num_threads': inter}
+                    for stage, (intra, inter) in self.stage_threads.items()
+                },
+            }
+
+
+# Use_Global_Thread_Pool=0 时切换到会话模式，此时 <Stage>_Intra_Op_Threads / <Stage>_Inter_Op_Threads 生效，
+# Stage 为 Encoder、Decoder、VITS 或 HuBERT。
+thread_settings: ThreadSettings = ThreadSettings(
+    use_global_pool=os.getenv('Use_Global_Thread_Pool', '1') != '0',
+    global_intra_op_threads=int(os.getenv('Global_Intra_Op_Threads', '0')),
+    global_inter_op_threads=int(os.getenv('Global_Inter_Op_Threads', '0')),
+    stage_threads={
+        stage: (int(os.getenv(f'{prefix}_Intra_Op_Threads', '0')), int(os.getenv(f'{prefix}_Inter_Op_Threads', '0')))
+        for stage, prefix in _STAGE_ENV_PREFIX.items()
+    },
+)
@@ -1,5 +1,16 @@
-from collections import OrderedDict
+from collections import OrderedDict, deque
+import asyncio
+import concurrent.futures
+import os
 import queue
+import threading
+import time
+from typing import Any, Callable, Deque, Optional
+
+# 工作线程向 asyncio 流式输出音频时，最多积压的音频块数量，超过后工作线程暂停等待。
+STREAM_QUEUE_SIZE: int = int(os.getenv('Max_Stream_Queue_Chunks', '32'))
+# 队列持续已满超过该秒数时视为消费方已离开（例如没有触发清理的断开连接），关闭队列；0 表示一直等待。
+STREAM_PUT_TIMEOUT: float = float(os.getenv('Stream_Put_Timeout_Seconds', '300'))
 
 
 class LRUCacheDict(OrderedDict):
@@ -20,9 +31,142 @@ class LRUCacheDict(OrderedDict):
             self.popitem(last=False)  # 删除最旧的（第一个）
 
 
+class BudgetLRUCacheDict(OrderedDict):
+    """
+    按条目大小之和（字节）淘汰的 LRU 字典，可同时限制条目数量；max_bytes 或 capacity 为 0 表示不限制。
+
+    固定（pin）的键不会被淘汰，固定与否和键是否在字典中无关，可以在放入之前固定。
+    可淘汰的条目都淘汰后仍超出预算时保留剩余条目；每次淘汰都会记录到 eviction_events 并调用 on_evict。
+    所有读写都由 lock 保护，可在多个线程中使用；遍历或组合多个操作时需自行持有 lock。
+    on_evict 在释放 lock 之后调用。
+    """
+
+    def __init__(self, max_bytes: int = 0, capacity: int = 0,
+                 on_evict: Optional[Callable[[Any, int, str], None]] = None, max_events: int = 32):
+        super().__init__()
+        self.max_bytes: int = max(0, max_bytes)
+        self.capacity: int = max(0, capacity)
+        self.on_evict: Optional[Callable[[Any, int, str], None]] = on_evict
+        self.sizes: dict = {}
+        self.pinned: set = set()
+        self.evictions: int = 0
+        self.evicted_bytes: int = 0
+        self.eviction_events: Deque[dict] = deque(maxlen=max_events)
+        self.lock: threading.RLock = threading.RLock()
+
+    @property
+    def total_bytes(self) -> int:
+        with self.lock:
+            return sum(self.sizes.values())
+
+    def __getitem__(self, key):
+        with self.lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)  # 访问后移到末尾
+            return value
+
+    def get(self, key, default=None):
+        """取出条目并更新其 LRU 位置，不存在时返回 default（检查与读取在同一次加锁内完成）。"""
+        with self.lock:
+            if not super().__contains__(key):
+                return default
+            return self[key]
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            size = self.sizes.get(key, 0)
+        self.put(key, value, size)
+
+    def __delitem__(self, key):
+        with self.lock:
+            super().__delitem__(key)
+            self.sizes.pop(key, None)
+
+    def discard(self, key) -> bool:
+        """删除条目（不计为淘汰），返回条目是否存在。"""
+        with self.lock:
+            if not super().__contains__(key):
+                return False
+            del self[key]
+            return True
+
+    def put(self, key, value, size: int) -> None:
+        """放入条目并记录其大小，随后淘汰最久未使用的条目直到满足预算（不会淘汰刚放入的条目）。"""
+        with self.lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            self.sizes[key] = max(0, size)
+            evicted = self._evict(keep=key)
+        if self.on_evict is not None:
+            for victim, victim_size, reason in evicted:
+                self.on_evict(victim, victim_size, reason)
+
+    def _evict(self, keep) -> list:
+        """在持锁状态下淘汰条目，返回 (键, 大小, 原因) 列表。"""
+        evicted = []
+        while True:
+            if self.max_bytes and self.total_bytes > self.max_bytes:
+                reason = 'memory'
+            elif self.capacity and len(self) > self.capacity:
+                reason = 'count'
+            else:
+                return evicted
+            victim = next((k for k in self if k != keep and k not in self.pinned), None)
+            if victim is None:
+                return evicted
+            size = self.sizes.get(victim, 0)
+            del self[victim]
+            self.evictions += 1
+            self.evicted_bytes += size
+            self.eviction_events.append({'key': victim, 'bytes': size, 'reason': reason, 'time': time.time()})
+            evicted.append((victim, size, reason))
+
+
 def clear_queue(q: queue.Queue) -> None:
     while not q.empty():
         try:
             q.get_nowait()
         except queue.Empty:
             break
+
+
+class ThreadToAsyncQueue:
+    """
+    从工作线程向 asyncio 事件循环传递数据的有界队列。
+
+    队列已满时 put 会阻塞调用它的工作线程，直到消费方取走数据（背压）；消费方调用 close 后，
+    put 不再阻塞并直接丢弃数据，避免工作线程因无人读取而永久挂起。
+    单次 put 等待超过 put_timeout 秒时同样关闭队列，作为消费方未能调用 close 时的兜底。put 不能在事件循环线程中调用。
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int, put_timeout: float = STREAM_PUT_TIMEOUT):
+        self._loop: asyncio.AbstractEventLoop = loop
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, maxsize))
+        self._closed: threading.Event = threading.Event()
+        self.put_timeout: float = max(0.0, put_timeout)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    def put(self, item) -> bool:
+        """放入数据，返回是否成功（消费方已关闭时返回 False）。"""
+        if self._closed.is_set():
+            return False
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(item), self._loop)
+        deadline = time.monotonic() + self.put_timeout if self.put_timeout else None
+        while not self._closed.is_set():
+            try:
+                future.result(timeout=1)
+                return True
+            except concurrent.futures.TimeoutError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.close()
+        future.cancel()
+        return False
+
+    async def get(self):
+        return await self._queue.get()
+
+    def close(self) -> None:
+        self._closed.set()
@@ -1,5 +1,9 @@
 from ._internal import (load_character, unload_character, set_reference_audio, tts_async, tts, stop, convert_to_onnx,
-                        clear_reference_audio_cache, launch_command_line_client, load_predefined_character)
+                        clear_reference_audio_cache, launch_command_line_client, load_predefined_character,
+                        precompute_reference_audio, get_audio_cache_stats, clear_audio_cache, pin_character,
+                        get_model_cache_stats, set_global_thread_pool, set_stage_threads, get_decode_stats,
+                        get_semantic_token_cache_stats, clear_semantic_token_cache, get_g2p_cache_stats,
+                        clear_g2p_cache)
 from .Server import start_server
 
 __all__ = [
@@ -14,4 +18,16 @@ __all__ = [
     "launch_command_line_client",
     "start_server",
     "load_predefined_character",
+    "precompute_reference_audio",
+    "get_audio_cache_stats",
+    "clear_audio_cache",
+    "pin_character",
+    "get_model_cache_stats",
+    "set_global_thread_pool",
+    "set_stage_threads",
+    "get_decode_stats",
+    "get_semantic_token_cache_stats",
+    "clear_semantic_token_cache",
+    "get_g2p_cache_stats",
+    "clear_g2p_cache",
 ]
@@ -26,10 +26,19 @@ import json
 import asyncio
 from typing import AsyncIterator, Optional, Union
 
+from .Audio.AudioCache import audio_cache
 from .Audio.ReferenceAudio import ReferenceAudio
+from .Audio.FeatureStore import feature_store
+from .Audio.Precompute import collect_reference_items, precompute_reference_audios
+from .Core.DecodeGuard import DECODE_GUARD_ENABLED, decode_stats
+from .Core.SemanticTokenCache import semantic_token_cache
 from .Core.TTSPlayer import tts_player
+from .Japanese.G2PCache import g2p_cache
+from .Japanese.Split import validate_split_mode
 from .ModelManager import model_manager
+from .ThreadSettings import thread_settings
 from .Utils.Shared import context
+from .Utils.Utils import ThreadToAsyncQueue, STREAM_QUEUE_SIZE
 from .Client import Client
 from .PredefinedCharacter import download_predefined_character_model
 
@@ -41,6 +50,8 @@ SUPPORTED_AUDIO_EXTS = {'.wav', '.flac', '.ogg', '.aiff', '.aif'}
 def load_character(
         character_name: str,
         onnx_model_dir: Union[str, PathLike],
+        fixed_kv_cache: bool = False,
+        warmup: bool = False,
 ) -> None:
     """
     Loads a character model from an ONNX model directory.
@@ -48,11 +59,17 @@ def load_character(
     Args:
         character_name (str): The name to assign to the loaded character.
         onnx_model_dir (str | PathLike): The directory path containing the ONNX model files.
+        fixed_kv_cache (bool, optional): If True, uses the stage decoder variant with a preallocated KV cache.
+            Requires a model converted with this version. Defaults to False.
+        warmup (bool, optional): If True, runs all models once on a synthetic input after loading, so the
+            first real request does not pay kernel and memory-arena warm-up. Defaults to False.
     """
     model_path: str = os.fspath(onnx_model_dir)
     model_manager.load_character(
         character_name=character_name,
         model_dir=model_path,
+        fixed_kv_cache=fixed_kv_cache,
+        warmup=warmup,
     )
 
 
@@ -70,6 +87,80 @@ def unload_character(
     )
 
 
+def pin_character(
+        character_name: str,
+        pinned: bool = True,
+) -> None:
+    """
+    Pins a character so it is never evicted automatically to stay within the model memory budget.
+
+    Args:
+        character_name (str): The name of the character. It may be pinned before it is loaded.
+        pinned (bool, optional): False unpins the character. Defaults to True.
+    """
+    model_manager.pin_character(
+        character_name=character_name,
+        pinned=pinned,
+    )
+
+
+def get_model_cache_stats() -> dict:
+    """
+    Returns the character model cache statistics.
+
+    Returns:
+        dict: The memory budget, measured resident bytes per loaded character, pinned characters,
+            and eviction counts with the most recent eviction events.
+    """
+    return model_manager.model_cache_stats()
+
+
+def set_global_thread_pool(
+        enabled: bool = True,
+        intra_op_num_threads: Optional[int] = None,
+        inter_op_num_threads: Optional[int] = None,
+) -> None:
+    """
+    Configures the process-wide ONNX Runtime thread pools shared by all model sessions.
+    Must be called before any model is loaded: once the global pools exist they cannot be resized or disabled.
+
+    Args:
+        enabled (bool, optional): If False, each session gets its own thread pools sized by `set_stage_threads`.
+            Defaults to True.
+        intra_op_num_threads (int, optional): Size of the shared intra-op pool. 0 means the number of physical cores.
+            None keeps the current value.
+        inter_op_num_threads (int, optional): Size of the shared inter-op pool. 0 means the ONNX Runtime default.
+            None keeps the current value.
+    """
+    thread_settings.configure_global_pool(
+        enabled=enabled,
+        intra_op_num_threads=intra_op_num_threads,
+        inter_op_num_threads=inter_op_num_threads,
+    )
+
+
+def set_stage_threads(
+        stage: str,
+        intra_op_num_threads: int = 0,
+        inter_op_num_threads: int = 0,
+) -> None:
+    """
+    Sets the thread counts of sessions for one inference stage. Only takes effect when the global thread pool
+    is disabled, and only for models loaded afterwards.
+
+    Args:
+        stage (str): One of "encoder", "decoder", "vits" or "hubert".
+        intra_op_num_threads (int, optional): Intra-op threads per session. 0 means the ONNX Runtime default.
+        inter_op_num_threads (int, optional): Inter-op threads per session. Values above 1 enable parallel
+            execution of independent nodes. 0 means the ONNX Runtime default.
+    """
+    thread_settings.set_stage_threads(
+        stage=stage,
+        intra_op_num_threads=intra_op_num_threads,
+        inter_op_num_threads=inter_op_num_threads,
+    )
+
+
 def set_reference_audio(
         character_name: str,
         audio_path: Union[str, PathLike],
@@ -109,8 +200,10 @@ async def tts_async(
         character_name: str,
         text: str,
         play: bool = False,
-        split_sentence: bool = False,
+        split_sentence: Union[bool, str] = False,
         save_path: Union[str, PathLike, None] = None,
+        stream_vocoder: bool = False,
+        use_cache: bool = True,
 ) -> AsyncIterator[bytes]:
     """
     Asynchronously generates speech from text and yields audio chunks.
@@ -122,17 +215,26 @@ async def tts_async(
         character_name (str): The name of the character to use for synthesis.
         text (str): The text to be synthesized into speech.
         play (bool, optional): If True, plays the audio as it's generated. Defaults to False.
-        split_sentence (bool, optional): If True, splits the text into sentences for synthesis. Defaults to False.
+        split_sentence (bool | str, optional): If True, splits the text into sentences for synthesis.
+            If "low_latency", makes the first segment short to cut first-packet latency and grows later
+            segments, with a hard upper bound on segment length. Defaults to False.
         save_path (str | PathLike | None, optional): If provided, saves the generated audio to this file path. Defaults to None.
+        stream_vocoder (bool, optional): If True, runs the vocoder on overlapping windows while semantic tokens
+            are still being generated, so audio starts before each sentence is fully decoded. Defaults to False.
+        use_cache (bool, optional): If True, serves repeated requests (same character model, reference audio,
+            text, split mode and vocoder mode) from the audio response cache and stores new results in it.
+            Defaults to True.
 
     Yields:
         bytes: A chunk of the generated audio data.
 
     Raises:
-        ValueError: If 'set_reference_audio' has not been called for the character.
+        ValueError: If 'set_reference_audio' has not been called for the character, or if split_sentence
+            is an unknown split mode.
     """
     if character_name not in _reference_audios:
         raise ValueError("Please call 'set_reference_audio' first to set the reference audio.")
+    validate_split_mode(split_sentence)
 
     if save_path:
         save_path = os.fspath(save_path)
@@ -140,14 +242,14 @@ async def tts_async(
         if parent_dir:
             os.makedirs(parent_dir, exist_ok=True)
 
-    # 1. 创建 asyncio 队列和获取当前事件循环
-    stream_queue: asyncio.Queue[Union[bytes, None]] = asyncio.Queue()
+    # 1. 创建有界队列和获取当前事件循环：调用方读取过慢时，声码器线程会暂停等待
     loop = asyncio.get_running_loop()
+    stream = ThreadToAsyncQueue(loop, maxsize=STREAM_QUEUE_SIZE)
 
     # 2. 定义回调函数，用于在线程和 asyncio 之间安全地传递数据
     def tts_chunk_callback(chunk: Optional[bytes]):
         """This callback is called from the TTS worker thread."""
-        loop.call_soon_threadsafe(stream_queue.put_nowait, chunk)
+        stream.put(chunk)
 
     # 设置 TTS 上下文
     context.current_speaker = character_name
@@ -162,26 +264,49 @@ async def tts_async(
         split=split_sentence,
         save_path=save_path,
         chunk_callback=tts_chunk_callback,
+        stream_vocoder=stream_vocoder,
+        cache_key=audio_cache.make_key(character_name, context.current_prompt_audio, text, split_sentence,
+                                     stream_vocoder)
+        if use_cache else None,
     )
 
-    # 馈送文本并通知会话结束
-    tts_player.feed(text)
-    tts_player.end_session()
+    # 馈送文本并通知会话结束。在线程池中执行：文本队列已满时 feed 会阻塞，
+    # 缓存命中时 end_session 会直接通过回调输出音频，二者都不能在事件循环线程中进行。
+    def feed_text():
+        try:
+            tts_player.feed(text)
+            tts_player.end_session()
+        except Exception:
+            # 会话不会再发送结束信号，这里代为结束音频流，异常在读取结束后重新抛给调用方。
+            stream.put(None)
+            raise
+
+    feed_future = loop.run_in_executor(None, feed_text)
 
     # 4. 从队列中异步读取数据并产生
-    while True:
-        chunk = await stream_queue.get()
-        if chunk is None:
-            break
-        yield chunk
+    try:
+        while True:
+            chunk = await stream.get()
+            if chunk is None:
+                break
+            yield chunk
+        try:
+            await feed_future
+        except Exception as e:
+            logger.error(f"Failed to feed text to the TTS session: {e}", exc_info=True)
+            raise
+    finally:
+        stream.close()  # 调用方提前停止迭代时，不再让声码器线程等待
 
 
 def tts(
         character_name: str,
         text: str,
         play: bool = False,
-        split_sentence: bool = True,
+        split_sentence: Union[bool, str] = True,
         save_path: Union[str, PathLike, None] = None,
+        stream_vocoder: bool = False,
+        use_cache: bool = True,
 ) -> None:
     """
     Synchronously generates speech from text.
@@ -193,12 +318,24 @@ def tts(
         character_name (str): The name of the character to use for synthesis.
         text (str): The text to be synthesized into speech.
         play (bool, optional): If True, plays the audio.
-        split_sentence (bool, optional): If True, splits the text into sentences for synthesis.
+        split_sentence (bool | str, optional): If True, splits the text into sentences for synthesis.
+            If "low_latency", makes the first segment short to cut first-packet latency and grows later
+            segments, with a hard upper bound on segment length.
         save_path (str | PathLike | None, optional): If provided, saves the generated audio to this file path. Defaults to None.
+        stream_vocoder (bool, optional): If True, runs the vocoder on overlapping windows while semantic tokens
+            are still being generated, so audio starts before each sentence is fully decoded. Defaults to False.
+        use_cache (bool, optional): If True, serves repeated requests (same character model, reference audio,
+            text, split mode and vocoder mode) from the audio response cache and stores new results in it.
+            Defaults to True.
     """
     if character_name not in _reference_audios:
         logger.error("Please call 'set_reference_audio' first to set the reference audio.")
         return
+    try:
+        validate_split_mode(split_sentence)
+    except ValueError as e:
+        logger.error(str(e))
+        return
 
     if save_path:
         save_path = os.fspath(save_path)
@@ -216,6 +353,10 @@ def tts(
         play=play,
         split=split_sentence,
         save_path=save_path,
+        stream_vocoder=stream_vocoder,
+        cache_key=audio_cache.make_key(character_name, context.current_prompt_audio, text, split_sentence,
+                                     stream_vocoder)
+        if use_cache else None,
     )
     tts_player.feed(text)
     tts_player.end_session()
@@ -270,6 +411,108 @@ def clear_reference_audio_cache() -> None:
     ReferenceAudio.clear_cache()
 
 
+def get_audio_cache_stats() -> dict:
+    """
+    Returns the audio response cache statistics.
+
+    Returns:
+        dict: Entry counts and sizes in bytes (memory and disk), hit and miss counts, and the hit rate.
+    """
+    return audio_cache.stats()
+
+
+def clear_audio_cache() -> None:
+    """
+    Clears the audio response cache, including its on-disk entries, and resets its statistics.
+    """
+    audio_cache.clear()
+
+
+def get_semantic_token_cache_stats() -> dict:
+    """
+    Returns the sentence-level semantic token cache statistics.
+
+    Returns:
+        dict: Entry count, size in bytes, hit and miss counts, and the hit rate.
+    """
+    return semantic_token_cache.stats()
+
+
+def clear_semantic_token_cache() -> None:
+    """
+    Clears the sentence-level semantic token cache and resets its statistics.
+    """
+    semantic_token_cache.clear()
+
+
+def get_g2p_cache_stats() -> dict:
+    """
+    Returns the G2P (grapheme-to-phoneme) cache statistics.
+
+    Returns:
+        dict: Entry count, capacity, hit and miss counts, and the hit rate.
+    """
+    return g2p_cache.stats()
+
+
+def clear_g2p_cache() -> None:
+    """
+    Clears the in-memory G2P cache and resets its statistics. The persisted file is overwritten on exit.
+    """
+    g2p_cache.clear()
+
+
+def get_decode_stats() -> dict:
+    """
+    Returns how semantic-token decodes have ended since the process started.
+
+    Returns:
+        dict: 'enabled' tells whether the decode guard is on; 'end_reasons' maps each end reason
+            ('eos', 'step_limit', 'stall', 'repetition', 'cancelled', 'error') to its count.
+    """
+    return {'enabled': DECODE_GUARD_ENABLED, 'end_reasons': decode_stats.snapshot()}
+
+
+def precompute_reference_audio(
+        source: Union[str, PathLike],
+        cache_dir: Union[str, PathLike, None] = None,
+        num_workers: Optional[int] = None,
+        overwrite: bool = False,
+) -> int:
+    """
+    Precomputes reference audio features in parallel and stores them in the on-disk feature cache.
+
+    Later calls to 'set_reference_audio' (in this or any other process using the same cache
+    directory) load the cached features instead of running CN-HuBERT.
+
+    Args:
+        source (str | PathLike): A directory of audio files with same-named .txt/.lab transcripts,
+            a .json manifest of {"audio_path", "audio_text"} objects, or a "path|...|text" list file.
+        cache_dir (str | PathLike | None, optional): The cache directory. Defaults to the
+            'Reference_Audio_Cache_Dir' environment variable; also enables the cache for this process.
+        num_workers (int | None, optional): The number of worker processes. Defaults to the CPU count.
+        overwrite (bool, optional): If True, recomputes clips that are already cached. Defaults to False.
+
+    Returns:
+        int: The number of reference audios successfully precomputed.
+
+    Raises:
+        ValueError: If no cache directory is given or configured.
+    """
+    if cache_dir is not None:
+        feature_store.set_cache_dir(os.fspath(cache_dir))
+    if not feature_store.enabled:
+        raise ValueError("Please pass 'cache_dir' or set the 'Reference_Audio_Cache_Dir' environment variable.")
+
+    items = collect_reference_items(os.fspath(source))
+    return precompute_reference_audios(
+        items=items,
+        cache_dir=feature_store.cache_dir,
+        num_workers=num_workers,
+        overwrite=overwrite,
+    )
+
+
 def launch_command_line_client() -> None:
     """
     Launch the command-line client.
@@ -0,0 +1,85 @@
+import threading
+
+from genie_tts.Utils.Utils import BudgetLRUCacheDict
+
+
+def test_evicts_least_recently_used_over_byte_budget():
+    evicted = []
+    cache = BudgetLRUCacheDict(max_bytes=100, on_evict=lambda key, size, reason: evicted.append((key, size, reason)))
+    cache.put('a', 1, 40)
+    cache.put('b', 2, 40)
+    assert cache.get('a') == 1  # a 变为最近使用
+    cache.put('c', 3, 40)
+
+    assert list(cache) == ['a', 'c']
+    assert evicted == [('b', 40, 'memory')]
+    assert cache.total_bytes == 80
+    assert cache.evictions == 1 and cache.evicted_bytes == 40
+    assert cache.eviction_events[-1]['key'] == 'b'
+
+
+def test_count_limit():
+    cache = BudgetLRUCacheDict(capacity=2)
+    for key in 'abc':
+        cache.put(key, key, 0)
+    assert list(cache) == ['b', 'c']
+    assert cache.eviction_events[-1]['reason'] == 'count'
+
+
+def test_pinned_entries_are_never_evicted():
+    cache = BudgetLRUCacheDict(max_bytes=100)
+    cache.pinned.add('a')  # 可以在放入之前固定
+    cache.put('a', 1, 60)
+    cache.put('b', 2, 30)
+    cache.put('c', 3, 30)
+    assert list(cache) == ['a', 'c']
+
+    # 可淘汰的条目都淘汰后仍超出预算时保留剩余条目，刚放入的条目也不会被淘汰。
+    cache.put('d', 4, 80)
+    assert list(cache) == ['a', 'd']
+    assert cache.total_bytes == 140
+
+
+def test_discard_and_delete_are_not_evictions():
+    evicted = []
+    cache = BudgetLRUCacheDict(max_bytes=100, on_evict=lambda *args: evicted.append(args))
+    cache.put('a', 1, 50)
+    cache.put('b', 2, 50)
+    assert cache.discard('a')
+    assert not cache.discard('a')
+    del cache['b']
+
+    assert len(cache) == 0 and cache.total_bytes == 0
+    assert evicted == [] and cache.evictions == 0
+    assert cache.get('a', 'missing') == 'missing'
+
+
+def test_setitem_keeps_recorded_size():
+    cache = BudgetLRUCacheDict(max_bytes=100)
+    cache.put('a', 1, 70)
+    cache['a'] = 2
+    assert cache.sizes['a'] == 70
+    cache['b'] = 3  # 未记录大小的条目按 0 字节计算
+    assert list(cache) == ['a', 'b'] and cache.total_bytes == 70
+
+
+def test_on_evict_runs_without_holding_the_lock():
+    cache = BudgetLRUCacheDict(max_bytes=10)
+    lock_free = []
+
+    def on_evict(key, size, reason):
+        # 回调中的耗时操作不应阻塞其他线程访问缓存：另一个线程此时应能立即获得锁。
+        def try_lock():
+            if cache.lock.acquire(blocking=False):
+                lock_free.append(key)
+                cache.lock.release()
+
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+
+    cache.on_evict = on_evict
+    cache.put('a', 1, 10)
+    cache.put('b', 2, 10)
+    assert list(cache) == ['b']
+    assert lock_free == ['a']
@@ -0,0 +1,133 @@
+import threading
+import time
+
+from genie_tts.Core.SentenceScheduler import SentenceScheduler, SentenceSlot, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+
+
+def start_waiter(scheduler, tenant, priority, granted, stop_event=None):
+    """在后台线程中申请名额，获得后把租户名追加到 granted。"""
+
+    def run():
+        if scheduler.acquire(tenant, priority, stop_event):
+            granted.append(tenant)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for_waiting(scheduler, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while sum(scheduler.stats()['waiting'].values()) < count:
+        assert time.monotonic() < deadline, scheduler.stats()
+        time.sleep(0.01)
+
+
+def release_and_collect(scheduler, holder, granted, threads):
+    """每次归还一个名额，记录名额依次分给了哪个租户。"""
+    order = []
+    for _ in threads:
+        scheduler.release(holder)
+        deadline = time.monotonic() + 5.0
+        while len(granted) <= len(order):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        holder = granted[len(order)]
+        order.append(holder)
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join(timeout=5)
+    return order
+
+
+def test_interactive_before_batch():
+    scheduler = SentenceScheduler(max_active=1, max_active_per_tenant=1)
+    assert scheduler.acquire('holder')
+    granted = []
+    threads = [start_waiter(scheduler, 'batch', PRIORITY_BATCH, granted)]
+    wait_for_waiting(scheduler, 1)
+    threads.append(start_waiter(scheduler, 'interactive', PRIORITY_INTERACTIVE, granted))
+    wait_for_waiting(scheduler, 2)
+
+    assert release_and_collect(scheduler, 'holder', granted, threads) == ['interactive', 'batch']
+    assert scheduler.stats()['active'] == 0
+
+
+def test_tenants_are_served_round_robin():
+    scheduler = SentenceScheduler(max_active=1, max_active_per_tenant=1)
+    assert scheduler.acquire('holder')
+    granted = []
+    threads = []
+    for tenant in ('a', 'a', 'a', 'b', 'b'):
+        threads.append(start_waiter(scheduler, tenant, PRIORITY_INTERACTIVE, granted))
+        wait_for_waiting(scheduler, len(threads))
+
+    assert release_and_collect(scheduler, 'holder', granted, threads) == ['a', 'b', 'a', 'b', 'a']
+
+
+def test_per_tenant_limit_lets_other_tenants_through():
+    scheduler = SentenceScheduler(max_active=3, max_active_per_tenant=1)
+    assert scheduler.acquire('a')
+    granted = []
+    blocked = start_waiter(scheduler, 'a', PRIORITY_INTERACTIVE, granted)
+    wait_for_waiting(scheduler, 1)
+    assert scheduler.acquire('b')  # 租户 a 已达上限，不影响其他租户
+
+    stats = scheduler.stats()
+    assert stats['active'] == 2
+    assert stats['active_per_tenant'] == {'a': 1, 'b': 1}
+    assert stats['waiting'][PRIORITY_INTERACTIVE] == 1
+
+    scheduler.release('a')
+    blocked.join(timeout=5)
+    assert granted == ['a']
+    scheduler.release('a')
+    scheduler.release('b')
+    assert scheduler.stats()['active'] == 0
+
+
+def test_stop_event_abandons_waiting():
+    scheduler = SentenceScheduler(max_active=1, max_active_per_tenant=1)
+    assert scheduler.acquire('holder')
+    stop_event = threading.Event()
+    granted = []
+    thread = start_waiter(scheduler, 'a', PRIORITY_INTERACTIVE, granted, stop_event)
+    wait_for_waiting(scheduler, 1)
+    stop_event.set()
+    thread.join(timeout=5)
+
+    assert granted == []
+    assert scheduler.stats()['waiting'][PRIORITY_INTERACTIVE] == 0
+    scheduler.release('holder')
+    assert scheduler.acquire('b')  # 放弃等待的申请没有占用名额
+
+
+def test_slot_suspended_releases_and_reacquires():
+    scheduler = SentenceScheduler(max_active=1, max_active_per_tenant=1)
+    slot = SentenceSlot(scheduler, 'a')
+    assert slot.acquire() and slot.held
+    with slot.suspended():
+        assert not slot.held
+        assert scheduler.stats()['active'] == 0
+    assert slot.held
+    slot.release()
+    assert scheduler.stats()['active'] == 0
+
+
+def test_slot_reads_priority_on_every_acquire():
+    scheduler = SentenceScheduler(max_active=1, max_active_per_tenant=1)
+    session = type('Session', (), {'priority': PRIORITY_BATCH})()
+    slot = SentenceSlot(scheduler, 'a', lambda: session.priority)
+    assert slot.priority == PRIORITY_BATCH
+    session.priority = PRIORITY_INTERACTIVE
+    assert slot.priority == PRIORITY_INTERACTIVE
+
+    assert scheduler.acquire('holder')
+    granted = []
+    batch = start_waiter(scheduler, 'batch', PRIORITY_BATCH, granted)
+    wait_for_waiting(scheduler, 1)
+    upgraded = threading.Thread(target=lambda: slot.acquire() and granted.append('a'), daemon=True)
+    upgraded.start()
+    wait_for_waiting(scheduler, 2)
+
+    assert release_and_collect(scheduler, 'holder', granted, [batch, upgraded]) == ['a', 'batch']
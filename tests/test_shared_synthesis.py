@@ -0,0 +1,125 @@
+import pytest
+
+pytest.importorskip('fastapi')
+
+from genie_tts.Core.TTSSession import tts_session_pool
+from genie_tts.Server import _SharedSynthesis, _inflight_syntheses, _join_or_start_synthesis, _leave_synthesis
+
+
+class StubStream:
+    """与 ThreadToAsyncQueue 接口相同的队列：关闭后 put 直接丢弃数据并返回 False。"""
+
+    def __init__(self):
+        self.items = []
+        self.closed = False
+
+    def put(self, item) -> bool:
+        if self.closed:
+            return False
+        self.items.append(item)
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class StubSession:
+    def __init__(self):
+        self.stopped = False
+        self.priority = None
+
+    def stop(self) -> None:
+        self.stopped = True
+
+
+def test_late_subscriber_receives_earlier_chunks():
+    shared = _SharedSynthesis()
+    first, second = StubStream(), StubStream()
+    assert shared.subscribe(first)
+    shared.publish(b'1')
+    assert shared.subscribe(second)
+    shared.publish(b'2')
+    shared.publish(None)
+
+    assert first.items == [b'1', b'2', None]
+    assert second.items == [b'1', b'2', None]
+
+
+def test_subscribe_after_finish_is_rejected():
+    shared = _SharedSynthesis()
+    stream = StubStream()
+    shared.subscribe(stream)
+    shared.publish(None)
+    assert not shared.subscribe(StubStream())
+    assert not shared.unsubscribe(stream)  # 已经结束的合成不会被取消
+
+
+def test_closed_subscriber_is_skipped():
+    shared = _SharedSynthesis()
+    alive, gone = StubStream(), StubStream()
+    shared.subscribe(alive)
+    shared.subscribe(gone)
+    gone.close()
+    shared.publish(b'1')
+
+    assert alive.items == [b'1']
+    assert gone.items == []
+    assert shared.closed_subscribers() == [gone]
+
+
+def test_last_unsubscribe_cancels_synthesis():
+    shared = _SharedSynthesis()
+    session = StubSession()
+    first, second = StubStream(), StubStream()
+    shared.subscribe(first)
+    shared.subscribe(second)
+    shared.attach_session(session)
+
+    assert not shared.unsubscribe(first)
+    assert first.closed and not session.stopped
+    assert shared.unsubscribe(second)
+    assert shared.cancelled and session.stopped
+    assert not shared.subscribe(StubStream())
+
+
+def test_session_attached_after_cancel_is_stopped():
+    shared = _SharedSynthesis()
+    stream = StubStream()
+    shared.subscribe(stream)
+    assert shared.unsubscribe(stream)
+
+    session = StubSession()
+    shared.attach_session(session)
+    assert session.stopped
+
+
+def test_identical_requests_join_and_leave_the_registry():
+    key = ('test', 'join')
+    first, second = StubStream(), StubStream()
+    shared, is_new = _join_or_start_synthesis(key, first, 'interactive')
+    try:
+        assert shared is not None and is_new
+        joined, is_new = _join_or_start_synthesis(key, second, 'interactive')
+        assert joined is shared and not is_new
+
+        _leave_synthesis(key, shared, first)
+        assert _inflight_syntheses.get(key) is shared
+        _leave_synthesis(key, shared, second)
+        assert shared.cancelled
+        assert key not in _inflight_syntheses
+        _leave_synthesis(key, shared, second)  # 可以重复调用
+    finally:
+        _inflight_syntheses.pop(key, None)
+        tts_session_pool.cancel_admission()
+
+
+def test_raise_priority_reaches_attached_session():
+    shared = _SharedSynthesis()
+    shared.priority = 'batch'
+    shared.raise_priority('interactive')  # 会话关联之前提升的优先级同样生效
+    session = StubSession()
+    shared.attach_session(session)
+    assert session.priority == 'interactive'
+
+    shared.raise_priority('batch')  # 只会提升，不会降低
+    assert session.priority == 'interactive'
@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from genie_tts.Japanese.Split import (StreamingTextSplitter, split_japanese_text, split_japanese_text_low_latency,
+                                      split_text, get_valid_text_length, MIN_SENTENCE_LENGTH, FIRST_SEGMENT_LENGTH,
+                                      MAX_SEGMENT_LENGTH, SPLIT_MODE_LOW_LATENCY)
+
+
+def feed_all(splitter, chunks):
+    sentences = []
+    for chunk in chunks:
+        sentences.extend(splitter.feed(chunk))
+    return sentences
+
+
+def test_sentence_is_returned_once_followed_by_more_text():
+    splitter = StreamingTextSplitter()
+    assert splitter.feed('今日はいい天気ですね。') == []  # 标点之后可能还有标点
+    assert splitter.feed('明日') == ['今日はいい天気ですね。']
+    assert splitter.has_pending_text
+    assert splitter.flush() == ['明日']
+    assert not splitter.has_pending_text
+
+
+def test_consecutive_terminators_stay_in_one_sentence():
+    splitter = StreamingTextSplitter()
+    assert feed_all(splitter, ['本当にそうなの！', '？', 'うそでしょう']) == ['本当にそうなの！？']
+    assert splitter.flush() == ['うそでしょう']
+
+
+def test_short_sentences_merge_with_following_text():
+    splitter = StreamingTextSplitter()
+    assert feed_all(splitter, ['はい。', 'わかりました。', 'では']) == ['はい。わかりました。']
+    assert splitter.flush() == ['では']
+
+
+def test_token_by_token_feed_matches_whole_text():
+    text = '吾輩は猫である。名前はまだ無い。どこで生れたかとんと見当がつかぬ。'
+    splitter = StreamingTextSplitter()
+    sentences = feed_all(splitter, list(text)) + splitter.flush()
+    assert ''.join(sentences) == text
+    assert sentences == split_japanese_text(text)
+
+
+def test_flush_drops_punctuation_only_remainder():
+    splitter = StreamingTextSplitter()
+    assert feed_all(splitter, ['世界は広いです。', '…']) == []
+    assert splitter.flush() == ['世界は広いです。…']
+    splitter.feed('。')
+    assert splitter.flush() == []
+
+
+def test_streamed_sentences_are_not_too_short():
+    splitter = StreamingTextSplitter()
+    text = 'あ。い。う。え。お。かきくけこ。さしすせそ。'
+    for sentence in feed_all(splitter, list(text)):
+        assert len(sentence) - sentence.count('。') >= MIN_SENTENCE_LENGTH
+
+
+def test_low_latency_first_segment_is_short_and_segments_grow():
+    text = 'きょうはとてもいい天気なので、みんなで公園に行って、お弁当を食べることにしました。' * 3
+    segments = split_japanese_text_low_latency(text)
+    lengths = [get_valid_text_length(segment) for segment in segments]
+
+    assert ''.join(segments) == text
+    assert MIN_SENTENCE_LENGTH <= lengths[0] <= FIRST_SEGMENT_LENGTH
+    assert max(lengths[1:]) > FIRST_SEGMENT_LENGTH
+
+
+def test_low_latency_start_index_continues_growth():
+    text = 'きょうはとてもいい天気なので、みんなで公園に行きました。'
+    first = split_japanese_text_low_latency(text)
+    continued = split_japanese_text_low_latency(text, start_index=3)
+    assert len(continued) < len(first)
+    assert continued == [text]
+
+
+def test_low_latency_cuts_long_clause_at_phrase_boundary():
+    segments = split_japanese_text_low_latency('わたしは東京駅で友達を待っていました')
+    assert segments[0] == 'わたしは東京駅で友達を'  # 12 个字符处位于文节中间，退回到 "待" 之前
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_low_latency_segments_stay_within_bounds(seed):
+    rng = random.Random(seed)
+    alphabet = 'あいうえおかきくけこ東京駅行アイウエオ、。！ '
+    for _ in range(2000):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 200)))
+        start_index = rng.randint(0, 3)
+        segments = split_japanese_text_low_latency(text, start_index)
+        lengths = [get_valid_text_length(segment) for segment in segments]
+
+        assert ''.join(segments).replace(' ', '') == text.replace(' ', '')
+        assert all(length <= MAX_SEGMENT_LENGTH for length in lengths)
+        if get_valid_text_length(text) >= MIN_SENTENCE_LENGTH:
+            assert all(length >= MIN_SENTENCE_LENGTH for length in lengths), (text, segments)
+
+
+def test_split_text_rejects_unknown_mode():
+    assert split_text('こんにちは。', False) == ['こんにちは。']
+    assert split_text('   ', SPLIT_MODE_LOW_LATENCY) == []
+    with pytest.raises(ValueError):
+        split_text('こんにちは。', 'fast')
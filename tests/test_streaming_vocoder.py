@@ -0,0 +1,99 @@
+import numpy as np
+
+from genie_tts.Core.StreamingVocoder import StreamingVocoder
+
+SAMPLES_PER_TOKEN = 640
+
+
+class StubVocoder:
+    """每个 Token 生成 SAMPLES_PER_TOKEN 个取值等于 Token 的采样点，并记录每次调用的窗口。"""
+
+    def __init__(self):
+        self.windows = []
+
+    def run(self, output_names, feeds, run_options=None):
+        tokens = feeds["pred_semantic"].reshape(-1)
+        self.windows.append(tokens.copy())
+        return [np.repeat(tokens.astype(np.float32), SAMPLES_PER_TOKEN)]
+
+
+def make_streamer(vocoder, chunks, **kwargs):
+    kwargs.setdefault('chunk_tokens', 25)
+    kwargs.setdefault('context_tokens', 10)
+    kwargs.setdefault('overlap_tokens', 4)
+    kwargs.setdefault('crossfade_samples', 0)
+    return StreamingVocoder(vocoder, None, None, chunks.append, **kwargs)
+
+
+def feed_one_by_one(streamer, tokens):
+    for n in range(1, len(tokens) + 1):
+        streamer.feed(tokens[:n])
+
+
+def test_streamed_audio_matches_whole_sequence():
+    vocoder, chunks = StubVocoder(), []
+    streamer = make_streamer(vocoder, chunks)
+    tokens = np.arange(1, 121, dtype=np.int64)
+    feed_one_by_one(streamer, tokens)
+    streamer.finish(tokens)
+
+    assert len(chunks) > 1
+    np.testing.assert_array_equal(np.concatenate(chunks),
+                                  np.repeat(tokens.astype(np.float32), SAMPLES_PER_TOKEN))
+
+
+def test_windows_cover_only_context_chunk_and_overlap():
+    vocoder, chunks = StubVocoder(), []
+    streamer = make_streamer(vocoder, chunks)
+    tokens = np.arange(1, 121, dtype=np.int64)
+    feed_one_by_one(streamer, tokens)
+
+    emitted = 0
+    for window in vocoder.windows:
+        start = max(0, emitted - 10)
+        end = start + len(window) - 4
+        np.testing.assert_array_equal(window, tokens[start:end + 4])
+        assert end - emitted == 25
+        emitted = end
+    assert streamer.emitted_tokens == emitted
+
+
+def test_holdback_keeps_truncatable_tokens_unvocoded():
+    vocoder, chunks = StubVocoder(), []
+    streamer = make_streamer(vocoder, chunks, holdback_tokens=40)
+    tokens = np.arange(1, 121, dtype=np.int64)
+    for n in range(1, len(tokens) + 1):
+        streamer.feed(tokens[:n])
+        assert streamer.emitted_tokens <= max(0, n - 40 - 4)
+        # Token 的取值为其位置加一：声码器从未见过末尾 40 个 Token。
+        assert all(window[-1] <= n - 40 for window in vocoder.windows)
+
+    # 提前结束时丢弃的 Token 不超过保留量，最终输出与截断后的序列一致。
+    truncated = tokens[:len(tokens) - 40]
+    streamer.finish(truncated)
+    np.testing.assert_array_equal(np.concatenate(chunks),
+                                  np.repeat(truncated.astype(np.float32), SAMPLES_PER_TOKEN))
+
+
+def test_finish_without_feed_vocodes_whole_sequence_once():
+    vocoder, chunks = StubVocoder(), []
+    streamer = make_streamer(vocoder, chunks)
+    tokens = np.arange(1, 31, dtype=np.int64)
+    streamer.finish(tokens)
+
+    assert len(vocoder.windows) == 1
+    np.testing.assert_array_equal(vocoder.windows[0], tokens)
+    assert len(chunks) == 1 and len(chunks[0]) == len(tokens) * SAMPLES_PER_TOKEN
+
+
+def test_crossfade_keeps_total_length():
+    vocoder, chunks = StubVocoder(), []
+    streamer = make_streamer(vocoder, chunks, crossfade_samples=1280)
+    tokens = np.full(100, 7, dtype=np.int64)
+    feed_one_by_one(streamer, tokens)
+    streamer.finish(tokens)
+
+    audio = np.concatenate(chunks)
+    assert len(audio) == len(tokens) * SAMPLES_PER_TOKEN
+    # 相邻窗口在边界处的音频相同，交叉淡化不应改变取值。
+    np.testing.assert_allclose(audio, 7.0, rtol=1e-6)